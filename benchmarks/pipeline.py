@@ -0,0 +1,466 @@
+"""
+翻译流程性能测试：生成指定规模的 srt/ass 字幕文件，使用本地模拟引擎运行完整的
+分片 → 翻译 → 合并流程，报告每秒翻译条目数、请求延迟的 p50/p99 与内存峰值。
+
+在仓库根目录运行：
+
+    python -m benchmarks.pipeline --cues 2000 --files 4 --latency 0.2 --error-rate 0.05
+"""
+
+import argparse
+import datetime
+import json
+import random
+import re
+import resource
+import statistics
+import sys
+import tempfile
+import threading
+import time
+import tracemalloc
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import Any, Generator
+
+import srt
+
+from src.subtiltes_translator.engine import TranslationEngine
+from src.subtiltes_translator.scheduler import RequestScheduler
+from src.subtiltes_translator.tracing import Tracer
+from src.subtiltes_translator.translator import DEFAULT_CONCURRENCY, translate_subtitle
+from src.subtiltes_translator.usage import TokenUsage
+from src.subtiltes_translator.utils import WireFormat, estimate_tokens
+
+WORDS = (
+    "the agent chief phone shoe secret mission control chaos door cone of silence "
+    "missed it by that much would you believe ninety nine max sorry about that"
+).split()
+
+TEXT_CUE = re.compile(r"^(\d+):\s?(.*)$")
+
+ASS_HEADER = """[Script Info]
+ScriptType: v4.00+
+PlayResX: 1920
+PlayResY: 1080
+
+[V4+ Styles]
+Format: Name, Fontname, Fontsize, PrimaryColour, SecondaryColour, OutlineColour, \
+BackColour, Bold, Italic, Underline, StrikeOut, ScaleX, ScaleY, Spacing, Angle, \
+BorderStyle, Outline, Shadow, Alignment, MarginL, MarginR, MarginV, Encoding
+Style: Default,Arial,60,&H00FFFFFF,&H000000FF,&H00000000,&H00000000,0,0,0,0,100,100,\
+0,0,1,2,1,2,10,10,40,1
+
+[Events]
+Format: Layer, Start, End, Style, Name, MarginL, MarginR, MarginV, Effect, Text
+"""
+
+
+class MockServerError(Exception):
+    """
+    模拟的服务端错误，按 503 处理，会被调度器重试
+    """
+
+    code = 503
+
+
+def random_line(rng: random.Random, words: int) -> str:
+    count = max(1, int(rng.gauss(words, words / 3)))
+    line = " ".join(rng.choice(WORDS) for _ in range(count))
+    return line[0].upper() + line[1:]
+
+
+def generate_cues(
+    count: int, words: int, repeat_rate: float, seed: int
+) -> list[tuple[datetime.timedelta, datetime.timedelta, str]]:
+    """
+    生成字幕条目，repeat_rate 为重复歌词与音效等相同文本的比例
+    """
+    rng = random.Random(seed)
+    refrains = ["♪ Would you believe ♪", "[LAUGHTER]", "Sorry about that, Chief."]
+    cues = []
+    start = datetime.timedelta(seconds=1)
+    for _ in range(count):
+        duration = datetime.timedelta(milliseconds=rng.randint(800, 4000))
+        if rng.random() < repeat_rate:
+            text = rng.choice(refrains)
+        else:
+            text = random_line(rng, words)
+            if rng.random() < 0.2:
+                text += "\n" + random_line(rng, words)
+        cues.append((start, start + duration, text))
+        start += duration + datetime.timedelta(milliseconds=rng.randint(50, 500))
+    return cues
+
+
+def ass_time(value: datetime.timedelta) -> str:
+    centiseconds = int(value.total_seconds() * 100)
+    hours, rest = divmod(centiseconds, 360000)
+    minutes, rest = divmod(rest, 6000)
+    seconds, centiseconds = divmod(rest, 100)
+    return f"{hours}:{minutes:02d}:{seconds:02d}.{centiseconds:02d}"
+
+
+def write_corpus(
+    directory: Path,
+    files: int,
+    file_format: str,
+    cues: int,
+    words: int,
+    repeat_rate: float,
+) -> list[Path]:
+    """
+    生成测试用的字幕文件
+    """
+    paths = []
+    for number in range(files):
+        items = generate_cues(cues, words, repeat_rate, seed=number)
+        path = directory / f"episode_{number:02d}.{file_format}"
+        if file_format == "srt":
+            subtitles = [
+                srt.Subtitle(index, start, end, text)
+                for index, (start, end, text) in enumerate(items, 1)
+            ]
+            path.write_text(srt.compose(subtitles), encoding="utf-8")
+        else:
+            lines = [ASS_HEADER]
+            for start, end, text in items:
+                text = text.replace("\n", "\\N")
+                if len(lines) % 7 == 0:
+                    text = "{\\an8}" + text
+                if len(lines) % 5 == 0:
+                    words_ = text.split(" ")
+                    words_[0] = "{\\i1}" + words_[0] + "{\\i0}"
+                    text = " ".join(words_)
+                lines.append(
+                    f"Dialogue: 0,{ass_time(start)},{ass_time(end)},Default,,0,0,0,,"
+                    f"{text}\n"
+                )
+            path.write_text("".join(lines), encoding="utf_8_sig")
+        paths.append(path)
+    return paths
+
+
+class MockEngine(TranslationEngine):
+    """
+    本地模拟引擎：按设定的延迟返回结果，并按比例模拟服务端错误与输出截断
+    """
+
+    name = "mock"
+    max_output_tokens = 8192
+    max_concurrency = 64
+
+    def __init__(
+        self,
+        latency: float,
+        jitter: float,
+        error_rate: float,
+        truncate_rate: float,
+        tokens_per_second: float,
+        seed: int = 0,
+    ):
+        super().__init__(
+            "mock",
+            RequestScheduler(
+                requests_per_minute=1e9,
+                tokens_per_minute=1e12,
+                base_delay=0.01,
+                max_delay=0.1,
+            ),
+        )
+        self.latency = latency
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.truncate_rate = truncate_rate
+        self.tokens_per_second = tokens_per_second
+        self.rng = random.Random(seed)
+        self.latencies: list[float] = []
+        self.requests = 0
+        self.errors = 0
+        self._lock = threading.Lock()
+
+    def respond(self, text: str) -> tuple[list[str], float]:
+        """
+        生成逐条的译文与首个 token 的延迟
+        """
+        with self._lock:
+            self.requests += 1
+            fail = self.rng.random() < self.error_rate
+            truncate = self.rng.random() < self.truncate_rate
+            delay = max(0.0, self.rng.gauss(self.latency, self.jitter))
+        if fail:
+            with self._lock:
+                self.errors += 1
+            time.sleep(delay)
+            raise MockServerError("mock server error")
+
+        if TEXT_CUE.match(text.split("\n", 1)[0]):
+            parts = []
+            for line in text.splitlines():
+                match = TEXT_CUE.match(line)
+                if match:
+                    parts.append(f"{match[1]}: 译{match[2]}\n")
+        else:
+            parts = [
+                srt.compose(
+                    [srt.Subtitle(cue.index, cue.start, cue.end, "译" + cue.content)],
+                    reindex=False,
+                )
+                for cue in srt.parse(text)
+            ]
+        if truncate:
+            parts = parts[: max(1, len(parts) // 2)]
+        return parts, delay
+
+    def output_time(self, parts: list[str]) -> float:
+        """
+        按输出速度计算生成全部输出的耗时
+        """
+        return sum(len(part) for part in parts) / 4 / self.tokens_per_second
+
+    def request(self, prompt: str, text: str) -> str:
+        parts, delay = self.respond(text)
+        time.sleep(delay + self.output_time(parts))
+        self.report(prompt, text, parts)
+        return "".join(parts)
+
+    def stream(self, prompt: str, text: str) -> Generator[str, None, None]:
+        parts, delay = self.respond(text)
+        # 等待首个 token，之后按输出速度逐条返回
+        time.sleep(delay)
+        piece_delay = self.output_time(parts) / max(1, len(parts))
+        for part in parts:
+            time.sleep(piece_delay)
+            yield part
+        self.report(prompt, text, parts)
+
+    def report(self, prompt: str, text: str, parts: list[str]):
+        """
+        像真实接口一样在响应结束时返回用量
+        """
+        self.report_usage(
+            estimate_tokens(prompt) + estimate_tokens(text),
+            estimate_tokens("".join(parts)),
+        )
+
+    def generate(self, prompt: str, text: str, retry: bool = True) -> str:
+        started = time.perf_counter()
+        try:
+            return super().generate(prompt, text, retry)
+        finally:
+            self.record(time.perf_counter() - started)
+
+    def generate_stream(
+        self, prompt: str, text: str, on_text: Any, retry: bool = True
+    ) -> str:
+        started = time.perf_counter()
+        try:
+            return super().generate_stream(prompt, text, on_text, retry)
+        finally:
+            self.record(time.perf_counter() - started)
+
+    def record(self, elapsed: float):
+        with self._lock:
+            self.latencies.append(elapsed)
+
+
+def percentile(values: list[float], q: float) -> float:
+    if not values:
+        return 0.0
+    if len(values) == 1:
+        return values[0]
+    return statistics.quantiles(values, n=100, method="inclusive")[int(q) - 1]
+
+
+def peak_rss_mib() -> float:
+    """
+    进程的常驻内存峰值，Linux 上单位为 KiB，macOS 上为字节
+    """
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    if sys.platform == "darwin":
+        peak /= 1024
+    return peak / 1024
+
+
+def mock_engine(args: argparse.Namespace) -> MockEngine:
+    return MockEngine(
+        args.latency,
+        args.jitter,
+        args.error_rate,
+        args.truncate_rate,
+        args.tokens_per_second,
+        args.seed,
+    )
+
+
+def translate_corpus(
+    args: argparse.Namespace,
+    engine: MockEngine,
+    paths: list[Path],
+    output: Path,
+    cache_dir: Path,
+    tracer: Tracer | None = None,
+) -> tuple[TokenUsage, TokenUsage]:
+    """
+    翻译全部文件，返回实际的用量与按分片计划估算的用量
+    """
+    usage = TokenUsage()
+    estimate = TokenUsage()
+    lock = threading.Lock()
+
+    def translate(path: Path):
+        job_usage = translate_subtitle(
+            prompt="Translate",
+            subtitle_file=str(path),
+            target_dir=str(output),
+            from_language="英语",
+            target_language="中文",
+            api_key="",
+            concurrency=args.concurrency,
+            cache_dir=str(cache_dir),
+            use_memory=False,
+            resume=False,
+            stream=args.stream,
+            wire_format=WireFormat(args.wire_format),
+            deduplicate=not args.no_dedup,
+            engine=engine,
+            executor=executor,
+            tracer=tracer,
+            save_usage=False,
+        )
+        with lock:
+            usage.add(job_usage.total)
+            estimate.add(job_usage.estimate)
+
+    with ThreadPoolExecutor(max_workers=args.concurrency) as executor:
+        with ThreadPoolExecutor(max_workers=args.jobs) as files:
+            list(files.map(translate, paths))
+    return usage, estimate
+
+
+def run(args: argparse.Namespace) -> dict[str, Any]:
+    with tempfile.TemporaryDirectory() as tmp:
+        directory = Path(tmp)
+        corpus = directory / "corpus"
+        output = directory / "output"
+        corpus.mkdir()
+        output.mkdir()
+        paths = write_corpus(
+            corpus, args.files, args.format, args.cues, args.words, args.repeat_rate
+        )
+        engine = mock_engine(args)
+        tracer = Tracer(args.trace) if args.trace else None
+
+        started = time.perf_counter()
+        usage, estimate = translate_corpus(
+            args, engine, paths, output, directory / "cache", tracer
+        )
+        elapsed = time.perf_counter() - started
+        peak_rss = peak_rss_mib()
+        if tracer:
+            tracer.close()
+
+        outputs = sorted(output.iterdir())
+        translated = sum(
+            path.read_text(encoding="utf_8_sig").count("译") for path in outputs
+        )
+
+        # tracemalloc 会明显拖慢内存分配，另外运行一次统计，不影响计时结果
+        peak_traced = None
+        if args.trace_memory:
+            memory_output = directory / "memory"
+            memory_output.mkdir()
+            tracemalloc.start()
+            translate_corpus(
+                args,
+                mock_engine(args),
+                paths,
+                memory_output,
+                directory / "memory-cache",
+            )
+            _, peak_traced = tracemalloc.get_traced_memory()
+            tracemalloc.stop()
+
+    total = args.files * args.cues
+    result = {
+        "files": args.files,
+        "cues": total,
+        "translated_cues": translated,
+        "seconds": round(elapsed, 3),
+        "cues_per_second": round(total / elapsed, 1),
+        "requests": engine.requests,
+        "errors": engine.errors,
+        "latency_p50": round(percentile(engine.latencies, 50), 4),
+        "latency_p99": round(percentile(engine.latencies, 99), 4),
+        "input_tokens": usage.input_tokens,
+        "output_tokens": usage.output_tokens,
+        "estimated_input_tokens": estimate.input_tokens,
+        "estimated_output_tokens": estimate.output_tokens,
+        "peak_rss_mib": round(peak_rss, 1),
+    }
+    if peak_traced is not None:
+        result["peak_traced_mib"] = round(peak_traced / 1024 / 1024, 1)
+    return result
+
+
+def parse_args(argv: list[str] | None = None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(
+        prog="python -m benchmarks.pipeline", description="翻译流程性能测试"
+    )
+    parser.add_argument("--format", choices=["srt", "ass"], default="srt")
+    parser.add_argument("--files", type=int, default=4, help="字幕文件数量")
+    parser.add_argument("--cues", type=int, default=1000, help="每个文件的条目数量")
+    parser.add_argument("--words", type=int, default=8, help="每条字幕的平均词数")
+    parser.add_argument(
+        "--repeat-rate", type=float, default=0.05, help="重复文本的条目比例"
+    )
+    parser.add_argument(
+        "--latency", type=float, default=0.2, help="请求的平均延迟（秒）"
+    )
+    parser.add_argument("--jitter", type=float, default=0.05, help="延迟的标准差")
+    parser.add_argument(
+        "--tokens-per-second", type=float, default=2000, help="模拟的输出速度"
+    )
+    parser.add_argument("--error-rate", type=float, default=0.0, help="请求失败的比例")
+    parser.add_argument(
+        "--truncate-rate", type=float, default=0.0, help="输出被截断的比例"
+    )
+    parser.add_argument(
+        "-c",
+        "--concurrency",
+        type=int,
+        default=DEFAULT_CONCURRENCY,
+        help="所有文件共用的分片并发数量",
+    )
+    parser.add_argument("-j", "--jobs", type=int, default=2, help="同时翻译的文件数量")
+    parser.add_argument("--stream", action="store_true", help="使用流式请求")
+    parser.add_argument(
+        "--wire-format",
+        choices=[wire_format.value for wire_format in WireFormat],
+        default=WireFormat.TEXT.value,
+    )
+    parser.add_argument("--no-dedup", action="store_true", help="不合并相同文本")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--trace", metavar="FILE", help="将各阶段的 span 写入文件")
+    parser.add_argument(
+        "--trace-memory",
+        action="store_true",
+        help="计时结束后另外运行一次，用 tracemalloc 统计 Python 内存分配的峰值",
+    )
+    parser.add_argument("--json", action="store_true", help="以 JSON 输出结果")
+    return parser.parse_args(argv)
+
+
+def main(argv: list[str] | None = None) -> int:
+    args = parse_args(argv)
+    result = run(args)
+    if args.json:
+        print(json.dumps(result, ensure_ascii=False))
+    else:
+        for key, value in result.items():
+            print(f"{key:>18}: {value}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
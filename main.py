@@ -1,11 +1,36 @@
 import os
 import pathlib
 import tempfile
+import threading
+from concurrent.futures import ThreadPoolExecutor
 
 import flet as ft
 
 from src.config import get_api_key, get_prompt, load_config, set_api_key, set_prompt
-from src.subtiltes_translator.gemini import translate_subtitle
+from src.subtiltes_translator.engine import CLAUDE, GEMINI, OPENAI
+from src.subtiltes_translator.translator import (
+    TranslationCancelled,
+    resolve_engine,
+    translate_subtitle,
+)
+from src.subtiltes_translator.usage import TokenUsage, format_indexes
+from src.subtiltes_translator.utils import collect_files, target_dir_for
+
+# 进度条与预览每秒刷新的次数
+PROGRESS_FPS = 10
+
+# 批量翻译时同时处理的文件数量
+BATCH_FILES = 4
+
+# 批量翻译时所有文件共用的分片并发数量
+BATCH_CONCURRENCY = 8
+
+# 下拉框中的引擎名称与引擎标识
+ENGINE_NAMES = {
+    "OpenAI": OPENAI,
+    "Claude": CLAUDE,
+    "Google Gemini": GEMINI,
+}
 
 
 def file_path_to_relative(path: str) -> str:
@@ -20,6 +45,16 @@ def file_path_to_relative(path: str) -> str:
         return os.path.join("~", relative_path)
 
 
+def usage_text(usage: TokenUsage, estimate: TokenUsage) -> str:
+    """
+    token 用量与发送请求前的估算
+    """
+    return (
+        f"输入 {usage.input_tokens} / 输出 {usage.output_tokens} tokens"
+        f"（预估 {estimate.input_tokens} / {estimate.output_tokens}）"
+    )
+
+
 def main(page: ft.Page):
     page.title = "字幕翻译软件"
     page.window.width = 600
@@ -30,18 +65,17 @@ def main(page: ft.Page):
 
     tmp = tempfile.mkdtemp()
     config = load_config()
+    cancel_event = threading.Event()
 
     def create_settings_page(disable_back: bool = False):
         openai_key = ft.TextField(
             label="OpenAI API Key",
             value=config["openai_key"],
-            disabled=True,
             width=400,
         )
         claude_key = ft.TextField(
             label="Claude API Key",
             value=config["claude_key"],
-            disabled=True,
             width=400,
         )
         gemini_key = ft.TextField(
@@ -105,7 +139,7 @@ def main(page: ft.Page):
     def on_engine_change(e):
         selected_engine = e.control.value
         if selected_engine:
-            api_key = get_api_key(selected_engine)
+            api_key = get_api_key(ENGINE_NAMES[selected_engine])
             if not api_key:
                 page.snack_bar = ft.SnackBar(
                     content=ft.Text(f"请先设置 {selected_engine} 的 API Key"),
@@ -163,18 +197,40 @@ def main(page: ft.Page):
     )
 
     progress_bar = ft.ProgressBar(width=600, height=10, visible=False)
+    progress_text = ft.Text(size=12, visible=False)
+    preview_text = ft.Text(size=12, visible=False, max_lines=2)
+    queue_view = ft.ListView(height=120, spacing=4, visible=False)
+
+    # 待翻译的 (字幕文件, 所属目录)，选择目录时输出保持目录结构
+    selected_files: list[tuple[str, str | None]] = []
+
+    def show_selected_files():
+        if not selected_files:
+            subtitle_text.value = "未选择文件"
+            return
+        names = [file_path_to_relative(path) for path, _ in selected_files[:3]]
+        subtitle_text.value = ", ".join(names)
+        if len(selected_files) > 3:
+            subtitle_text.value += f" 等 {len(selected_files)} 个文件"
 
     def on_subtitle_result(e: ft.FilePickerResultEvent):
         if e.files:
-            relative_paths = []
-            for file in e.files:
-                relative_paths.append(file_path_to_relative(file.path))
-            subtitle_text.value = ", ".join(relative_paths)
+            selected_files[:] = collect_files([file.path for file in e.files])
             output_text.value = file_path_to_relative(
                 str(pathlib.Path(e.files[0].path).parent)
             )
         else:
-            subtitle_text.value = "未选择文件"
+            selected_files.clear()
+        show_selected_files()
+        page.update()
+
+    def on_folder_result(e: ft.FilePickerResultEvent):
+        if e.path:
+            selected_files[:] = collect_files([e.path])
+            output_text.value = file_path_to_relative(e.path)
+        else:
+            selected_files.clear()
+        show_selected_files()
         page.update()
 
     def on_output_result(e: ft.FilePickerResultEvent):
@@ -202,6 +258,9 @@ def main(page: ft.Page):
         on_change=on_prompt_change,
     )
 
+    # 翻译记忆库按提示词与模型区分，需要完全重新翻译时可以关闭
+    memory_checkbox = ft.Checkbox(label="使用翻译记忆库", value=True)
+
     def translate(e):
         if not engine_dropdown.value:
             page.snack_bar = ft.SnackBar(
@@ -217,13 +276,12 @@ def main(page: ft.Page):
             page.snack_bar.open = True
             page.update()
             return
-        if engine_dropdown.value == "Google Gemini":
+        if engine_dropdown.value in ENGINE_NAMES:
             if (
-                not subtitle_text.value
+                not selected_files
                 or not output_text.value
                 or not subtitle_language_dropdown.value
                 or output_text.value == "未选择目录"
-                or subtitle_text.value == "未选择文件"
             ):
                 page.snack_bar = ft.SnackBar(
                     content=ft.Text("请先选择字幕文件和输出目录"),
@@ -232,43 +290,213 @@ def main(page: ft.Page):
                 page.update()
                 return
 
+            files = list(selected_files)
+            rows = [
+                ft.Text(f"等待中  {file_path_to_relative(path)}", size=12)
+                for path, _ in files
+            ]
+            queue_view.controls = rows
+            queue_view.visible = True
             settings_button.disabled = True
             reset_button.disabled = True
             translate_button.disabled = True
+            cancel_button.visible = True
+            cancel_button.disabled = False
+            progress_bar.value = None
             progress_bar.visible = True
+            progress_text.value = ""
+            progress_text.visible = True
+            preview_text.value = ""
+            preview_text.visible = True
             page.update()
 
-            def update_progress(current, total):
-                progress = current / total
-                progress_bar.value = progress
+            cancel_event.clear()
+            latest_cue = None
+            # 进度或预览有未刷新到界面的更新
+            dirty = False
+            batch_done = threading.Event()
+            # 各文件的完成比例，用于计算整体进度
+            fractions = [0.0] * len(files)
+            finished = 0
+            total_usage = TokenUsage()
+            total_estimate = TokenUsage()
+            lock = threading.Lock()
+
+            def update_preview(line):
+                nonlocal latest_cue, dirty
+                # 只记录最新的条目，由 tick 随进度一起刷新
+                with lock:
+                    latest_cue = line
+                    dirty = True
+
+            def update_progress():
+                nonlocal dirty
+                # 调用方已持有 lock，只标记有更新，由 tick 刷新
+                dirty = True
+
+            def flush_progress():
+                """
+                把最新的进度与预览刷新到界面，只刷新进度相关的控件
+                """
+                nonlocal dirty
+                with lock:
+                    if not dirty:
+                        return
+                    dirty = False
+                    value = sum(fractions) / len(files)
+                    text = f"{finished}/{len(files)} 个文件，{value:.0%}"
+                    cue = latest_cue
+                progress_bar.value = value
+                progress_text.value = text
+                progress_bar.update()
+                progress_text.update()
+                if cue is not None:
+                    preview_text.value = cue.content
+                    preview_text.update()
+
+            def tick():
+                # 按固定帧率合并刷新，两帧之间的更新只保留最新状态，
+                # 最后一次更新也会在下一帧刷新
+                while not batch_done.wait(1 / PROGRESS_FPS):
+                    flush_progress()
+                flush_progress()
+
+            ticker = threading.Thread(target=tick, daemon=True)
+            ticker.start()
+
+            def set_status(index: int, status: str):
+                rows[index].value = (
+                    f"{status}  {file_path_to_relative(files[index][0])}"
+                )
+                rows[index].update()
+
+            prompt = prompt_input.value or default_prompt
+            set_prompt(prompt)
+            engine_name = ENGINE_NAMES[engine_dropdown.value]
+            use_memory = bool(memory_checkbox.value)
+
+            def run_batch(from_language: str, output_dir: str):
+                # 所有文件共用一个引擎与分片线程池，分片在文件之间连续排队，
+                # 前一个文件的最后几个分片进行时下一个文件的分片已经开始
+                try:
+                    engine = resolve_engine(
+                        engine_name, get_api_key(engine_name), None, tmp, False
+                    )
+                except Exception as e:
+                    engine = None
+                    message = f"翻译失败：{e}"
+                chunk_pool = ThreadPoolExecutor(max_workers=BATCH_CONCURRENCY)
+
+                def run_file(index: int, subtitle_file: str, base_dir: str | None):
+                    nonlocal finished
+                    if cancel_event.is_set():
+                        set_status(index, "已取消")
+                        return None
+                    set_status(index, "翻译中")
+
+                    def on_progress(current, total):
+                        with lock:
+                            fractions[index] = current / total
+                            update_progress()
+
+                    try:
+                        job_usage = translate_subtitle(
+                            prompt=prompt,
+                            subtitle_file=subtitle_file,
+                            target_language="中文",
+                            from_language=from_language,
+                            target_dir=target_dir_for(
+                                subtitle_file, base_dir, output_dir, "mirror"
+                            ),
+                            api_key="",
+                            progress_callback=on_progress,
+                            cancel_event=cancel_event,
+                            engine=engine,
+                            stream=True,
+                            cue_callback=update_preview,
+                            executor=chunk_pool,
+                            use_memory=use_memory,
+                        )
+                    except TranslationCancelled:
+                        set_status(index, "已取消")
+                        return None
+                    except Exception as e:
+                        set_status(index, f"失败：{e}")
+                        return False
+                    used = job_usage.total
+                    untranslated = job_usage.untranslated
+                    if untranslated:
+                        # 输出文件中混有原文，再次翻译时只重试这些条目
+                        set_status(
+                            index,
+                            f"未完成：{len(untranslated)} 条保留原文"
+                            f"（序号 {format_indexes(untranslated)}）",
+                        )
+                    else:
+                        set_status(
+                            index, f"完成 {usage_text(used, job_usage.estimate)}"
+                        )
+                    with lock:
+                        fractions[index] = 1.0
+                        finished += 1
+                        total_usage.add(used)
+                        total_estimate.add(job_usage.estimate)
+                        update_progress()
+                    return not untranslated
+
+                if engine is not None:
+                    os.makedirs(output_dir, exist_ok=True)
+                    with ThreadPoolExecutor(max_workers=BATCH_FILES) as file_pool:
+                        results = list(
+                            file_pool.map(
+                                run_file,
+                                range(len(files)),
+                                [path for path, _ in files],
+                                [base for _, base in files],
+                            )
+                        )
+                    if cancel_event.is_set():
+                        message = f"翻译已取消，完成 {results.count(True)} 个文件"
+                    elif False in results:
+                        message = f"完成 {results.count(True)}/{len(files)} 个文件"
+                    else:
+                        message = "翻译完成"
+                    if finished:
+                        message += f"，{usage_text(total_usage, total_estimate)}"
+                chunk_pool.shutdown(wait=False, cancel_futures=True)
+                batch_done.set()
+                ticker.join()
+
+                progress_bar.value = 0
+                progress_bar.visible = False
+                progress_text.visible = False
+                preview_text.visible = False
+                cancel_button.visible = False
+
+                snack_bar = ft.SnackBar(content=ft.Text(message))
+                page.overlay.append(snack_bar)
+                snack_bar.open = True
+                settings_button.disabled = False
+                reset_button.disabled = False
+                translate_button.disabled = False
                 page.update()
 
-            set_prompt(prompt_input.value or default_prompt)
-
-            translate_subtitle(
-                prompt=prompt_input.value or default_prompt,
-                subtitle_file=subtitle_text.value,
-                target_language="中文",
-                from_language=subtitle_language_dropdown.value,
-                target_dir=output_text.value,
-                api_key=get_api_key("gemini"),
-                tmp_dir=tmp,
-                progress_callback=update_progress,
+            # 在后台线程中翻译，避免阻塞界面
+            page.run_thread(
+                run_batch,
+                subtitle_language_dropdown.value,
+                os.path.expanduser(output_text.value),
             )
 
-            progress_bar.value = 0
-            progress_bar.visible = False
-            page.update()
-
-            snack_bar = ft.SnackBar(content=ft.Text("翻译完成"))
-            page.overlay.append(snack_bar)
-            snack_bar.open = True
-            settings_button.disabled = False
-            reset_button.disabled = False
-            translate_button.disabled = False
-            page.update()
+    def cancel(e):
+        cancel_event.set()
+        cancel_button.disabled = True
+        cancel_button.update()
 
     def reset(e):
+        selected_files.clear()
+        queue_view.controls = []
+        queue_view.visible = False
         subtitle_text.value = ""
         output_text.value = ""
         engine_dropdown.value = None
@@ -285,12 +513,21 @@ def main(page: ft.Page):
         "选择字幕文件",
         icon=ft.icons.UPLOAD_FILE,
         on_click=lambda _: subtitle_picker.pick_files(
-            allowed_extensions=["srt", "ass"], allow_multiple=False
+            allowed_extensions=["srt", "ass", "ssa"], allow_multiple=True
         ),
         style=ft.ButtonStyle(shape=ft.RoundedRectangleBorder(radius=10)),
     )
     subtitle_text = ft.Text(size=14)
 
+    folder_picker = ft.FilePicker(on_result=on_folder_result)
+    page.overlay.append(folder_picker)
+    folder_button = ft.ElevatedButton(
+        "选择字幕目录",
+        icon=ft.icons.FOLDER_OPEN,
+        on_click=lambda _: folder_picker.get_directory_path(),
+        style=ft.ButtonStyle(shape=ft.RoundedRectangleBorder(radius=10)),
+    )
+
     output_picker = ft.FilePicker(on_result=on_output_result)
     page.overlay.append(output_picker)
     output_button = ft.ElevatedButton(
@@ -313,6 +550,13 @@ def main(page: ft.Page):
         style=ft.ButtonStyle(shape=ft.RoundedRectangleBorder(radius=10)),
         width=150,
     )
+    cancel_button = ft.ElevatedButton(
+        "取消",
+        on_click=cancel,
+        style=ft.ButtonStyle(shape=ft.RoundedRectangleBorder(radius=10)),
+        width=150,
+        visible=False,
+    )
 
     settings_button = ft.IconButton(
         icon=ft.icons.SETTINGS,
@@ -331,15 +575,20 @@ def main(page: ft.Page):
                     ),
                     subtitle_language_dropdown,
                     prompt_input,
+                    memory_checkbox,
                     ft.Column(
                         [
-                            ft.Row([subtitle_button, subtitle_text]),
+                            ft.Row([subtitle_button, folder_button]),
+                            subtitle_text,
                             ft.Row([output_button, output_text]),
                             ft.Row(
-                                [translate_button, reset_button],
+                                [translate_button, reset_button, cancel_button],
                                 alignment=ft.MainAxisAlignment.CENTER,
                             ),
                             progress_bar,
+                            progress_text,
+                            preview_text,
+                            queue_view,
                         ],
                         spacing=20,
                     ),
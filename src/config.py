@@ -1,9 +1,16 @@
+import atexit
+import copy
 import json
 import os
+import tempfile
+import threading
 from typing import TypedDict
 
 CONFIG_FILE = "config.json"
 
+# 批量保存的延迟时间（秒），期间的多次修改合并为一次写入
+SAVE_DELAY = 0.5
+
 
 class ConfigDict(TypedDict):
     openai_key: str
@@ -12,11 +19,7 @@ class ConfigDict(TypedDict):
     prompt: str
 
 
-def load_config() -> ConfigDict:
-    if os.path.exists(CONFIG_FILE):
-        with open(CONFIG_FILE, "r") as f:
-            return ConfigDict(**json.load(f))
-
+def default_config() -> ConfigDict:
     return ConfigDict(
         openai_key="",
         claude_key="",
@@ -25,28 +28,121 @@ def load_config() -> ConfigDict:
     )
 
 
+class ConfigStore:
+    """
+    进程内配置缓存：只在配置文件修改后重新读取，写入时先写临时文件再重命名，
+    并将短时间内的多次修改合并为一次保存
+    """
+
+    def __init__(self, path: str = CONFIG_FILE):
+        self.path = path
+        self._lock = threading.RLock()
+        self._config: ConfigDict | None = None
+        self._stamp: tuple[int, int] | None = None
+        self._timer: threading.Timer | None = None
+        self._dirty = False
+
+    def _file_stamp(self) -> tuple[int, int] | None:
+        try:
+            stat = os.stat(self.path)
+        except FileNotFoundError:
+            return None
+        return stat.st_mtime_ns, stat.st_size
+
+    def load(self) -> ConfigDict:
+        """
+        返回当前配置，配置文件被外部修改时重新读取
+        """
+        with self._lock:
+            # 有未保存的修改时以内存中的配置为准
+            if not self._dirty:
+                stamp = self._file_stamp()
+                if self._config is None or stamp != self._stamp:
+                    self._config = self._read()
+                    self._stamp = stamp
+            assert self._config is not None
+            return self._config
+
+    def _read(self) -> ConfigDict:
+        if os.path.exists(self.path):
+            with open(self.path, "r") as f:
+                return ConfigDict(**json.load(f))
+        return default_config()
+
+    def update(self, **values: str):
+        """
+        修改配置，并在 SAVE_DELAY 秒后保存
+        """
+        with self._lock:
+            config = self.load()
+            config.update(values)  # type: ignore
+            self._dirty = True
+            if self._timer is None:
+                self._timer = threading.Timer(SAVE_DELAY, self.flush)
+                self._timer.daemon = True
+                self._timer.start()
+
+    def save(self, config: ConfigDict):
+        """
+        立即保存整个配置
+        """
+        with self._lock:
+            self._config = config
+            self._dirty = True
+            self.flush()
+
+    def flush(self):
+        """
+        将内存中的配置写入文件
+        """
+        with self._lock:
+            if self._timer is not None:
+                self._timer.cancel()
+                self._timer = None
+            if not self._dirty or self._config is None:
+                return
+            directory = os.path.dirname(os.path.abspath(self.path))
+            fd, tmp = tempfile.mkstemp(dir=directory, suffix=".tmp")
+            try:
+                with os.fdopen(fd, "w") as f:
+                    json.dump(self._config, f)
+                os.replace(tmp, self.path)
+            except BaseException:
+                os.unlink(tmp)
+                raise
+            self._stamp = self._file_stamp()
+            self._dirty = False
+
+
+_store = ConfigStore()
+# 退出前保存尚未写入的修改
+atexit.register(_store.flush)
+
+
+def load_config() -> ConfigDict:
+    # 返回副本，避免调用方修改缓存中的配置
+    return copy.deepcopy(_store.load())
+
+
 def save_config(config: ConfigDict):
-    with open(CONFIG_FILE, "w") as f:
-        json.dump(config, f)
+    _store.save(copy.deepcopy(config))
+
+
+def flush_config():
+    _store.flush()
 
 
 def get_api_key(engine: str) -> str:
-    config = load_config()
-    return config.get(f"{engine.lower()}_key", "")
+    return _store.load().get(f"{engine.lower()}_key", "")
 
 
 def set_api_key(engine: str, key: str):
-    config = load_config()
-    config[f"{engine.lower()}_key"] = key
-    save_config(config)
+    _store.update(**{f"{engine.lower()}_key": key})
 
 
 def get_prompt() -> str:
-    config = load_config()
-    return config.get("prompt", "")
+    return _store.load().get("prompt", "")
 
 
 def set_prompt(prompt: str):
-    config = load_config()
-    config["prompt"] = prompt
-    save_config(config)
+    _store.update(prompt=prompt)
@@ -0,0 +1,178 @@
+import datetime
+import re
+from typing import Any, Callable
+
+import srt
+
+from .utils import WireFormat, decode_text_cue
+
+# 按时间轴匹配时允许的误差
+TIME_TOLERANCE = datetime.timedelta(milliseconds=500)
+
+# 无法解析或无法对应的条目超过该数量时认为输出已经偏离，提前结束请求
+MAX_STREAM_ERRORS = 3
+
+# 紧凑文本格式中的一行「序号: 译文」
+TEXT_CUE = re.compile(r"^\[?(\d+)\]?\s*[:：]\s*(.*)$")
+
+
+class CueStreamParser:
+    """
+    增量解析模型输出的 srt 内容，并将条目对应回原文条目。
+    优先按序号对应，序号对不上或时间轴明显不一致时按开始时间对应，
+    内容为空、重复或无法对应的条目会被丢弃。
+    每个条目完整后立即通过 on_cue 回调 (原文序号, 译文)
+    """
+
+    # 条目之间的分隔：srt 条目之间为空行
+    separator = re.compile(r"\r?\n[ \t\r]*\n")
+
+    def __init__(
+        self,
+        chunk: list[Any],
+        on_cue: Callable[[int, str], None] | None = None,
+        max_errors: int = MAX_STREAM_ERRORS,
+    ):
+        self.by_index = {line.index: line for line in chunk}
+        self.by_start = sorted(chunk, key=lambda line: line.start)
+        self.on_cue = on_cue
+        self.max_errors = max_errors
+        self.reset()
+
+    def reset(self):
+        """
+        丢弃已解析的内容，重新开始解析
+        """
+        self.text = ""
+        self.pos = 0
+        self.fences = 0
+        self.errors = 0
+        self.translated: dict[int, str] = {}
+
+    @property
+    def aborted(self) -> bool:
+        """
+        输出是否已经偏离，不应继续接收或缓存
+        """
+        return self.errors > self.max_errors
+
+    def feed(self, text: str) -> bool:
+        """
+        text 为目前为止收到的完整输出，与之前的输出不连续时（请求重试）重新开始解析。
+        返回 False 表示输出已经偏离，应提前结束请求
+        """
+        if not text.startswith(self.text):
+            self.reset()
+        self.text = text
+        # 最后一个条目可能还不完整，只解析后面已经出现空行的条目
+        while self.fences < 2:
+            match = self.separator.search(text, self.pos)
+            if match is None:
+                break
+            self.add_block(text[self.pos : match.start()])
+            self.pos = match.end()
+        return not self.aborted
+
+    def finish(self) -> dict[int, str]:
+        """
+        输出结束，解析剩余内容并返回原文序号到译文的映射
+        """
+        if self.fences < 2:
+            self.add_block(self.text[self.pos :])
+            self.pos = len(self.text)
+        return self.translated
+
+    def add_block(self, block: str):
+        """
+        解析一个条目，仅保留```包裹的内容，去掉代码块的语言标记
+        """
+        lines = []
+        for line in block.splitlines():
+            if line.lstrip().startswith("```"):
+                self.fences += 1
+                if self.fences >= 2:
+                    break
+                continue
+            lines.append(line)
+        content = "\n".join(lines).strip()
+        if not content:
+            return
+        cues = self.parse_block(content)
+        if not cues:
+            self.errors += 1
+        for index, start, text in cues:
+            if not self.add_cue(index, start, text):
+                self.errors += 1
+
+    def parse_block(
+        self, content: str
+    ) -> list[tuple[int, datetime.timedelta | None, str]]:
+        """
+        解析一个条目，返回 (序号, 开始时间, 译文)
+        """
+        return [
+            (cue.index, cue.start, cue.content)
+            for cue in srt.parse(content, ignore_errors=True)
+        ]
+
+    def add_cue(
+        self, index: int, start: datetime.timedelta | None, content: str
+    ) -> bool:
+        """
+        将条目对应回原文条目，无法对应或重复时返回 False，
+        start 为 None 时只按序号对应
+        """
+        content = content.strip()
+        if not content:
+            return True
+        source = self.by_index.get(index)
+        if start is not None and (
+            source is None
+            or source.index in self.translated
+            or abs(source.start - start) > TIME_TOLERANCE
+        ):
+            source = self.match_start(start)
+        if source is None or source.index in self.translated:
+            return False
+        self.translated[source.index] = content
+        if self.on_cue:
+            self.on_cue(source.index, content)
+        return True
+
+    def match_start(self, start: datetime.timedelta) -> Any | None:
+        for line in self.by_start:
+            if line.index in self.translated:
+                continue
+            if abs(line.start - start) <= TIME_TOLERANCE:
+                return line
+        return None
+
+
+class TextStreamParser(CueStreamParser):
+    """
+    增量解析紧凑文本格式的输出：每行一条「序号: 译文」，没有时间轴，只按序号对应
+    """
+
+    separator = re.compile(r"\r?\n")
+
+    def parse_block(
+        self, content: str
+    ) -> list[tuple[int, datetime.timedelta | None, str]]:
+        match = TEXT_CUE.match(content)
+        if match is None:
+            return []
+        return [(int(match[1]), None, decode_text_cue(match[2]))]
+
+
+def create_cue_parser(
+    wire_format: WireFormat,
+    chunk: list[Any],
+    on_cue: Callable[[int, str], None] | None = None,
+) -> CueStreamParser:
+    """
+    根据发送给模型的格式创建输出解析器
+    """
+    if wire_format == WireFormat.TEXT:
+        return TextStreamParser(chunk, on_cue)
+    return CueStreamParser(chunk, on_cue)
+
@@ -0,0 +1,269 @@
+import asyncio
+import dataclasses
+import threading
+import time
+from typing import Any, Awaitable, Callable, TypeVar
+
+from . import tracing
+from .engine import TranslationEngine
+from .scheduler import error_status, is_retryable, retry_after
+
+# 健康分数的平滑系数，越大越看重最近一次请求的结果
+HEALTH_ALPHA = 0.2
+
+# 节点请求失败后暂停使用的基础时间（秒），连续失败时成倍增加
+FAILURE_COOLDOWN = 5.0
+
+# 暂停使用的最长时间（秒）
+MAX_COOLDOWN = 300.0
+
+T = TypeVar("T")
+
+# 各 SDK 中网络连接错误的类名，这些错误没有 HTTP 状态码，且不继承 OSError
+TRANSPORT_ERRORS = {"APIConnectionError", "TransportError"}
+
+
+def should_fail_over(error: BaseException) -> bool:
+    """
+    判断请求失败后是否切换到其他节点：可重试的错误与网络错误换个节点可能成功，
+    其他错误（例如内容被安全策略拦截、400 请求错误）换节点也会失败，直接抛出
+    """
+    if is_retryable(error) or isinstance(error, OSError):
+        return True
+    return any(cls.__name__ in TRANSPORT_ERRORS for cls in type(error).__mro__)
+
+
+@dataclasses.dataclass
+class Endpoint:
+    """
+    负载均衡中的一个节点，即一个引擎与 API Key 的组合
+    """
+
+    engine: TranslationEngine
+    in_flight: int = 0
+    health: float = 1.0
+    failures: int = 0
+    cooldown_until: float = 0.0
+
+    def load(self) -> float:
+        """
+        节点负载，综合考虑进行中的请求数量、并发上限与健康分数
+        """
+        capacity = self.engine.max_concurrency * max(self.health, 0.01)
+        return (self.in_flight + 1) / capacity
+
+
+class LoadBalancer(TranslationEngine):
+    """
+    将请求分发到多个引擎节点：每个节点使用自己的调度器限流，
+    每次请求选择负载最低的健康节点，失败时暂停该节点并立即切换到其他节点，
+    所有节点都失败后才退避重试
+    """
+
+    name = "balancer"
+
+    def __init__(self, engines: list[TranslationEngine]):
+        if not engines:
+            raise ValueError("LoadBalancer requires at least one engine")
+        # 同一模型的多个 API Key 输出相同，缓存只区分模型，增减 Key 时缓存仍然有效
+        super().__init__(
+            "+".join(sorted({engine.cache_identity()[0] for engine in engines})),
+            engines[0].scheduler,
+        )
+        self.endpoints = [Endpoint(engine) for engine in engines]
+        # 分片需要适配所有节点的输出上限
+        self.max_output_tokens = min(engine.max_output_tokens for engine in engines)
+        self.max_concurrency = sum(engine.max_concurrency for engine in engines)
+        self._lock = threading.Lock()
+
+    def cache_identity(self) -> tuple[str, dict[str, Any]]:
+        # 不加 balancer 前缀，只有一个模型时与单独使用该引擎的缓存键相同
+        return self.model_name, self.endpoints[0].engine.cache_identity()[1]
+
+    def acquire(self, tried: set[int]) -> Endpoint | None:
+        """
+        选择负载最低的可用节点，所有节点都在暂停期时选择最早恢复的节点
+        """
+        with self._lock:
+            now = time.monotonic()
+            candidates = [
+                endpoint
+                for index, endpoint in enumerate(self.endpoints)
+                if index not in tried
+            ]
+            if not candidates:
+                return None
+            healthy = [e for e in candidates if e.cooldown_until <= now]
+            if healthy:
+                endpoint = min(healthy, key=Endpoint.load)
+            else:
+                endpoint = min(candidates, key=lambda e: e.cooldown_until)
+            endpoint.in_flight += 1
+            return endpoint
+
+    def release(
+        self, endpoint: Endpoint, success: bool, error: BaseException | None = None
+    ):
+        """
+        请求结束后更新节点状态，失败时暂停使用该节点，
+        服务端建议了重试等待时间时至少暂停该时间
+        """
+        with self._lock:
+            endpoint.in_flight -= 1
+            outcome = 1.0 if success else 0.0
+            endpoint.health += HEALTH_ALPHA * (outcome - endpoint.health)
+            if success:
+                endpoint.failures = 0
+                endpoint.cooldown_until = 0.0
+            else:
+                endpoint.failures += 1
+                cooldown = min(
+                    MAX_COOLDOWN, FAILURE_COOLDOWN * 2 ** (endpoint.failures - 1)
+                )
+                delay = retry_after(error) if error is not None else None
+                if delay is not None:
+                    cooldown = max(cooldown, min(MAX_COOLDOWN, delay))
+                endpoint.cooldown_until = time.monotonic() + cooldown
+
+    def dispatch_once(self, call: Callable[[TranslationEngine], T]) -> T:
+        """
+        选择节点执行 call，每个节点只尝试一次：可重试的错误或网络错误时暂停该节点，
+        立即切换到其他节点，所有节点都失败时抛出最后的错误，其他错误直接抛出
+        """
+        tried: set[int] = set()
+        last_error: Exception | None = None
+        while True:
+            endpoint = self.acquire(tried)
+            if endpoint is None:
+                assert last_error is not None
+                raise last_error
+            tried.add(self.endpoints.index(endpoint))
+            try:
+                result = call(endpoint.engine)
+            except Exception as e:
+                if not should_fail_over(e):
+                    # 节点正常返回了响应，不影响健康分数
+                    self.release(endpoint, True)
+                    raise
+                self.release(endpoint, False, e)
+                last_error = e
+                continue
+            self.release(endpoint, True)
+            return result
+
+    async def dispatch_once_async(
+        self, call: Callable[[TranslationEngine], Awaitable[T]]
+    ) -> T:
+        """
+        dispatch_once 的异步版本
+        """
+        tried: set[int] = set()
+        last_error: Exception | None = None
+        while True:
+            endpoint = self.acquire(tried)
+            if endpoint is None:
+                assert last_error is not None
+                raise last_error
+            tried.add(self.endpoints.index(endpoint))
+            try:
+                result = await call(endpoint.engine)
+            except Exception as e:
+                if not should_fail_over(e):
+                    # 节点正常返回了响应，不影响健康分数
+                    self.release(endpoint, True)
+                    raise
+                self.release(endpoint, False, e)
+                last_error = e
+                continue
+            self.release(endpoint, True)
+            return result
+
+    def dispatch(self, call: Callable[[TranslationEngine], T], retry: bool = True) -> T:
+        """
+        按 dispatch_once 轮流尝试各节点，所有节点都失败后才按调度器的策略退避，
+        再开始新一轮，最多重试 max_retries 轮。retry 为 False 时只尝试一轮
+        """
+        attempt = 0
+        while True:
+            try:
+                return self.dispatch_once(call)
+            except Exception as e:
+                if (
+                    not retry
+                    or not should_fail_over(e)
+                    or attempt >= self.scheduler.max_retries
+                ):
+                    raise
+                tracing.add("retries")
+                with tracing.span(
+                    "retry", attempt=attempt + 1, error=repr(e), status=error_status(e)
+                ):
+                    time.sleep(self.scheduler.backoff(attempt, e))
+                attempt += 1
+
+    async def dispatch_async(
+        self, call: Callable[[TranslationEngine], Awaitable[T]], retry: bool = True
+    ) -> T:
+        """
+        dispatch 的异步版本
+        """
+        attempt = 0
+        while True:
+            try:
+                return await self.dispatch_once_async(call)
+            except Exception as e:
+                if (
+                    not retry
+                    or not should_fail_over(e)
+                    or attempt >= self.scheduler.max_retries
+                ):
+                    raise
+                tracing.add("retries")
+                with tracing.span(
+                    "retry", attempt=attempt + 1, error=repr(e), status=error_status(e)
+                ):
+                    await asyncio.sleep(self.scheduler.backoff(attempt, e))
+                attempt += 1
+
+    def request(self, prompt: str, text: str) -> str:
+        return self.generate(prompt, text, retry=False)
+
+    async def request_async(self, prompt: str, text: str) -> str:
+        return await self.generate_async(prompt, text, retry=False)
+
+    # 各节点使用自己的调度器限流，每轮对每个节点只请求一次，重试由负载均衡负责
+    def generate(self, prompt: str, text: str, retry: bool = True) -> str:
+        return self.dispatch(
+            lambda engine: engine.generate(prompt, text, retry=False), retry
+        )
+
+    async def generate_async(self, prompt: str, text: str, retry: bool = True) -> str:
+        return await self.dispatch_async(
+            lambda engine: engine.generate_async(prompt, text, retry=False), retry
+        )
+
+    def generate_stream(
+        self,
+        prompt: str,
+        text: str,
+        on_text: Callable[[str], bool],
+        retry: bool = True,
+    ) -> str:
+        return self.dispatch(
+            lambda engine: engine.generate_stream(prompt, text, on_text, retry=False),
+            retry,
+        )
+
+    async def generate_stream_async(
+        self,
+        prompt: str,
+        text: str,
+        on_text: Callable[[str], bool],
+        retry: bool = True,
+    ) -> str:
+        return await self.dispatch_async(
+            lambda engine: engine.generate_stream_async(
+                prompt, text, on_text, retry=False
+            ),
+            retry,
+        )
@@ -0,0 +1,162 @@
+import hashlib
+import json
+import os
+import pathlib
+import tempfile
+import threading
+import unicodedata
+from typing import Any
+
+# 默认缓存目录大小上限：512 MiB
+DEFAULT_CACHE_SIZE = 512 * 1024 * 1024
+
+# 每写入该数量的条目重新统计一次缓存目录的大小，
+# 其他进程或实例写入的条目也能计入
+EVICT_CHECK_INTERVAL = 100
+
+# 淘汰时删除到大小上限的该比例以下，避免接近上限时每次写入都要淘汰
+EVICT_TARGET_RATIO = 0.9
+
+
+def default_cache_dir() -> str:
+    """
+    默认缓存目录，遵循 XDG_CACHE_HOME
+    """
+    base = os.environ.get("XDG_CACHE_HOME") or os.path.expanduser("~/.cache")
+    return os.path.join(base, "subtiltes-translator")
+
+
+def normalize_text(text: str) -> str:
+    """
+    规范化文本，忽略换行符、行尾空白与 Unicode 组合形式的差异
+    """
+    text = unicodedata.normalize("NFC", text)
+    return "\n".join(line.rstrip() for line in text.strip().splitlines())
+
+
+class TranslationCache:
+    """
+    以内容哈希为键的翻译结果缓存，超过 max_size 时按最近使用时间淘汰。
+    写入时累加估算的总大小，只在超过上限或每写入 EVICT_CHECK_INTERVAL 个条目时
+    统计缓存目录
+    """
+
+    def __init__(
+        self, cache_dir: str | None = None, max_size: int = DEFAULT_CACHE_SIZE
+    ):
+        self.cache_dir = pathlib.Path(
+            os.path.expanduser(cache_dir or default_cache_dir())
+        )
+        self.max_size = max_size
+        # 估算的缓存总大小，首次写入时统计
+        self._size: int | None = None
+        self._writes = 0
+        self._lock = threading.Lock()
+        self._evict_lock = threading.Lock()
+        self.cache_dir.mkdir(parents=True, exist_ok=True)
+
+    @staticmethod
+    def make_key(
+        text: str,
+        prompt: str,
+        model_name: str,
+        generation_config: Any,
+        from_language: str,
+        target_language: str,
+    ) -> str:
+        """
+        根据原文、提示词、模型、生成配置和语言计算缓存键
+        """
+        payload = json.dumps(
+            {
+                "text": normalize_text(text),
+                "prompt": prompt,
+                "model": model_name,
+                "generation_config": generation_config,
+                "from": from_language,
+                "to": target_language,
+            },
+            ensure_ascii=False,
+            sort_keys=True,
+            default=str,
+        )
+        return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+    def _path(self, key: str) -> pathlib.Path:
+        return self.cache_dir / key[:2] / f"{key}.txt"
+
+    def get(self, key: str) -> str | None:
+        """
+        读取缓存，未命中时返回 None
+        """
+        path = self._path(key)
+        try:
+            with path.open("r", encoding="utf-8") as f:
+                text = f.read()
+        except FileNotFoundError:
+            return None
+        # 更新修改时间，用于 LRU 淘汰
+        try:
+            os.utime(path)
+        except FileNotFoundError:
+            pass
+        return text
+
+    def set(self, key: str, text: str):
+        """
+        写入缓存，先写临时文件再重命名，避免读到写了一半的内容
+        """
+        path = self._path(key)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        fd, tmp = tempfile.mkstemp(dir=path.parent, suffix=".tmp")
+        try:
+            with os.fdopen(fd, "w", encoding="utf-8") as f:
+                f.write(text)
+            os.replace(tmp, path)
+        except BaseException:
+            os.unlink(tmp)
+            raise
+        with self._lock:
+            self._writes += 1
+            if self._size is not None:
+                self._size += len(text.encode("utf-8"))
+            check = (
+                self._size is None
+                or self._size > self.max_size
+                or self._writes % EVICT_CHECK_INTERVAL == 0
+            )
+        if check:
+            self.evict()
+
+    def evict(self):
+        """
+        统计缓存目录的大小，超过大小上限时删除最久未使用的条目。
+        其他线程正在淘汰时直接返回
+        """
+        if not self._evict_lock.acquire(blocking=False):
+            return
+        try:
+            entries = []
+            total = 0
+            for path in self.cache_dir.glob("*/*.txt"):
+                try:
+                    stat = path.stat()
+                except FileNotFoundError:
+                    continue
+                entries.append((stat.st_mtime, stat.st_size, path))
+                total += stat.st_size
+            if total > self.max_size:
+                target = self.max_size * EVICT_TARGET_RATIO
+                entries.sort()
+                for _, size, path in entries:
+                    try:
+                        path.unlink()
+                    except FileNotFoundError:
+                        pass
+                    total -= size
+                    if total <= target:
+                        break
+            with self._lock:
+                self._size = total
+        finally:
+            self._evict_lock.release()
@@ -0,0 +1,81 @@
+import functools
+import re
+import unicodedata
+
+# 各语言使用的文字，用于判断条目是否已经是目标语言
+LANGUAGE_SCRIPTS = {
+    "中文": {"CJK"},
+    "chinese": {"CJK"},
+    "zh": {"CJK"},
+    "英语": {"LATIN"},
+    "english": {"LATIN"},
+    "en": {"LATIN"},
+    "日语": {"CJK", "HIRAGANA", "KATAKANA"},
+    "japanese": {"CJK", "HIRAGANA", "KATAKANA"},
+    "ja": {"CJK", "HIRAGANA", "KATAKANA"},
+    "韩语": {"HANGUL", "CJK"},
+    "korean": {"HANGUL", "CJK"},
+    "ko": {"HANGUL", "CJK"},
+    "法语": {"LATIN"},
+    "french": {"LATIN"},
+    "fr": {"LATIN"},
+    "德语": {"LATIN"},
+    "german": {"LATIN"},
+    "de": {"LATIN"},
+    "西班牙语": {"LATIN"},
+    "spanish": {"LATIN"},
+    "es": {"LATIN"},
+    "俄语": {"CYRILLIC"},
+    "russian": {"CYRILLIC"},
+    "ru": {"CYRILLIC"},
+}
+
+# 字幕中的格式标签与 ass 特效标签占位符
+MARKUP = re.compile(r"\{[^{}]*\}|<[^<>]*>")
+
+# 只有说话人的行，例如 "JOHN:"、"- [旁白]："
+SPEAKER_TAG = re.compile(
+    r"^[-–—]?\s*(?:[A-Z][A-Z0-9 .'-]{0,29}|[\[(（【][^\])）】]{1,30}[\])）】])\s*[:：]$"
+)
+
+
+@functools.lru_cache(maxsize=4096)
+def char_script(char: str) -> str:
+    """
+    字符所属的文字，例如 LATIN、CJK、HIRAGANA，全角与半角字符按对应的文字处理
+    """
+    words = unicodedata.name(char, "").split()
+    if words and words[0] in ("FULLWIDTH", "HALFWIDTH"):
+        words = words[1:]
+    return words[0] if words else ""
+
+
+def language_scripts(language: str) -> set[str]:
+    """
+    语言使用的文字，未知语言返回空集合
+    """
+    return LANGUAGE_SCRIPTS.get(language.strip().lower(), set())
+
+
+def is_translatable(text: str, from_language: str, target_language: str) -> bool:
+    """
+    判断条目是否需要翻译：只有标点、数字、音乐符号或说话人标签的条目，
+    以及所有文字都属于目标语言（且与原语言的文字不重叠）的条目无需翻译
+    """
+    text = MARKUP.sub("", text)
+    lines = [line.strip() for line in text.splitlines() if line.strip()]
+    lines = [line for line in lines if not SPEAKER_TAG.match(line)]
+
+    scripts = set()
+    for line in lines:
+        for char in line:
+            if unicodedata.category(char).startswith("L"):
+                scripts.add(char_script(char))
+    if not scripts:
+        return False
+
+    target_scripts = language_scripts(target_language)
+    # 原语言与目标语言使用相同文字时（例如日语与中文都使用汉字）无法区分，全部翻译
+    if target_scripts & language_scripts(from_language):
+        return True
+    return not target_scripts or not scripts <= target_scripts
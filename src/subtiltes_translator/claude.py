@@ -0,0 +1,90 @@
+from typing import Any, AsyncGenerator, Generator
+
+from .engine import CLAUDE, ENGINE_DEFAULTS, TranslationEngine
+from .scheduler import RequestScheduler
+
+DEFAULT_MODEL = ENGINE_DEFAULTS[CLAUDE].model_name
+
+
+def response_text(response: Any) -> str:
+    """
+    拼接响应中的文本内容
+    """
+    return "".join(block.text for block in response.content if block.type == "text")
+
+
+class ClaudeEngine(TranslationEngine):
+    """
+    Anthropic Claude 翻译引擎，提示词作为 system，分片作为 user 消息
+    """
+
+    name = CLAUDE
+    max_output_tokens = ENGINE_DEFAULTS[CLAUDE].max_output_tokens
+    max_concurrency = 8
+
+    def __init__(
+        self,
+        api_key: str,
+        model_name: str = DEFAULT_MODEL,
+        scheduler: RequestScheduler | None = None,
+        temperature: float = 1.0,
+    ):
+        try:
+            import anthropic
+        except ImportError as e:
+            raise ImportError(
+                "使用 Claude 引擎需要安装 anthropic：pip install anthropic"
+            ) from e
+
+        super().__init__(model_name, scheduler)
+        self.client = anthropic.Anthropic(api_key=api_key)
+        self.async_client = anthropic.AsyncAnthropic(api_key=api_key)
+        self.generation_config = {
+            **ENGINE_DEFAULTS[CLAUDE].generation_config,
+            "temperature": temperature,
+        }
+
+    def report_response_usage(self, response: Any):
+        self.report_usage(response.usage.input_tokens, response.usage.output_tokens)
+
+    def request(self, prompt: str, text: str) -> str:
+        response = self.client.messages.create(
+            model=self.model_name,
+            system=prompt,
+            messages=[{"role": "user", "content": text}],
+            **self.generation_config,
+        )
+        self.report_response_usage(response)
+        return response_text(response)
+
+    async def request_async(self, prompt: str, text: str) -> str:
+        response = await self.async_client.messages.create(
+            model=self.model_name,
+            system=prompt,
+            messages=[{"role": "user", "content": text}],
+            **self.generation_config,
+        )
+        self.report_response_usage(response)
+        return response_text(response)
+
+    def stream(self, prompt: str, text: str) -> Generator[str, None, None]:
+        with self.client.messages.stream(
+            model=self.model_name,
+            system=prompt,
+            messages=[{"role": "user", "content": text}],
+            **self.generation_config,
+        ) as stream:
+            yield from stream.text_stream
+            # 提前结束时没有完整的响应，按文本估算用量
+            self.report_response_usage(stream.get_final_message())
+
+    async def stream_async(self, prompt: str, text: str) -> AsyncGenerator[str, None]:
+        async with self.async_client.messages.stream(
+            model=self.model_name,
+            system=prompt,
+            messages=[{"role": "user", "content": text}],
+            **self.generation_config,
+        ) as stream:
+            async for piece in stream.text_stream:
+                yield piece
+            self.report_response_usage(await stream.get_final_message())
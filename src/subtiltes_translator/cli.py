@@ -0,0 +1,443 @@
+import argparse
+import os
+import sys
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from .balancer import LoadBalancer
+from .engine import (
+    CLAUDE,
+    ENGINES,
+    GEMINI,
+    OPENAI,
+    OfflineEngine,
+    TranslationEngine,
+    create_engine,
+)
+from .memory import DEFAULT_FUZZY_THRESHOLD
+from .scheduler import (
+    DEFAULT_MAX_RETRIES,
+    DEFAULT_REQUESTS_PER_MINUTE,
+    DEFAULT_TOKENS_PER_MINUTE,
+    RequestScheduler,
+)
+from .metrics import TranslationMetrics
+from .tracing import Tracer
+from .translator import (
+    DEFAULT_CONCURRENCY,
+    DEFAULT_CONTEXT_CUES,
+    estimate_subtitle,
+    output_file_path,
+    translate_subtitle,
+)
+from .usage import TokenUsage, format_indexes
+from .utils import (
+    ChunkStrategy,
+    WireFormat,
+    collect_files,
+    target_dir_for,
+)
+
+DEFAULT_PROMPT = "你正在翻译一个 SRT 字幕文件。请根据前后文修正转录错误的内容，并翻译成中文母语者熟悉的表达方式。需要你保持原有文件格式进行输出，无需进行说明，保证原意不变，不生成任何 SRT 文件中不存在的内容"
+
+# 各引擎读取 API Key 的环境变量
+API_KEY_ENV = {
+    GEMINI: ("GEMINI_API_KEY", "GOOGLE_API_KEY"),
+    OPENAI: ("OPENAI_API_KEY",),
+    CLAUDE: ("ANTHROPIC_API_KEY",),
+}
+
+
+def parse_args(argv: list[str] | None = None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(
+        prog="subtiltes-translator",
+        description="批量翻译字幕文件",
+    )
+    parser.add_argument("inputs", nargs="+", help="字幕文件、通配符或目录")
+    parser.add_argument("-o", "--output-dir", help="输出目录，默认输出到字幕文件所在目录")
+    parser.add_argument(
+        "--layout",
+        choices=["beside", "flat", "mirror"],
+        default="mirror",
+        help="输出布局：beside 输出到原文件旁，flat 全部输出到输出目录，"
+        "mirror 在输出目录中保持输入目录的结构",
+    )
+    parser.add_argument("-f", "--from-language", default="英语", help="字幕语言")
+    parser.add_argument("-t", "--target-language", default="中文", help="目标语言")
+    prompt = parser.add_mutually_exclusive_group()
+    prompt.add_argument("--prompt", help="翻译提示")
+    prompt.add_argument("--prompt-file", help="从文件读取翻译提示")
+    parser.add_argument(
+        "-e", "--engine", choices=ENGINES, default=GEMINI, help="翻译引擎"
+    )
+    parser.add_argument(
+        "--api-key",
+        action="append",
+        default=[],
+        help="API Key，可多次指定以合并多个 Key 的配额，"
+        "默认读取 GEMINI_API_KEY、OPENAI_API_KEY、ANTHROPIC_API_KEY 等环境变量",
+    )
+    parser.add_argument(
+        "--endpoint",
+        action="append",
+        default=[],
+        metavar="ENGINE:KEY",
+        help="额外的引擎与 API Key，可多次指定，请求会分发到负载最低的节点",
+    )
+    parser.add_argument(
+        "-c",
+        "--concurrency",
+        type=int,
+        default=DEFAULT_CONCURRENCY,
+        help="每个文件同时翻译的分片数量",
+    )
+    parser.add_argument(
+        "-j", "--jobs", type=int, default=1, help="同时翻译的文件数量"
+    )
+    parser.add_argument("--cache-dir", help="翻译缓存目录")
+    parser.add_argument("--memory-path", help="翻译记忆库路径")
+    parser.add_argument("--journal-dir", help="任务日志目录，用于中断后继续翻译")
+    parser.add_argument(
+        "--no-resume", action="store_true", help="不使用任务日志，重新翻译整个文件"
+    )
+    parser.add_argument(
+        "--no-memory", action="store_true", help="不使用翻译记忆库"
+    )
+    parser.add_argument(
+        "--fuzzy-threshold",
+        type=float,
+        default=DEFAULT_FUZZY_THRESHOLD,
+        help="翻译记忆库模糊匹配的最低相似度，例如 0.95，默认只使用精确匹配",
+    )
+    parser.add_argument(
+        "--no-dedup",
+        action="store_true",
+        help="不合并文件中文本相同的条目，每条单独翻译",
+    )
+    parser.add_argument(
+        "--translate-all",
+        action="store_true",
+        help="不跳过只有标点、数字、音乐符号或已经是目标语言的条目",
+    )
+    parser.add_argument(
+        "--chunk-strategy",
+        choices=[strategy.value for strategy in ChunkStrategy],
+        default=ChunkStrategy.TOKENS.value,
+        help="分片策略",
+    )
+    parser.add_argument(
+        "--wire-format",
+        choices=[wire_format.value for wire_format in WireFormat],
+        default=WireFormat.TEXT.value,
+        help="发送给模型的格式：text 只发送序号与文本，srt 发送完整的字幕内容",
+    )
+    parser.add_argument(
+        "--context",
+        type=int,
+        default=DEFAULT_CONTEXT_CUES,
+        metavar="N",
+        help="随每个分片发送前后各 N 条字幕作为只读上下文，0 表示不发送",
+    )
+    parser.add_argument(
+        "--rpm",
+        type=float,
+        default=DEFAULT_REQUESTS_PER_MINUTE,
+        help="每个 API Key 每分钟请求数量上限",
+    )
+    parser.add_argument(
+        "--tpm",
+        type=float,
+        default=DEFAULT_TOKENS_PER_MINUTE,
+        help="每个 API Key 每分钟 token 数量上限",
+    )
+    parser.add_argument(
+        "--max-retries",
+        type=int,
+        default=DEFAULT_MAX_RETRIES,
+        help="每个请求的最大重试次数",
+    )
+    parser.add_argument(
+        "--stream", action="store_true", help="使用流式请求，输出偏离时提前结束"
+    )
+    parser.add_argument(
+        "--skip-existing", action="store_true", help="跳过已存在的输出文件"
+    )
+    parser.add_argument(
+        "--estimate",
+        action="store_true",
+        help="不发送请求，只按分片计划估算每个文件的 token 用量，无需 API Key",
+    )
+    parser.add_argument(
+        "--input-price",
+        type=float,
+        default=0.0,
+        help="每百万输入 token 的价格，用于估算费用",
+    )
+    parser.add_argument(
+        "--output-price",
+        type=float,
+        default=0.0,
+        help="每百万输出 token 的价格，用于估算费用",
+    )
+    parser.add_argument(
+        "--no-usage-file",
+        action="store_true",
+        help="不在译文旁写入记录 token 用量的 .usage.json 文件",
+    )
+    parser.add_argument(
+        "--trace",
+        metavar="FILE",
+        help="将任务、分片与请求各阶段的耗时、token 数量与重试次数以 JSON Lines 追加写入文件",
+    )
+    parser.add_argument(
+        "--trace-otel",
+        action="store_true",
+        help="同时通过 OpenTelemetry 导出，需要安装 opentelemetry-api 并配置导出目标",
+    )
+    parser.add_argument(
+        "--metrics-port",
+        type=int,
+        help="在本地端口的 /metrics 以 Prometheus 格式提供任务、请求、错误与 token 指标",
+    )
+    parser.add_argument(
+        "--metrics-file",
+        help="每翻译完一个文件就将指标以 Prometheus 文本格式写入文件",
+    )
+    return parser.parse_args(argv)
+
+
+def parse_endpoints(args: argparse.Namespace) -> list[tuple[str, str]]:
+    """
+    汇总命令行与环境变量中的 (引擎, API Key)
+    """
+    endpoints = [(args.engine, key) for key in args.api_key]
+    for item in args.endpoint:
+        engine, _, key = item.partition(":")
+        if engine not in ENGINES or not key:
+            raise ValueError(f"Invalid endpoint: {item}")
+        endpoints.append((engine, key))
+    if not endpoints:
+        for name in API_KEY_ENV[args.engine]:
+            if os.environ.get(name):
+                endpoints.append((args.engine, os.environ[name]))
+                break
+    return endpoints
+
+
+def format_usage(usage: TokenUsage, args: argparse.Namespace) -> str:
+    """
+    输出 token 用量，指定价格时附带费用
+    """
+    text = f"输入 {usage.input_tokens} / 输出 {usage.output_tokens} tokens"
+    if usage.estimated_requests:
+        text += f"（{usage.estimated_requests}/{usage.requests} 个请求为估算）"
+    if args.input_price or args.output_price:
+        text += f"，约 {usage.cost(args.input_price, args.output_price):.4f}"
+    return text
+
+
+def estimate_files(
+    args: argparse.Namespace,
+    engine: TranslationEngine,
+    prompt: str,
+    files: list[tuple[str, str | None]],
+) -> int:
+    """
+    不发送请求，估算每个文件与全部文件的 token 用量
+    """
+    total = TokenUsage()
+    failed = 0
+    for index, (subtitle_file, _) in enumerate(files, 1):
+        try:
+            usage = estimate_subtitle(
+                prompt=prompt,
+                subtitle_file=subtitle_file,
+                from_language=args.from_language,
+                target_language=args.target_language,
+                engine=engine,
+                use_memory=not args.no_memory,
+                memory_path=args.memory_path,
+                fuzzy_threshold=args.fuzzy_threshold,
+                chunk_strategy=ChunkStrategy(args.chunk_strategy),
+                wire_format=WireFormat(args.wire_format),
+                deduplicate=not args.no_dedup,
+                skip_untranslatable_cues=not args.translate_all,
+                resume=not args.no_resume,
+                journal_dir=args.journal_dir,
+                context_cues=args.context,
+            )
+        except Exception as e:
+            print(f"[{index}/{len(files)}] 失败 {subtitle_file}: {e}", file=sys.stderr)
+            failed += 1
+            continue
+        total.add(usage)
+        print(
+            f"[{index}/{len(files)}] {subtitle_file}: "
+            f"{usage.requests} 个请求，{format_usage(usage, args)}"
+        )
+    print(f"预计 {total.requests} 个请求，{format_usage(total, args)}")
+    return 1 if failed else 0
+
+
+def build_engine(
+    args: argparse.Namespace, endpoints: list[tuple[str, str]]
+) -> TranslationEngine:
+    """
+    创建翻译引擎，有多个节点时使用负载均衡，每个节点单独限流
+    """
+    engines = [
+        create_engine(
+            engine,
+            key,
+            RequestScheduler(args.rpm, args.tpm, args.max_retries),
+        )
+        for engine, key in endpoints
+    ]
+    if len(engines) == 1:
+        return engines[0]
+    return LoadBalancer(engines)
+
+
+def build_offline_engine(
+    args: argparse.Namespace, endpoints: list[tuple[str, str]]
+) -> TranslationEngine:
+    """
+    创建估算用的引擎：与 build_engine 的缓存键和分片大小相同，
+    但只使用各引擎的默认配置，不需要 API Key，也不导入 SDK
+    """
+    names = list(dict.fromkeys(engine for engine, _ in endpoints)) or [args.engine]
+    engines: list[TranslationEngine] = [OfflineEngine(name) for name in names]
+    if len(engines) == 1:
+        return engines[0]
+    return LoadBalancer(engines)
+
+
+def main(argv: list[str] | None = None) -> int:
+    args = parse_args(argv)
+    try:
+        endpoints = parse_endpoints(args)
+    except ValueError as e:
+        print(e, file=sys.stderr)
+        return 2
+    # 估算不发送请求，没有 API Key 也可以进行
+    if not endpoints and not args.estimate:
+        print(
+            f"缺少 API Key，请使用 --api-key 或设置 {API_KEY_ENV[args.engine][0]}",
+            file=sys.stderr,
+        )
+        return 2
+
+    if args.prompt_file:
+        with open(os.path.expanduser(args.prompt_file), "r", encoding="utf-8") as f:
+            prompt = f.read().strip()
+    else:
+        prompt = args.prompt or DEFAULT_PROMPT
+
+    files = collect_files(args.inputs)
+    if not files:
+        print("没有找到字幕文件", file=sys.stderr)
+        return 2
+
+    output_dir = os.path.expanduser(args.output_dir) if args.output_dir else None
+    if args.estimate:
+        engine = build_offline_engine(args, endpoints)
+        return estimate_files(args, engine, prompt, files)
+    # 所有文件共用一个引擎，共享 API 配额
+    engine = build_engine(args, endpoints)
+    metrics = TranslationMetrics() if args.metrics_port or args.metrics_file else None
+    tracer = (
+        Tracer(args.trace, opentelemetry=args.trace_otel, metrics=metrics)
+        if args.trace or args.trace_otel or metrics
+        else None
+    )
+    server = None
+    if metrics and args.metrics_port:
+        try:
+            server = metrics.registry.serve(args.metrics_port)
+        except OSError as e:
+            print(f"无法监听端口 {args.metrics_port}: {e}", file=sys.stderr)
+            return 2
+    total = len(files)
+    usage = TokenUsage()
+    usage_lock = threading.Lock()
+
+    def run(index: int, subtitle_file: str, base_dir: str | None) -> bool:
+        target_dir = target_dir_for(subtitle_file, base_dir, output_dir, args.layout)
+        try:
+            output_file = output_file_path(
+                subtitle_file, target_dir, args.target_language
+            )
+            if args.skip_existing and output_file.exists():
+                print(f"[{index}/{total}] 跳过 {subtitle_file}")
+                return True
+            os.makedirs(target_dir, exist_ok=True)
+            job_usage = translate_subtitle(
+                prompt=prompt,
+                subtitle_file=subtitle_file,
+                target_dir=target_dir,
+                from_language=args.from_language,
+                target_language=args.target_language,
+                api_key="",
+                concurrency=args.concurrency,
+                cache_dir=args.cache_dir,
+                use_memory=not args.no_memory,
+                memory_path=args.memory_path,
+                fuzzy_threshold=args.fuzzy_threshold,
+                chunk_strategy=ChunkStrategy(args.chunk_strategy),
+                engine=engine,
+                stream=args.stream,
+                wire_format=WireFormat(args.wire_format),
+                deduplicate=not args.no_dedup,
+                skip_untranslatable_cues=not args.translate_all,
+                resume=not args.no_resume,
+                journal_dir=args.journal_dir,
+                tracer=tracer,
+                save_usage=not args.no_usage_file,
+                context_cues=args.context,
+            )
+        except Exception as e:
+            print(f"[{index}/{total}] 失败 {subtitle_file}: {e}", file=sys.stderr)
+            return False
+        finally:
+            if metrics and args.metrics_file:
+                metrics.registry.write(args.metrics_file)
+        with usage_lock:
+            usage.add(job_usage.total)
+        print(
+            f"[{index}/{total}] {subtitle_file} -> {output_file}，"
+            f"{format_usage(job_usage.total, args)}"
+        )
+        if job_usage.untranslated:
+            # 输出文件中混有原文，按失败处理，保留的任务日志使再次运行只重试这些条目
+            print(
+                f"[{index}/{total}] 未完成 {subtitle_file}: "
+                f"{len(job_usage.untranslated)} 条字幕未能翻译，保留原文"
+                f"（序号 {format_indexes(job_usage.untranslated)}）",
+                file=sys.stderr,
+            )
+            return False
+        return True
+
+    try:
+        with ThreadPoolExecutor(max_workers=max(1, args.jobs)) as executor:
+            results = list(
+                executor.map(
+                    run,
+                    range(1, total + 1),
+                    [path for path, _ in files],
+                    [base for _, base in files],
+                )
+            )
+    finally:
+        if tracer:
+            tracer.close()
+        if server:
+            server.shutdown()
+
+    failed = results.count(False)
+    print(f"完成 {total - failed}/{total} 个文件，{format_usage(usage, args)}")
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
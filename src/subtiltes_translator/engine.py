@@ -0,0 +1,224 @@
+import abc
+import asyncio
+import dataclasses
+from typing import Any, AsyncGenerator, Callable, Generator
+
+from . import tracing
+from .scheduler import RequestScheduler
+from .utils import estimate_tokens
+
+GEMINI = "gemini"
+OPENAI = "openai"
+CLAUDE = "claude"
+
+ENGINES = (GEMINI, OPENAI, CLAUDE)
+
+
+@dataclasses.dataclass(frozen=True)
+class EngineDefaults:
+    """
+    引擎的默认模型、单次请求的输出上限与默认生成配置，
+    放在这里而不是各引擎模块中，不安装 SDK 也能读取
+    """
+
+    model_name: str
+    max_output_tokens: int
+    generation_config: dict[str, Any]
+
+
+ENGINE_DEFAULTS = {
+    GEMINI: EngineDefaults(
+        "gemini-2.0-flash-exp",
+        8192,
+        {
+            "temperature": 1,
+            "top_p": 0.95,
+            "top_k": 64,
+            "max_output_tokens": 8192,
+            "response_mime_type": "text/plain",
+        },
+    ),
+    OPENAI: EngineDefaults(
+        "gpt-4o-mini", 16384, {"temperature": 1.0, "max_tokens": 16384}
+    ),
+    CLAUDE: EngineDefaults(
+        "claude-3-5-sonnet-latest", 8192, {"temperature": 1.0, "max_tokens": 8192}
+    ),
+}
+
+
+class TranslationEngine(abc.ABC):
+    """
+    翻译引擎：输入提示词与分片文本，返回模型生成的译文文本。
+    请求经过 scheduler 限流与重试，多个引擎可共用同一个调度器以共享配额
+    """
+
+    # 引擎名称
+    name: str = ""
+    # 单次请求的输出 token 上限
+    max_output_tokens: int = 8192
+    # 建议的最大并发请求数量
+    max_concurrency: int = 16
+
+    def __init__(self, model_name: str, scheduler: RequestScheduler | None = None):
+        self.model_name = model_name
+        self.scheduler = scheduler or RequestScheduler()
+        self.generation_config: dict[str, Any] = {}
+
+    def cache_identity(self) -> tuple[str, dict[str, Any]]:
+        """
+        参与缓存键计算的模型名称与生成配置
+        """
+        return f"{self.name}/{self.model_name}", self.generation_config
+
+    @abc.abstractmethod
+    def request(self, prompt: str, text: str) -> str:
+        """
+        发送一次请求，返回模型输出的文本，
+        响应中包含 token 用量时通过 report_usage 记录
+        """
+
+    def report_usage(self, input_tokens: int | None, output_tokens: int | None):
+        """
+        记录一次请求实际消耗的 token 数量，计入当前请求的 span，
+        没有记录用量的请求按文本估算
+        """
+        tracing.add("input_tokens", input_tokens or 0)
+        tracing.add("output_tokens", output_tokens or 0)
+
+    async def request_async(self, prompt: str, text: str) -> str:
+        """
+        异步发送一次请求，默认在线程中执行 request
+        """
+        return await asyncio.to_thread(self.request, prompt, text)
+
+    def stream(self, prompt: str, text: str) -> Generator[str, None, None]:
+        """
+        流式发送一次请求，逐段返回模型输出，默认一次返回完整输出
+        """
+        yield self.request(prompt, text)
+
+    async def stream_async(self, prompt: str, text: str) -> AsyncGenerator[str, None]:
+        """
+        stream 的异步版本
+        """
+        yield await self.request_async(prompt, text)
+
+    def generate(self, prompt: str, text: str, retry: bool = True) -> str:
+        """
+        经过限流与重试发送请求，retry 为 False 时只尝试一次
+        """
+        call = self.scheduler.call if retry else self.scheduler.call_once
+        return call(
+            lambda: self.request(prompt, text),
+            estimate_tokens(prompt) + estimate_tokens(text),
+        )
+
+    async def generate_async(self, prompt: str, text: str, retry: bool = True) -> str:
+        """
+        generate 的异步版本
+        """
+        call = self.scheduler.call_async if retry else self.scheduler.call_once_async
+        return await call(
+            lambda: self.request_async(prompt, text),
+            estimate_tokens(prompt) + estimate_tokens(text),
+        )
+
+    def generate_stream(
+        self,
+        prompt: str,
+        text: str,
+        on_text: Callable[[str], bool],
+        retry: bool = True,
+    ) -> str:
+        """
+        经过限流与重试流式发送请求，每收到一段输出都以目前为止的完整输出调用 on_text，
+        on_text 返回 False 时提前结束请求。重试时输出从头开始，返回最终的输出，
+        retry 为 False 时只尝试一次
+        """
+
+        def consume() -> str:
+            response = ""
+            pieces = self.stream(prompt, text)
+            try:
+                for piece in pieces:
+                    response += piece
+                    if not on_text(response):
+                        break
+            finally:
+                pieces.close()
+            return response
+
+        call = self.scheduler.call if retry else self.scheduler.call_once
+        return call(consume, estimate_tokens(prompt) + estimate_tokens(text))
+
+    async def generate_stream_async(
+        self,
+        prompt: str,
+        text: str,
+        on_text: Callable[[str], bool],
+        retry: bool = True,
+    ) -> str:
+        """
+        generate_stream 的异步版本
+        """
+
+        async def consume() -> str:
+            response = ""
+            pieces = self.stream_async(prompt, text)
+            try:
+                async for piece in pieces:
+                    response += piece
+                    if not on_text(response):
+                        break
+            finally:
+                await pieces.aclose()
+            return response
+
+        call = self.scheduler.call_async if retry else self.scheduler.call_once_async
+        return await call(consume, estimate_tokens(prompt) + estimate_tokens(text))
+
+
+def create_engine(
+    name: str,
+    api_key: str,
+    scheduler: RequestScheduler | None = None,
+    **options: Any,
+) -> TranslationEngine:
+    """
+    根据名称创建翻译引擎，options 传给对应引擎的构造函数
+    """
+    # 按需导入，未使用的引擎无需安装对应的 SDK
+    if name == GEMINI:
+        from .gemini import GeminiEngine
+
+        return GeminiEngine(api_key, scheduler=scheduler, **options)
+    elif name == OPENAI:
+        from .openai import OpenAIEngine
+
+        return OpenAIEngine(api_key, scheduler=scheduler, **options)
+    elif name == CLAUDE:
+        from .claude import ClaudeEngine
+
+        return ClaudeEngine(api_key, scheduler=scheduler, **options)
+    else:
+        raise ValueError(f"Unsupported engine: {name}")
+
+
+class OfflineEngine(TranslationEngine):
+    """
+    只有引擎名称与默认配置、不能发送请求的引擎，
+    缓存键与分片大小和使用默认配置的真实引擎相同，用于不需要 API Key 的用量估算
+    """
+
+    def __init__(self, name: str):
+        if name not in ENGINE_DEFAULTS:
+            raise ValueError(f"Unsupported engine: {name}")
+        defaults = ENGINE_DEFAULTS[name]
+        super().__init__(defaults.model_name)
+        self.name = name
+        self.max_output_tokens = defaults.max_output_tokens
+        self.generation_config = dict(defaults.generation_config)
+
+    def request(self, prompt: str, text: str) -> str:
+        raise RuntimeError(f"Offline {self.name} engine cannot send requests")
@@ -1,85 +1,41 @@
+import asyncio
 import os
-import pathlib
 import tempfile
-from typing import Any, Callable
+import threading
+import weakref
+from typing import Any, AsyncGenerator, Generator
 
-import ass
 import google.generativeai as genai
-import srt
+from google.ai import generativelanguage as glm
 from google.generativeai.types import (
     GenerationConfigDict,
     HarmBlockThreshold,
     HarmCategory,
 )
 
-from .utils import get_file_type, merge_subtitle_files, split_subtitle_file
+from . import tracing
+from .engine import ENGINE_DEFAULTS, GEMINI, TranslationEngine
+from .scheduler import RequestScheduler
 
+DEFAULT_MODEL = ENGINE_DEFAULTS[GEMINI].model_name
 
-def generate_content(
-    model: Any,
-    contents: Any,
-    generation_config: GenerationConfigDict,
-    tmp_file: pathlib.Path,
-) -> list[Any]:
-    """
-    生成内容
-    """
-    # 检查临时文件是否存在
-    if tmp_file.exists():
-        with tmp_file.open("r", encoding="utf-8") as f:
-            data = srt.parse(f.read())
-        return [line for line in data]
-
-    # 如果临时文件不存在，则进行翻译
-    response = model.generate_content(
-        contents,
-        generation_config=generation_config,
-    )
-    text = response.text
-    # 如果 text 包含 "```" 则进行处理，仅包含```包裹的内容
-    if "```" in text:
-        text = text.split("```")[1]
-
-    # 保存翻译结果到临时文件
-    with tmp_file.open("w", encoding="utf-8") as f:
-        f.write(text)
-
-    data = srt.parse(text)
-    return [line for line in data]
-
-
-def translate_subtitle(
-    prompt: str,
-    subtitle_file: str,
-    target_dir: str,
-    from_language: str,
-    target_language: str,
-    api_key: str,
-    tmp_dir: str | None = None,
-    progress_callback: Callable[[int, int], None] | None = None,
-) -> None:
+# File API 只能使用 genai.configure 全局配置的 API Key
+_file_api_key: str | None = None
+_file_api_lock = threading.Lock()
+
+
+def create_model(
+    model_name: str = DEFAULT_MODEL,
+) -> tuple[Any, GenerationConfigDict]:
     """
-    翻译字幕
+    创建 Gemini 模型及生成配置
     """
-    subtitle_file = os.path.expanduser(subtitle_file)
-    target_dir = os.path.expanduser(target_dir)
-    genai.configure(api_key=api_key)
-    if tmp_dir is None:
-        tmp = tempfile.mkdtemp()
-    else:
-        tmp = tmp_dir
-    file_type = get_file_type(subtitle_file)
-
-    generation_config: GenerationConfigDict = {
-        "temperature": 1,
-        "top_p": 0.95,
-        "top_k": 64,
-        "max_output_tokens": 8192,
-        "response_mime_type": "text/plain",
-    }  # type: ignore
+    generation_config: GenerationConfigDict = dict(
+        ENGINE_DEFAULTS[GEMINI].generation_config
+    )  # type: ignore
 
     model = genai.GenerativeModel(
-        model_name="gemini-2.0-flash-exp",
+        model_name=model_name,
         generation_config=generation_config,
         safety_settings={
             HarmCategory.HARM_CATEGORY_SEXUALLY_EXPLICIT: HarmBlockThreshold.BLOCK_NONE,
@@ -88,37 +44,189 @@ def translate_subtitle(
             HarmCategory.HARM_CATEGORY_HARASSMENT: HarmBlockThreshold.BLOCK_NONE,
         },
     )
+    return model, generation_config
 
-    files = split_subtitle_file(file_type, subtitle_file, tmp)
 
-    translated_srt = []
-    total_files = len(files)
-    for index, file in enumerate(files, 1):
-        sample_file = genai.upload_file(
-            path=file, display_name="SRT subtitles", mime_type="text/plain"
+def bind_api_key(model: Any, api_key: str, asynchronous: bool = False):
+    """
+    genai.configure 是全局配置，GenerativeModel 没有按模型设置 API Key 的接口，
+    为模型绑定使用指定 Key 的客户端，以便多个 Key 同时使用。
+    异步客户端创建时绑定当前的事件循环，只能在事件循环中创建并在其中使用
+    """
+    client_options = {"api_key": api_key}
+    if asynchronous:
+        model._async_client = glm.GenerativeServiceAsyncClient(
+            client_options=client_options
         )
+    else:
+        model._client = glm.GenerativeServiceClient(client_options=client_options)
+
 
-        fn = pathlib.Path(file)
-        fn = fn.with_name(f"{fn.stem}_zh.{fn.suffix}")
-        contents = [
-            prompt,
-            sample_file,
-        ]
+def configure_file_api(api_key: str):
+    """
+    为 File API 配置全局的 API Key，已配置其他 Key 时报错
+    """
+    global _file_api_key
+    with _file_api_lock:
+        if _file_api_key is not None and _file_api_key != api_key:
+            raise ValueError(
+                "The Gemini File API only supports a single API key per process"
+            )
+        genai.configure(api_key=api_key)
+        _file_api_key = api_key
+
+
+class GeminiEngine(TranslationEngine):
+    """
+    Google Gemini 翻译引擎，use_file_api 时分片写入 tmp_dir 并通过 File API 上传，
+    否则直接内联在请求中。File API 使用全局配置的 API Key，同一进程中只能使用一个 Key
+    """
+
+    name = GEMINI
+    max_output_tokens = ENGINE_DEFAULTS[GEMINI].max_output_tokens
+
+    def __init__(
+        self,
+        api_key: str,
+        model_name: str = DEFAULT_MODEL,
+        scheduler: RequestScheduler | None = None,
+        use_file_api: bool = False,
+        tmp_dir: str | None = None,
+    ):
+        super().__init__(model_name, scheduler)
+        if use_file_api:
+            configure_file_api(api_key)
+        self.api_key = api_key
+        self.model, self.generation_config = create_model(model_name)
+        bind_api_key(self.model, api_key)
+        # 每个事件循环使用各自的模型与异步客户端
+        self._async_models: weakref.WeakKeyDictionary[Any, Any] = (
+            weakref.WeakKeyDictionary()
+        )
+        self._lock = threading.Lock()
+        self.use_file_api = use_file_api
+        self.tmp_dir = tmp_dir
+
+    def async_model(self) -> Any:
+        """
+        返回当前事件循环使用的模型，首次使用时创建
+        """
+        loop = asyncio.get_running_loop()
+        with self._lock:
+            model = self._async_models.get(loop)
+            if model is None:
+                model, _ = create_model(self.model_name)
+                bind_api_key(model, self.api_key, asynchronous=True)
+                self._async_models[loop] = model
+        return model
+
+    def upload(self, text: str) -> Any:
+        """
+        将分片写入临时文件并上传
+        """
+        with tracing.span("upload", characters=len(text)):
+            fd, path = tempfile.mkstemp(dir=self.tmp_dir, suffix=".srt")
+            try:
+                with os.fdopen(fd, "w", encoding="utf-8") as f:
+                    f.write(text)
+                return genai.upload_file(
+                    path=path, display_name="SRT subtitles", mime_type="text/plain"
+                )
+            finally:
+                os.unlink(path)
+
+    def delete(self, sample_file: Any):
+        """
+        删除已上传的文件
+        """
+        with tracing.span("delete"):
+            sample_file.delete()
+
+    def report_response_usage(self, response: Any):
+        """
+        记录响应中的 usage_metadata，流式响应中为最后收到的一段
+        """
+        usage = getattr(response, "usage_metadata", None)
+        if usage:
+            self.report_usage(usage.prompt_token_count, usage.candidates_token_count)
+
+    def request(self, prompt: str, text: str) -> str:
+        if not self.use_file_api:
+            response = self.model.generate_content(
+                [prompt, text],
+                generation_config=self.generation_config,
+            )
+            self.report_response_usage(response)
+            return response.text
+
+        sample_file = self.upload(text)
         try:
-            srts = generate_content(model, contents, generation_config, fn)
-        except srt.SRTParseError as e:
-            print(f"Error parsing SRT file: {e}")
-            srts = generate_content(model, contents, generation_config, fn)
-        translated_srt.extend(srts)
-        sample_file.delete()
-        if progress_callback:
-            progress_callback(index, total_files)
-
-    output_file = (
-        pathlib.Path(target_dir)
-        .joinpath(
-            f"{pathlib.Path(subtitle_file).stem}_{target_language}.{file_type.value.lower()}"
+            response = self.model.generate_content(
+                [prompt, sample_file],
+                generation_config=self.generation_config,
+            )
+            self.report_response_usage(response)
+            return response.text
+        finally:
+            self.delete(sample_file)
+
+    async def request_async(self, prompt: str, text: str) -> str:
+        if not self.use_file_api:
+            response = await self.async_model().generate_content_async(
+                [prompt, text],
+                generation_config=self.generation_config,
+            )
+            self.report_response_usage(response)
+            return response.text
+
+        # File API 没有异步接口，放到线程中执行以免阻塞事件循环
+        sample_file = await asyncio.to_thread(self.upload, text)
+        try:
+            response = await self.async_model().generate_content_async(
+                [prompt, sample_file],
+                generation_config=self.generation_config,
+            )
+            self.report_response_usage(response)
+            return response.text
+        finally:
+            await asyncio.to_thread(self.delete, sample_file)
+
+    def stream(self, prompt: str, text: str) -> Generator[str, None, None]:
+        sample_file = self.upload(text) if self.use_file_api else None
+        last = None
+        try:
+            response = self.model.generate_content(
+                [prompt, sample_file or text],
+                generation_config=self.generation_config,
+                stream=True,
+            )
+            for chunk in response:
+                last = chunk
+                # 最后一段可能只包含结束原因，没有文本
+                if chunk.parts:
+                    yield chunk.text
+        finally:
+            # 提前结束时用量只统计到最后收到的一段
+            self.report_response_usage(last)
+            if sample_file is not None:
+                self.delete(sample_file)
+
+    async def stream_async(self, prompt: str, text: str) -> AsyncGenerator[str, None]:
+        sample_file = (
+            await asyncio.to_thread(self.upload, text) if self.use_file_api else None
         )
-        .absolute()
-    )
-    merge_subtitle_files(file_type, translated_srt, output_file)
+        last = None
+        try:
+            response = await self.async_model().generate_content_async(
+                [prompt, sample_file or text],
+                generation_config=self.generation_config,
+                stream=True,
+            )
+            async for chunk in response:
+                last = chunk
+                if chunk.parts:
+                    yield chunk.text
+        finally:
+            self.report_response_usage(last)
+            if sample_file is not None:
+                await asyncio.to_thread(self.delete, sample_file)
@@ -0,0 +1,146 @@
+import hashlib
+import json
+import os
+import threading
+from typing import Any
+
+from .cache import default_cache_dir
+from .usage import TokenUsage
+
+
+def default_journal_dir() -> str:
+    """
+    默认任务日志目录
+    """
+    return os.path.join(default_cache_dir(), "jobs")
+
+
+def file_hash(path: str) -> str:
+    """
+    计算文件内容的哈希
+    """
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1024 * 1024), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+class JobJournal:
+    """
+    翻译任务日志：每完成一个分片就追加记录其译文并写入磁盘，
+    任务中断后重新运行同一任务时从日志恢复已完成的条目，只翻译剩余的条目。
+    日志按行写入 JSON，崩溃时写了一半的最后一行会被忽略
+    """
+
+    def __init__(
+        self,
+        source_hash: str,
+        prompt: str,
+        from_language: str,
+        target_language: str,
+        options: Any = None,
+        journal_dir: str | None = None,
+    ):
+        self.source_hash = source_hash
+        payload = json.dumps(
+            {
+                "source": source_hash,
+                "prompt": prompt,
+                "from": from_language,
+                "to": target_language,
+                "options": options,
+            },
+            ensure_ascii=False,
+            sort_keys=True,
+            default=str,
+        )
+        job_id = hashlib.sha256(payload.encode("utf-8")).hexdigest()
+        self.path = os.path.join(
+            os.path.expanduser(journal_dir or default_journal_dir()), f"{job_id}.jsonl"
+        )
+        # 已完成的分片在之前运行中消耗的 token，由 load 读取
+        self.usage = TokenUsage()
+        self._file = None
+        self._lock = threading.Lock()
+
+    def load(self) -> dict[int, str]:
+        """
+        读取日志中已完成条目的译文与用量，没有日志时返回空
+        """
+        translated: dict[int, str] = {}
+        self.usage = TokenUsage()
+        try:
+            f = open(self.path, "r", encoding="utf-8")
+        except FileNotFoundError:
+            return translated
+        with f:
+            for line in f:
+                try:
+                    record = json.loads(line)
+                except json.JSONDecodeError:
+                    continue
+                if "source" in record and record["source"] != self.source_hash:
+                    self.usage = TokenUsage()
+                    return {}
+                for index, content in record.get("translations", {}).items():
+                    translated[int(index)] = content
+                if "usage" in record:
+                    self.usage.add(TokenUsage.from_dict(record["usage"]))
+        return translated
+
+    def start(self, chunks: list[list[Any]]):
+        """
+        开始记录，写入本次运行的分片计划
+        """
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        # 上次崩溃时可能留下写了一半的行，先换行以免和新记录混在一起
+        truncated = False
+        if os.path.exists(self.path) and os.path.getsize(self.path):
+            with open(self.path, "rb") as f:
+                f.seek(-1, os.SEEK_END)
+                truncated = f.read(1) != b"\n"
+        self._file = open(self.path, "a", encoding="utf-8")
+        if truncated:
+            self._file.write("\n")
+        self._write(
+            {
+                "source": self.source_hash,
+                "chunks": [[line.index for line in chunk] for chunk in chunks],
+            }
+        )
+
+    def record(
+        self, chunk: int, translations: dict[int, str], usage: TokenUsage | None = None
+    ):
+        """
+        记录一个已完成分片的译文与用量
+        """
+        record: dict[str, Any] = {"chunk": chunk, "translations": translations}
+        if usage is not None:
+            record["usage"] = usage.to_dict()
+        self._write(record)
+
+    def _write(self, record: dict[str, Any]):
+        with self._lock:
+            if self._file is None:
+                return
+            self._file.write(json.dumps(record, ensure_ascii=False) + "\n")
+            self._file.flush()
+            os.fsync(self._file.fileno())
+
+    def close(self):
+        with self._lock:
+            if self._file is not None:
+                self._file.close()
+                self._file = None
+
+    def remove(self):
+        """
+        任务完成后删除日志
+        """
+        self.close()
+        try:
+            os.unlink(self.path)
+        except FileNotFoundError:
+            pass
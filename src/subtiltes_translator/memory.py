@@ -0,0 +1,246 @@
+import hashlib
+import json
+import math
+import os
+import sqlite3
+import threading
+from typing import Any
+
+from .cache import default_cache_dir, normalize_text
+
+# 模糊匹配的最低相似度，默认为 1 即只使用精确匹配。
+# 只差一个词的长句相似度也很高，例如 not 与 now，需要时再显式开启
+DEFAULT_FUZZY_THRESHOLD = 1.0
+
+# 模糊匹配时最多比较的候选条目数量
+FUZZY_CANDIDATES = 20
+
+# 短于该长度的条目只使用精确匹配，短句改动一个词意思就完全不同
+FUZZY_MIN_LENGTH = 20
+
+# 查找候选条目时只使用出现次数最少的 n-gram，其中出现次数最多的
+# 超过该数量时放弃模糊匹配，常见的 n-gram（例如 " th"）几乎出现在每个条目中
+FUZZY_MAX_GRAM_ENTRIES = 1000
+
+
+def default_memory_path() -> str:
+    """
+    默认翻译记忆库路径
+    """
+    return os.path.join(default_cache_dir(), "memory.sqlite3")
+
+
+def normalize_cue_text(text: str) -> str:
+    """
+    规范化单条字幕文本，合并多余空白
+    """
+    return " ".join(normalize_text(text).split())
+
+
+def text_hash(text: str) -> str:
+    return hashlib.sha256(normalize_cue_text(text).encode("utf-8")).hexdigest()
+
+
+def ngrams(text: str, n: int = 3) -> set[str]:
+    """
+    计算文本的字符 n-gram 集合
+    """
+    text = f" {normalize_cue_text(text).lower()} "
+    if len(text) <= n:
+        return {text}
+    return {text[i : i + n] for i in range(len(text) - n + 1)}
+
+
+def similarity(a: set[str], b: set[str]) -> float:
+    """
+    两个 n-gram 集合的 Dice 系数
+    """
+    if not a or not b:
+        return 0.0
+    return 2 * len(a & b) / (len(a) + len(b))
+
+
+class TranslationMemory:
+    """
+    基于 SQLite 的字幕条目翻译记忆库，支持精确匹配与 n-gram 模糊匹配。
+    条目按 scope 隔离，scope 由提示词与模型计算，
+    修改提示词或更换模型后不会复用之前的译文，不同作品的术语表也不会互相影响
+    """
+
+    def __init__(
+        self,
+        path: str | None = None,
+        fuzzy_threshold: float = DEFAULT_FUZZY_THRESHOLD,
+    ):
+        path = os.path.expanduser(path or default_memory_path())
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self.fuzzy_threshold = fuzzy_threshold
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        with self._conn:
+            columns = {
+                row[1] for row in self._conn.execute("PRAGMA table_info(entries)")
+            }
+            if columns and "scope" not in columns:
+                # 旧版本的条目没有记录提示词与模型，无法判断是否仍然适用，直接丢弃
+                self._conn.executescript(
+                    """
+                    DROP TABLE IF EXISTS ngrams;
+                    DROP TABLE IF EXISTS gram_counts;
+                    DROP TABLE entries;
+                    """
+                )
+            self._conn.executescript(
+                """
+                CREATE TABLE IF NOT EXISTS entries (
+                    id INTEGER PRIMARY KEY,
+                    scope TEXT NOT NULL,
+                    hash TEXT NOT NULL,
+                    from_language TEXT NOT NULL,
+                    target_language TEXT NOT NULL,
+                    source TEXT NOT NULL,
+                    target TEXT NOT NULL,
+                    UNIQUE (scope, hash, from_language, target_language)
+                );
+                CREATE TABLE IF NOT EXISTS ngrams (
+                    gram TEXT NOT NULL,
+                    entry_id INTEGER NOT NULL REFERENCES entries (id)
+                );
+                CREATE INDEX IF NOT EXISTS ngrams_gram ON ngrams (gram);
+                CREATE TABLE IF NOT EXISTS gram_counts (
+                    gram TEXT PRIMARY KEY,
+                    count INTEGER NOT NULL
+                );
+                """
+            )
+
+    @staticmethod
+    def make_scope(prompt: str, model_name: str, generation_config: Any) -> str:
+        """
+        根据提示词、模型和生成配置计算条目的 scope
+        """
+        payload = json.dumps(
+            {
+                "prompt": prompt,
+                "model": model_name,
+                "generation_config": generation_config,
+            },
+            ensure_ascii=False,
+            sort_keys=True,
+            default=str,
+        )
+        return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+    def lookup(
+        self, text: str, from_language: str, target_language: str, scope: str
+    ) -> str | None:
+        """
+        在 scope 中查找原文对应的译文，未命中时返回 None
+        """
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT target FROM entries WHERE scope = ? AND hash = ?"
+                " AND from_language = ? AND target_language = ?",
+                (scope, text_hash(text), from_language, target_language),
+            ).fetchone()
+            if row is not None:
+                return row[0]
+            if (
+                self.fuzzy_threshold >= 1
+                or len(normalize_cue_text(text)) < FUZZY_MIN_LENGTH
+            ):
+                return None
+            return self._fuzzy_lookup(text, from_language, target_language, scope)
+
+    def _fuzzy_lookup(
+        self, text: str, from_language: str, target_language: str, scope: str
+    ) -> str | None:
+        grams = ngrams(text)
+        placeholders = ",".join("?" for _ in grams)
+        counts = self._conn.execute(
+            f"SELECT gram, count FROM gram_counts WHERE gram IN ({placeholders})"
+            " ORDER BY count",
+            tuple(grams),
+        ).fetchall()
+        # Dice 系数达到阈值的条目至少包含 shared 个相同的 n-gram，
+        # 长度也不会相差太多：Dice 系数不超过 2 * 较短长度 / 两者长度之和
+        ratio = self.fuzzy_threshold / (2 - self.fuzzy_threshold)
+        shared = math.ceil(len(grams) * ratio)
+        # 记忆库中没有出现过的 n-gram 不会有条目包含，其余 n-gram 中
+        # 任意 len(counts) - shared + 1 个至少命中一个，只需用出现次数最少的这些查找。
+        # 只剩常见的 n-gram 时候选条目太多，放弃模糊匹配
+        if len(counts) < shared:
+            return None
+        rare_grams = counts[: len(counts) - shared + 1]
+        if rare_grams[-1][1] > FUZZY_MAX_GRAM_ENTRIES:
+            return None
+        length = len(normalize_cue_text(text))
+        placeholders = ",".join("?" for _ in rare_grams)
+        rows = self._conn.execute(
+            "SELECT entries.source, entries.target FROM ngrams"
+            " JOIN entries ON entries.id = ngrams.entry_id"
+            f" WHERE ngrams.gram IN ({placeholders})"
+            " AND entries.scope = ?"
+            " AND entries.from_language = ? AND entries.target_language = ?"
+            " AND length(entries.source) BETWEEN ? AND ?"
+            " GROUP BY ngrams.entry_id"
+            " ORDER BY COUNT(*) DESC LIMIT ?",
+            (
+                *(gram for gram, _ in rare_grams),
+                scope,
+                from_language,
+                target_language,
+                int(length * ratio),
+                int(length / ratio) + 1,
+                FUZZY_CANDIDATES,
+            ),
+        ).fetchall()
+        best, best_score = None, self.fuzzy_threshold
+        for source, target in rows:
+            score = similarity(grams, ngrams(source))
+            if score >= best_score:
+                best, best_score = target, score
+        return best
+
+    def add(
+        self,
+        pairs: list[tuple[str, str]],
+        from_language: str,
+        target_language: str,
+        scope: str,
+    ):
+        """
+        批量写入 scope 中的原文与译文
+        """
+        with self._lock, self._conn:
+            for source, target in pairs:
+                if not normalize_cue_text(source) or not target.strip():
+                    continue
+                cursor = self._conn.execute(
+                    "INSERT OR IGNORE INTO entries"
+                    " (scope, hash, from_language, target_language, source, target)"
+                    " VALUES (?, ?, ?, ?, ?, ?)",
+                    (
+                        scope,
+                        text_hash(source),
+                        from_language,
+                        target_language,
+                        source,
+                        target,
+                    ),
+                )
+                if cursor.rowcount:
+                    grams = ngrams(source)
+                    self._conn.executemany(
+                        "INSERT INTO ngrams (gram, entry_id) VALUES (?, ?)",
+                        [(gram, cursor.lastrowid) for gram in grams],
+                    )
+                    self._conn.executemany(
+                        "INSERT INTO gram_counts (gram, count) VALUES (?, 1)"
+                        " ON CONFLICT (gram) DO UPDATE SET count = count + 1",
+                        [(gram,) for gram in grams],
+                    )
@@ -0,0 +1,357 @@
+import bisect
+import http.server
+import math
+import os
+import tempfile
+import threading
+from typing import Any
+
+from .tracing import Span
+
+# 指标名称前缀
+METRIC_PREFIX = "subtiltes_translator_"
+
+# 耗时分布的默认区间（秒）
+DEFAULT_BUCKETS = (0.5, 1, 2.5, 5, 10, 20, 30, 60, 120, 300)
+
+# Prometheus 文本格式的 Content-Type
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+
+def format_value(value: float) -> str:
+    if math.isinf(value):
+        return "+Inf" if value > 0 else "-Inf"
+    if float(value).is_integer():
+        return str(int(value))
+    return repr(float(value))
+
+
+def format_labels(labels: dict[str, str]) -> str:
+    """
+    按 Prometheus 文本格式输出标签，转义反斜杠、换行与引号
+    """
+    if not labels:
+        return ""
+    pairs = []
+    for name, value in labels.items():
+        value = value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+        pairs.append(f'{name}="{value}"')
+    return "{" + ",".join(pairs) + "}"
+
+
+class Metric:
+    """
+    指标基类，同一指标按标签值区分多条时间序列
+    """
+
+    type = ""
+
+    def __init__(self, name: str, documentation: str, labels: tuple[str, ...] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.label_names = labels
+        # 没有标签的指标从 0 开始输出
+        self._values: dict[tuple[str, ...], Any] = {} if labels else {(): self.zero()}
+        self._lock = threading.Lock()
+
+    def zero(self) -> Any:
+        return 0
+
+    def key(self, labels: dict[str, Any]) -> tuple[str, ...]:
+        return tuple(str(labels.get(name, "")) for name in self.label_names)
+
+    def samples(self) -> list[tuple[str, dict[str, str], float]]:
+        """
+        返回 (名称, 标签, 值)
+        """
+        with self._lock:
+            return [
+                (self.name, dict(zip(self.label_names, key)), value)
+                for key, value in sorted(self._values.items())
+            ]
+
+    def render(self) -> str:
+        lines = [
+            f"# HELP {self.name} {self.documentation}",
+            f"# TYPE {self.name} {self.type}",
+        ]
+        for name, labels, value in self.samples():
+            lines.append(f"{name}{format_labels(labels)} {format_value(value)}")
+        return "\n".join(lines)
+
+
+class Counter(Metric):
+    """
+    只增不减的计数
+    """
+
+    type = "counter"
+
+    def inc(self, value: float = 1, **labels: Any):
+        key = self.key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + value
+
+
+class Gauge(Metric):
+    """
+    可增可减的当前值，例如进行中的请求数量
+    """
+
+    type = "gauge"
+
+    def inc(self, value: float = 1, **labels: Any):
+        key = self.key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + value
+
+    def dec(self, value: float = 1, **labels: Any):
+        self.inc(-value, **labels)
+
+    def set(self, value: float, **labels: Any):
+        with self._lock:
+            self._values[self.key(labels)] = value
+
+
+class Histogram(Metric):
+    """
+    数值分布，按区间累计数量，同时记录总和与总数
+    """
+
+    type = "histogram"
+
+    def __init__(
+        self,
+        name: str,
+        documentation: str,
+        labels: tuple[str, ...] = (),
+        buckets: tuple[float, ...] = DEFAULT_BUCKETS,
+    ):
+        self.buckets = tuple(sorted(buckets))
+        super().__init__(name, documentation, labels)
+
+    def zero(self) -> Any:
+        # 最后一个位置存放超出最大区间的数量
+        return [0] * (len(self.buckets) + 1), 0
+
+    def observe(self, value: float, **labels: Any):
+        key = self.key(labels)
+        with self._lock:
+            counts, total = self._values.get(key) or self.zero()
+            counts[bisect.bisect_left(self.buckets, value)] += 1
+            self._values[key] = (counts, total + value)
+
+    def samples(self) -> list[tuple[str, dict[str, str], float]]:
+        with self._lock:
+            values = sorted(
+                (key, list(counts), total)
+                for key, (counts, total) in self._values.items()
+            )
+        samples = []
+        for key, counts, total in values:
+            labels = dict(zip(self.label_names, key))
+            cumulative = 0
+            for bound, count in zip((*self.buckets, math.inf), counts):
+                cumulative += count
+                samples.append(
+                    (
+                        f"{self.name}_bucket",
+                        {**labels, "le": format_value(bound)},
+                        cumulative,
+                    )
+                )
+            samples.append((f"{self.name}_sum", labels, total))
+            samples.append((f"{self.name}_count", labels, cumulative))
+        return samples
+
+
+class MetricsRegistry:
+    """
+    指标注册表，可输出为 Prometheus 文本格式、写入文件或通过 HTTP 提供
+    """
+
+    def __init__(self):
+        self.metrics: list[Metric] = []
+        self._lock = threading.Lock()
+
+    def register(self, metric: Metric) -> Any:
+        with self._lock:
+            self.metrics.append(metric)
+        return metric
+
+    def counter(self, name: str, documentation: str, *labels: str) -> Counter:
+        return self.register(Counter(METRIC_PREFIX + name, documentation, labels))
+
+    def gauge(self, name: str, documentation: str, *labels: str) -> Gauge:
+        return self.register(Gauge(METRIC_PREFIX + name, documentation, labels))
+
+    def histogram(
+        self,
+        name: str,
+        documentation: str,
+        *labels: str,
+        buckets: tuple[float, ...] = DEFAULT_BUCKETS,
+    ) -> Histogram:
+        return self.register(
+            Histogram(METRIC_PREFIX + name, documentation, labels, buckets)
+        )
+
+    def render(self) -> str:
+        """
+        输出 Prometheus 文本格式
+        """
+        with self._lock:
+            metrics = list(self.metrics)
+        return "".join(metric.render() + "\n" for metric in metrics)
+
+    def write(self, path: str):
+        """
+        写入文件，先写临时文件再替换，
+        可配合 node_exporter 的 textfile collector 使用
+        """
+        path = os.path.expanduser(path)
+        directory = os.path.dirname(os.path.abspath(path))
+        os.makedirs(directory, exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=directory, suffix=".tmp")
+        try:
+            with os.fdopen(fd, "w", encoding="utf-8") as f:
+                f.write(self.render())
+            os.replace(tmp_path, path)
+        except BaseException:
+            os.unlink(tmp_path)
+            raise
+
+    def serve(
+        self, port: int, host: str = "127.0.0.1"
+    ) -> http.server.ThreadingHTTPServer:
+        """
+        在后台线程中通过 HTTP 的 /metrics 提供指标，返回的服务可调用 shutdown 停止
+        """
+        registry = self
+
+        class Handler(http.server.BaseHTTPRequestHandler):
+            def do_GET(self):
+                if self.path.split("?")[0] != "/metrics":
+                    self.send_error(404)
+                    return
+                body = registry.render().encode("utf-8")
+                self.send_response(200)
+                self.send_header("Content-Type", CONTENT_TYPE)
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format: str, *args: Any):
+                pass
+
+        server = http.server.ThreadingHTTPServer((host, port), Handler)
+        server.daemon_threads = True
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        return server
+
+
+class TranslationMetrics:
+    """
+    翻译过程的指标：根据 tracer 中 span 的开始与结束统计任务、分片队列、
+    进行中的请求、请求耗时、错误与重试次数以及 token 数量
+    """
+
+    def __init__(self, registry: MetricsRegistry | None = None):
+        self.registry = registry or MetricsRegistry()
+        r = self.registry
+        self.jobs_in_progress = r.gauge("jobs_in_progress", "正在翻译的文件数量")
+        self.jobs = r.counter("jobs_total", "翻译结束的文件数量", "status")
+        self.cues = r.counter(
+            "cues_total",
+            "字幕条目数量，skipped 为无需翻译、从任务日志恢复或命中翻译记忆库的条目，"
+            "untranslated 为多次修复后仍缺少译文、保留原文的条目",
+            "state",
+        )
+        self.chunks_queued = r.gauge("chunks_queued", "等待翻译的分片数量")
+        self.chunks_in_flight = r.gauge("chunks_in_flight", "正在翻译的分片数量")
+        self.chunk_duration = r.histogram(
+            "chunk_duration_seconds", "分片翻译耗时，包括重新请求缺失的条目"
+        )
+        self.repairs = r.counter("repairs_total", "重新请求缺失条目的次数")
+        self.requests_in_flight = r.gauge("requests_in_flight", "进行中的请求数量")
+        self.requests = r.counter("requests_total", "发送的请求数量", "engine", "status")
+        self.request_duration = r.histogram(
+            "request_duration_seconds", "请求耗时，包括限流等待与重试", "engine"
+        )
+        self.cache_hits = r.counter("cache_hits_total", "命中缓存的分片请求数量")
+        self.retries = r.counter("retries_total", "请求重试次数", "status")
+        self.tokens = r.counter(
+            "tokens_total",
+            "token 数量，source 为 reported 时来自响应中的用量，estimated 时按文本估算",
+            "engine",
+            "direction",
+            "source",
+        )
+        self.parse_errors = r.counter("parse_errors_total", "模型输出中无法对应的条目数量")
+        # 各任务中尚未开始的分片数量，任务结束时从队列中扣除
+        self._queued: dict[str, int] = {}
+        self._engines: dict[str, str] = {}
+        self._lock = threading.Lock()
+
+    def span_started(self, span: Span):
+        if span.name == "job":
+            self.jobs_in_progress.inc()
+            with self._lock:
+                self._engines[span.trace_id] = str(span.attributes.get("engine", ""))
+        elif span.name == "chunk":
+            self.chunks_in_flight.inc()
+            with self._lock:
+                if self._queued.get(span.parent_id or "", 0) > 0:
+                    self._queued[span.parent_id or ""] -= 1
+                    self.chunks_queued.dec()
+        elif span.name == "generate":
+            self.requests_in_flight.inc()
+
+    def span_finished(self, span: Span):
+        attributes = span.attributes
+        if span.name == "job":
+            self.jobs_in_progress.dec()
+            self.jobs.inc(status=span.status)
+            with self._lock:
+                self.chunks_queued.dec(self._queued.pop(span.span_id, 0))
+                self._engines.pop(span.trace_id, None)
+            pending = attributes.get("pending", 0)
+            self.cues.inc(attributes.get("cues", 0) - pending, state="skipped")
+            self.cues.inc(pending, state="pending")
+            self.cues.inc(attributes.get("untranslated", 0), state="untranslated")
+        elif span.name == "split":
+            chunks = attributes.get("chunks", 0)
+            with self._lock:
+                self._queued[span.parent_id or ""] = chunks
+            self.chunks_queued.inc(chunks)
+        elif span.name == "chunk":
+            self.chunks_in_flight.dec()
+            self.chunk_duration.observe(span.duration or 0)
+            self.repairs.inc(attributes.get("repairs", 0))
+        elif span.name == "generate":
+            self.requests_in_flight.dec()
+            if attributes.get("cached"):
+                self.cache_hits.inc()
+                return
+            with self._lock:
+                engine = self._engines.get(span.trace_id, "")
+            self.requests.inc(engine=engine, status=span.status)
+            self.request_duration.observe(span.duration or 0, engine=engine)
+            if "input_tokens" in attributes:
+                source = "reported"
+                input_tokens = attributes["input_tokens"]
+                output_tokens = attributes.get("output_tokens", 0)
+            else:
+                source = "estimated"
+                input_tokens = attributes.get("estimated_input_tokens", 0)
+                output_tokens = attributes.get("estimated_output_tokens", 0)
+            self.tokens.inc(
+                input_tokens, engine=engine, direction="input", source=source
+            )
+            self.tokens.inc(
+                output_tokens, engine=engine, direction="output", source=source
+            )
+        elif span.name == "parse":
+            self.parse_errors.inc(attributes.get("errors", 0))
+        elif span.name == "retry":
+            self.retries.inc(status=attributes.get("status") or "unknown")
@@ -0,0 +1,98 @@
+from typing import Any, AsyncGenerator, Generator
+
+from .engine import ENGINE_DEFAULTS, OPENAI, TranslationEngine
+from .scheduler import RequestScheduler
+
+DEFAULT_MODEL = ENGINE_DEFAULTS[OPENAI].model_name
+
+
+class OpenAIEngine(TranslationEngine):
+    """
+    OpenAI 翻译引擎，提示词作为 system 消息，分片作为 user 消息
+    """
+
+    name = OPENAI
+    max_output_tokens = ENGINE_DEFAULTS[OPENAI].max_output_tokens
+    max_concurrency = 32
+
+    def __init__(
+        self,
+        api_key: str,
+        model_name: str = DEFAULT_MODEL,
+        scheduler: RequestScheduler | None = None,
+        temperature: float = 1.0,
+    ):
+        try:
+            import openai
+        except ImportError as e:
+            raise ImportError("使用 OpenAI 引擎需要安装 openai：pip install openai") from e
+
+        super().__init__(model_name, scheduler)
+        self.client = openai.OpenAI(api_key=api_key)
+        self.async_client = openai.AsyncOpenAI(api_key=api_key)
+        self.generation_config = {
+            **ENGINE_DEFAULTS[OPENAI].generation_config,
+            "temperature": temperature,
+        }
+
+    def messages(self, prompt: str, text: str) -> list[dict[str, str]]:
+        return [
+            {"role": "system", "content": prompt},
+            {"role": "user", "content": text},
+        ]
+
+    def report_response_usage(self, usage: Any):
+        if usage is not None:
+            self.report_usage(usage.prompt_tokens, usage.completion_tokens)
+
+    def request(self, prompt: str, text: str) -> str:
+        response = self.client.chat.completions.create(
+            model=self.model_name,
+            messages=self.messages(prompt, text),  # type: ignore
+            **self.generation_config,
+        )
+        self.report_response_usage(response.usage)
+        return response.choices[0].message.content or ""
+
+    async def request_async(self, prompt: str, text: str) -> str:
+        response = await self.async_client.chat.completions.create(
+            model=self.model_name,
+            messages=self.messages(prompt, text),  # type: ignore
+            **self.generation_config,
+        )
+        self.report_response_usage(response.usage)
+        return response.choices[0].message.content or ""
+
+    def stream(self, prompt: str, text: str) -> Generator[str, None, None]:
+        response = self.client.chat.completions.create(
+            model=self.model_name,
+            messages=self.messages(prompt, text),  # type: ignore
+            stream=True,
+            # 最后一段返回整个请求的用量
+            stream_options={"include_usage": True},
+            **self.generation_config,
+        )
+        try:
+            for chunk in response:
+                self.report_response_usage(chunk.usage)
+                if chunk.choices and chunk.choices[0].delta.content:
+                    yield chunk.choices[0].delta.content
+        finally:
+            response.close()
+
+    async def stream_async(self, prompt: str, text: str) -> AsyncGenerator[str, None]:
+        response = await self.async_client.chat.completions.create(
+            model=self.model_name,
+            messages=self.messages(prompt, text),  # type: ignore
+            stream=True,
+            # 最后一段返回整个请求的用量
+            stream_options={"include_usage": True},
+            **self.generation_config,
+        )
+        try:
+            async for chunk in response:
+                self.report_response_usage(chunk.usage)
+                if chunk.choices and chunk.choices[0].delta.content:
+                    yield chunk.choices[0].delta.content
+        finally:
+            await response.close()
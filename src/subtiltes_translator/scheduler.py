@@ -0,0 +1,234 @@
+import asyncio
+import random
+import re
+import threading
+import time
+from typing import Any, Awaitable, Callable, TypeVar
+
+from . import tracing
+
+T = TypeVar("T")
+
+# 默认每分钟请求数量上限
+DEFAULT_REQUESTS_PER_MINUTE = 60
+
+# 默认每分钟 token 数量上限
+DEFAULT_TOKENS_PER_MINUTE = 1_000_000
+
+# 每个请求的最大重试次数
+DEFAULT_MAX_RETRIES = 5
+
+# 可重试的 HTTP 状态码
+RETRYABLE_STATUS = {408, 429, 500, 502, 503, 504}
+
+# 表示配额不足的 HTTP 状态码
+THROTTLE_STATUS = {429}
+
+# 触发限流后速率下降的最低比例
+MIN_RATE_SCALE = 0.1
+
+
+def error_status(error: BaseException) -> int | None:
+    """
+    获取 API 错误对应的 HTTP 状态码，google-api-core 使用 code，
+    其他 SDK 多使用 status_code
+    """
+    for name in ("code", "status_code"):
+        status = getattr(error, name, None)
+        if isinstance(status, int):
+            return status
+    return None
+
+
+def is_retryable(error: BaseException) -> bool:
+    """
+    判断错误是否可以重试
+    """
+    if isinstance(error, (ConnectionError, TimeoutError)):
+        return True
+    return error_status(error) in RETRYABLE_STATUS
+
+
+def parse_duration(value: Any) -> float | None:
+    """
+    解析 "12s"、"1.5"、Duration 对象等形式的时长
+    """
+    if value is None:
+        return None
+    if hasattr(value, "seconds"):
+        return value.seconds + getattr(value, "nanos", 0) / 1e9
+    match = re.fullmatch(r"\s*(\d+(?:\.\d+)?)s?\s*", str(value))
+    if match:
+        return float(match.group(1))
+    return None
+
+
+def retry_after(error: BaseException) -> float | None:
+    """
+    从错误中读取服务端建议的重试等待时间
+    """
+    # google.rpc.RetryInfo
+    for detail in getattr(error, "details", None) or []:
+        if isinstance(detail, dict):
+            delay = parse_duration(detail.get("retryDelay"))
+        else:
+            delay = parse_duration(getattr(detail, "retry_delay", None))
+        if delay is not None:
+            return delay
+    # HTTP Retry-After 响应头
+    response = getattr(error, "response", None)
+    headers = getattr(response, "headers", None)
+    if headers is not None:
+        return parse_duration(headers.get("retry-after"))
+    return None
+
+
+class TokenBucket:
+    """
+    令牌桶，rate_per_minute 为每分钟补充的令牌数量，也是桶的容量
+    """
+
+    def __init__(self, rate_per_minute: float):
+        self.capacity = rate_per_minute
+        self.rate = rate_per_minute / 60
+        self.tokens = rate_per_minute
+        self.updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def reserve(self, amount: float, scale: float = 1.0) -> float:
+        """
+        预留 amount 个令牌，返回需要等待的秒数，scale 为当前速率比例
+        """
+        with self._lock:
+            now = time.monotonic()
+            rate = self.rate * scale
+            self.tokens = min(self.capacity, self.tokens + (now - self.updated) * rate)
+            self.updated = now
+            # 单次请求超过桶容量时按容量计算，避免永远等待
+            self.tokens -= min(amount, self.capacity)
+            if self.tokens >= 0:
+                return 0.0
+            return -self.tokens / rate
+
+
+class RequestScheduler:
+    """
+    请求调度器：按每分钟请求数与 token 数限流，遇到可重试错误时指数退避重试，
+    触发配额限制后自动降低速率，之后随成功请求逐步恢复。
+    多个任务可共用同一个调度器以共享配额
+    """
+
+    def __init__(
+        self,
+        requests_per_minute: float = DEFAULT_REQUESTS_PER_MINUTE,
+        tokens_per_minute: float = DEFAULT_TOKENS_PER_MINUTE,
+        max_retries: int = DEFAULT_MAX_RETRIES,
+        base_delay: float = 1.0,
+        max_delay: float = 60.0,
+    ):
+        self.requests = TokenBucket(requests_per_minute)
+        self.tokens = TokenBucket(tokens_per_minute)
+        self.max_retries = max_retries
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.rate_scale = 1.0
+        self._lock = threading.Lock()
+
+    def wait_time(self, tokens: int) -> float:
+        """
+        为一次请求预留配额，返回需要等待的秒数
+        """
+        scale = self.rate_scale
+        return max(
+            self.requests.reserve(1, scale),
+            self.tokens.reserve(tokens, scale),
+        )
+
+    def backoff(self, attempt: int, error: BaseException) -> float:
+        """
+        第 attempt 次重试前的等待时间，优先使用服务端建议的时间
+        """
+        delay = retry_after(error)
+        if delay is not None:
+            return delay
+        # 指数退避 + 全随机抖动
+        return random.uniform(0, min(self.max_delay, self.base_delay * 2**attempt))
+
+    def on_success(self):
+        with self._lock:
+            self.rate_scale = min(1.0, self.rate_scale + 0.05)
+
+    def on_error(self, error: BaseException):
+        if error_status(error) in THROTTLE_STATUS:
+            with self._lock:
+                self.rate_scale = max(MIN_RATE_SCALE, self.rate_scale / 2)
+
+    def call_once(self, func: Callable[[], T], tokens: int = 0) -> T:
+        """
+        限流并执行一次 func，出错时只调整速率，不重试
+        """
+        wait = self.wait_time(tokens)
+        if wait > 0:
+            tracing.add("throttle_seconds", wait)
+        time.sleep(wait)
+        try:
+            result = func()
+        except Exception as e:
+            self.on_error(e)
+            raise
+        self.on_success()
+        return result
+
+    async def call_once_async(
+        self, func: Callable[[], Awaitable[T]], tokens: int = 0
+    ) -> T:
+        """
+        call_once 的异步版本
+        """
+        wait = self.wait_time(tokens)
+        if wait > 0:
+            tracing.add("throttle_seconds", wait)
+        await asyncio.sleep(wait)
+        try:
+            result = await func()
+        except Exception as e:
+            self.on_error(e)
+            raise
+        self.on_success()
+        return result
+
+    def call(self, func: Callable[[], T], tokens: int = 0) -> T:
+        """
+        限流并执行 func，可重试的错误最多重试 max_retries 次
+        """
+        attempt = 0
+        while True:
+            try:
+                return self.call_once(func, tokens)
+            except Exception as e:
+                if not is_retryable(e) or attempt >= self.max_retries:
+                    raise
+                tracing.add("retries")
+                with tracing.span(
+                    "retry", attempt=attempt + 1, error=repr(e), status=error_status(e)
+                ):
+                    time.sleep(self.backoff(attempt, e))
+                attempt += 1
+
+    async def call_async(self, func: Callable[[], Awaitable[T]], tokens: int = 0) -> T:
+        """
+        call 的异步版本
+        """
+        attempt = 0
+        while True:
+            try:
+                return await self.call_once_async(func, tokens)
+            except Exception as e:
+                if not is_retryable(e) or attempt >= self.max_retries:
+                    raise
+                tracing.add("retries")
+                with tracing.span(
+                    "retry", attempt=attempt + 1, error=repr(e), status=error_status(e)
+                ):
+                    await asyncio.sleep(self.backoff(attempt, e))
+                attempt += 1
@@ -0,0 +1,210 @@
+import contextlib
+import contextvars
+import json
+import os
+import threading
+import time
+import uuid
+from typing import TYPE_CHECKING, Any, Generator
+
+if TYPE_CHECKING:
+    from .metrics import TranslationMetrics
+
+# 当前所在的 span，分片提交到线程池时随上下文一起复制
+_current: contextvars.ContextVar["Span | None"] = contextvars.ContextVar(
+    "current_span", default=None
+)
+
+
+class Span:
+    """
+    一段计时的操作，例如一个任务、一个分片或一次请求。
+    attributes 记录 token 数量、重试次数等信息，结束后由 tracer 导出
+    """
+
+    def __init__(
+        self,
+        tracer: "Tracer | None",
+        name: str,
+        parent: "Span | None" = None,
+        attributes: dict[str, Any] | None = None,
+    ):
+        self.tracer = tracer
+        self.name = name
+        self.trace_id = parent.trace_id if parent else uuid.uuid4().hex
+        self.span_id = uuid.uuid4().hex[:16]
+        self.parent_id = parent.span_id if parent else None
+        self.attributes: dict[str, Any] = dict(attributes or {})
+        self.status = "ok"
+        self.start_time = time.time()
+        self.duration: float | None = None
+        self._start = time.perf_counter()
+        self._lock = threading.Lock()
+        self.otel_span = None
+
+    def set(self, **attributes: Any):
+        """
+        设置属性
+        """
+        with self._lock:
+            self.attributes.update(attributes)
+
+    def add(self, name: str, value: float = 1):
+        """
+        累加计数类属性，例如重试次数、等待时间
+        """
+        with self._lock:
+            self.attributes[name] = self.attributes.get(name, 0) + value
+
+    def end(self):
+        self.duration = time.perf_counter() - self._start
+
+    def to_dict(self) -> dict[str, Any]:
+        return {
+            "name": self.name,
+            "trace_id": self.trace_id,
+            "span_id": self.span_id,
+            "parent_id": self.parent_id,
+            "start": self.start_time,
+            "duration": self.duration,
+            "status": self.status,
+            "attributes": self.attributes,
+        }
+
+
+class Tracer:
+    """
+    收集翻译过程中的 span，每个 span 结束后以一行 JSON 追加写入 path，
+    opentelemetry 时同时通过 OpenTelemetry API 导出，
+    导出目标由应用配置的 TracerProvider 决定，metrics 根据 span 统计指标
+    """
+
+    def __init__(
+        self,
+        path: str | None = None,
+        opentelemetry: bool = False,
+        metrics: "TranslationMetrics | None" = None,
+    ):
+        self.path = os.path.expanduser(path) if path else None
+        self.metrics = metrics
+        self._file = None
+        self._lock = threading.Lock()
+        self._otel = None
+        if opentelemetry:
+            # 按需导入，不使用 OpenTelemetry 时无需安装
+            from opentelemetry import trace
+
+            self._otel = trace.get_tracer("subtiltes-translator")
+
+    def start(
+        self, name: str, parent: Span | None, attributes: dict[str, Any]
+    ) -> Span:
+        span = Span(self, name, parent, attributes)
+        if self._otel is not None:
+            from opentelemetry import trace
+
+            context = (
+                trace.set_span_in_context(parent.otel_span)
+                if parent is not None and parent.otel_span is not None
+                else None
+            )
+            span.otel_span = self._otel.start_span(
+                name, context=context, start_time=int(span.start_time * 1e9)
+            )
+        if self.metrics is not None:
+            self.metrics.span_started(span)
+        return span
+
+    def export(self, span: Span):
+        """
+        导出已结束的 span
+        """
+        if self.metrics is not None:
+            self.metrics.span_finished(span)
+        if span.otel_span is not None:
+            from opentelemetry.trace import Status, StatusCode
+
+            for key, value in span.attributes.items():
+                span.otel_span.set_attribute(key, otel_value(value))
+            if span.status != "ok":
+                span.otel_span.set_status(Status(StatusCode.ERROR))
+            span.otel_span.end(
+                end_time=int((span.start_time + (span.duration or 0)) * 1e9)
+            )
+        if self.path is None:
+            return
+        line = json.dumps(span.to_dict(), ensure_ascii=False, default=str)
+        with self._lock:
+            if self._file is None:
+                os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+                self._file = open(self.path, "a", encoding="utf-8")
+            self._file.write(line + "\n")
+            self._file.flush()
+
+    def close(self):
+        with self._lock:
+            if self._file is not None:
+                self._file.close()
+                self._file = None
+
+
+def otel_value(value: Any) -> Any:
+    """
+    OpenTelemetry 属性只支持基本类型
+    """
+    if isinstance(value, (bool, int, float, str)):
+        return value
+    return str(value)
+
+
+def current_span() -> Span | None:
+    return _current.get()
+
+
+@contextlib.contextmanager
+def span(
+    name: str, tracer: Tracer | None = None, **attributes: Any
+) -> Generator[Span, None, None]:
+    """
+    记录一段操作，作为当前 span 的子 span。传入 tracer 且不在该 tracer 的 span 中时
+    开始一条新的链路，两者都没有时不导出，返回的 span 仍可正常设置属性
+    """
+    parent = current_span()
+    if tracer is None and parent is not None:
+        tracer = parent.tracer
+    if tracer is None:
+        current = Span(None, name, None, attributes)
+    else:
+        if parent is not None and parent.tracer is not tracer:
+            parent = None
+        current = tracer.start(name, parent, attributes)
+    token = _current.set(current)
+    try:
+        yield current
+    except BaseException as e:
+        current.status = "error"
+        current.set(error=f"{type(e).__name__}: {e}")
+        raise
+    finally:
+        _current.reset(token)
+        current.end()
+        if current.tracer is not None:
+            current.tracer.export(current)
+
+
+def add(name: str, value: float = 1):
+    """
+    累加当前 span 的计数类属性，不在 span 中时忽略
+    """
+    current = current_span()
+    if current is not None:
+        current.add(name, value)
+
+
+def set_attributes(**attributes: Any):
+    """
+    设置当前 span 的属性，不在 span 中时忽略
+    """
+    current = current_span()
+    if current is not None:
+        current.set(**attributes)
@@ -0,0 +1,1233 @@
+import asyncio
+import contextlib
+import contextvars
+import dataclasses
+import os
+import pathlib
+import queue
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Any, Callable
+
+import srt
+
+from . import tracing
+from .align import create_cue_parser
+from .cache import DEFAULT_CACHE_SIZE, TranslationCache
+from .classify import is_translatable
+from .engine import GEMINI, TranslationEngine, create_engine
+from .journal import JobJournal, file_hash
+from .memory import DEFAULT_FUZZY_THRESHOLD, TranslationMemory, text_hash
+from .scheduler import RequestScheduler
+from .tracing import Span, Tracer
+from .usage import JobUsage, TokenUsage, usage_file_path
+from .utils import (
+    CUE_OVERHEAD_TOKENS,
+    DEFAULT_MAX_INPUT_TOKENS,
+    TEXT_CUE_OVERHEAD_TOKENS,
+    ChunkStrategy,
+    FileType,
+    WireFormat,
+    chunk_subtitles,
+    compose_subtitle_chunk,
+    compose_text_chunk,
+    estimate_cue_tokens,
+    estimate_tokens,
+    get_file_type,
+    load_subtitle_file,
+    merge_subtitle_files,
+)
+
+# 默认同时翻译的分片数量
+DEFAULT_CONCURRENCY = 4
+
+# 等待分片完成时检查取消信号的间隔（秒）
+CANCEL_POLL_INTERVAL = 0.2
+
+# 分片的输出 token 预算占引擎输出上限的比例
+OUTPUT_TOKEN_MARGIN = 0.75
+
+# 分片中部分条目缺失或损坏时，单独重新请求这些条目的最多次数
+MAX_REPAIR_ATTEMPTS = 2
+
+# 使用紧凑文本格式时附加在提示词后的格式说明
+TEXT_FORMAT_PROMPT = (
+    "输入的每一行是一条字幕，格式为「序号: 内容」，内容中的 <br> 表示换行。"
+    "请逐行输出译文，保持「序号: 译文」的格式和原有序号，每条字幕占一行并保留 <br>，"
+    "不要合并或拆分字幕，不要输出其他内容"
+)
+
+
+# 默认随每个分片发送的前后文条目数量
+DEFAULT_CONTEXT_CUES = 3
+
+# 附加在提示词后的上下文说明
+CONTEXT_PROMPT = (
+    "以下是待翻译字幕前后相邻的字幕，仅用于理解说话人、指代与语境，"
+    "不要翻译或输出这些字幕"
+)
+
+
+class TranslationCancelled(Exception):
+    """
+    翻译任务被取消
+    """
+
+
+def chunk_cache_key(
+    engine: TranslationEngine,
+    prompt: str,
+    text: str,
+    from_language: str,
+    target_language: str,
+) -> str:
+    """
+    计算分片内容的缓存键
+    """
+    model_name, generation_config = engine.cache_identity()
+    return TranslationCache.make_key(
+        text,
+        prompt,
+        model_name,
+        generation_config,
+        from_language,
+        target_language,
+    )
+
+
+def request_prompt(prompt: str, wire_format: WireFormat) -> str:
+    """
+    发送给模型的提示词，紧凑文本格式下附加格式说明
+    """
+    if wire_format == WireFormat.TEXT:
+        return f"{prompt}\n\n{TEXT_FORMAT_PROMPT}"
+    return prompt
+
+
+def context_window(
+    subtitles: list[Any], positions: dict[int, int], chunk: list[Any], size: int
+) -> tuple[list[Any], list[Any]]:
+    """
+    分片在原始字幕中的前 size 条与后 size 条字幕，positions 为序号到位置的映射
+    """
+    if size <= 0 or not chunk:
+        return [], []
+    first = min(positions[line.index] for line in chunk)
+    last = max(positions[line.index] for line in chunk)
+    before = subtitles[max(0, first - size) : first]
+    after = subtitles[last + 1 : last + 1 + size]
+    return before, after
+
+
+def context_prompt(prompt: str, before: list[Any], after: list[Any]) -> str:
+    """
+    在提示词后附加只读的上下文。上下文不带序号，避免模型把它当作需要翻译的字幕输出
+    """
+    if not before and not after:
+        return prompt
+    sections = [prompt, CONTEXT_PROMPT]
+    for title, cues in (("上文", before), ("下文", after)):
+        if cues:
+            lines = [" ".join(line.content.split()) for line in cues]
+            sections.append(f"{title}：\n" + "\n".join(lines))
+    return "\n\n".join(sections)
+
+
+def chunk_prompts(
+    prompt: str, subtitles: list[Any], chunks: list[list[Any]], context_cues: int
+) -> list[str]:
+    """
+    每个分片实际发送的提示词，附带分片前后 context_cues 条字幕作为上下文
+    """
+    positions = {line.index: i for i, line in enumerate(subtitles)}
+    prompts = []
+    for chunk in chunks:
+        before, after = context_window(subtitles, positions, chunk, context_cues)
+        prompts.append(context_prompt(prompt, before, after))
+    return prompts
+
+
+def compose_request(wire_format: WireFormat, cues: list[Any]) -> str:
+    """
+    将字幕条目转换为发送给模型的文本
+    """
+    if wire_format == WireFormat.TEXT:
+        return compose_text_chunk(cues)
+    return compose_subtitle_chunk(cues)
+
+
+def request_usage(request: Span) -> TokenUsage:
+    """
+    一次请求的 token 用量，命中缓存时为 0，引擎没有返回用量时按文本估算
+    """
+    attributes = request.attributes
+    if attributes.get("cached"):
+        return TokenUsage()
+    if "input_tokens" in attributes:
+        return TokenUsage(
+            attributes["input_tokens"], attributes.get("output_tokens", 0), requests=1
+        )
+    return TokenUsage(
+        attributes.get("estimated_input_tokens", 0),
+        attributes.get("estimated_output_tokens", 0),
+        requests=1,
+        estimated_requests=1,
+    )
+
+
+def add_usage(usage: TokenUsage):
+    """
+    将用量累加到当前的 span，即请求所属的分片
+    """
+    for name, value in usage.to_dict().items():
+        tracing.add(name, value)
+
+
+class CueRequest:
+    """
+    翻译一组字幕条目的一次请求：组装请求文本、查找缓存、解析模型输出并缓存有效的结果。
+    请求由同步或异步的调用方在 span 中发送
+    """
+
+    def __init__(
+        self,
+        engine: TranslationEngine,
+        prompt: str,
+        cues: list[Any],
+        cache: TranslationCache,
+        from_language: str,
+        target_language: str,
+        stream: bool = False,
+        on_cue: Callable[[int, str], None] | None = None,
+        wire_format: WireFormat = WireFormat.SRT,
+    ):
+        self.prompt = prompt
+        self.cues = cues
+        self.cache = cache
+        self.stream = stream
+        self.text = compose_request(wire_format, cues)
+        self.key = chunk_cache_key(
+            engine, prompt, self.text, from_language, target_language
+        )
+        self.parser = create_cue_parser(wire_format, cues, on_cue)
+        self.cached = False
+
+    def span(self) -> contextlib.AbstractContextManager[Span]:
+        return tracing.span(
+            "generate",
+            cues=len(self.cues),
+            stream=self.stream,
+            estimated_input_tokens=estimate_tokens(self.prompt)
+            + estimate_tokens(self.text),
+        )
+
+    def cached_response(self, request: Span) -> str | None:
+        """
+        读取缓存的输出，未命中时返回 None
+        """
+        response = self.cache.get(self.key)
+        self.cached = response is not None
+        request.set(cached=self.cached)
+        return response
+
+    def finish(self, request: Span, response: str) -> dict[int, str]:
+        """
+        解析输出，返回能与原文对应上的译文
+        """
+        # 流式请求在接收的同时已经解析，计入 generate
+        with tracing.span("parse", cues=len(self.cues)) as span:
+            if self.cached or not self.stream:
+                self.parser.feed(response)
+            translated = self.parser.finish()
+            span.set(
+                translated=len(translated),
+                errors=self.parser.errors,
+                aborted=self.parser.aborted,
+            )
+        add_usage(request_usage(request))
+        # 只缓存有效的结果，避免重试时读到同样错误的内容
+        if not self.cached and translated and not self.parser.aborted:
+            self.cache.set(self.key, response)
+        return translated
+
+
+def generate_cues(
+    engine: TranslationEngine,
+    prompt: str,
+    cues: list[Any],
+    cache: TranslationCache,
+    from_language: str,
+    target_language: str,
+    stream: bool = False,
+    on_cue: Callable[[int, str], None] | None = None,
+    wire_format: WireFormat = WireFormat.SRT,
+) -> dict[int, str]:
+    """
+    翻译一组字幕条目，返回能与原文对应上的译文。
+    stream 时边接收边解析，每个条目完成后立即通过 on_cue 回调，输出偏离时提前结束请求
+    """
+    cue_request = CueRequest(
+        engine,
+        prompt,
+        cues,
+        cache,
+        from_language,
+        target_language,
+        stream,
+        on_cue,
+        wire_format,
+    )
+    with cue_request.span() as request:
+        response = cue_request.cached_response(request)
+        if response is None and stream:
+            response = engine.generate_stream(
+                prompt, cue_request.text, cue_request.parser.feed
+            )
+        elif response is None:
+            response = engine.generate(prompt, cue_request.text)
+        request.set(estimated_output_tokens=estimate_tokens(response))
+    return cue_request.finish(request, response)
+
+
+async def generate_cues_async(
+    engine: TranslationEngine,
+    prompt: str,
+    cues: list[Any],
+    cache: TranslationCache,
+    from_language: str,
+    target_language: str,
+    stream: bool = False,
+    on_cue: Callable[[int, str], None] | None = None,
+    wire_format: WireFormat = WireFormat.SRT,
+) -> dict[int, str]:
+    """
+    异步翻译一组字幕条目
+    """
+    cue_request = CueRequest(
+        engine,
+        prompt,
+        cues,
+        cache,
+        from_language,
+        target_language,
+        stream,
+        on_cue,
+        wire_format,
+    )
+    with cue_request.span() as request:
+        response = cue_request.cached_response(request)
+        if response is None and stream:
+            response = await engine.generate_stream_async(
+                prompt, cue_request.text, cue_request.parser.feed
+            )
+        elif response is None:
+            response = await engine.generate_async(prompt, cue_request.text)
+        request.set(estimated_output_tokens=estimate_tokens(response))
+    return cue_request.finish(request, response)
+
+
+def missing_cues(chunk: list[Any], translated: dict[int, str]) -> list[Any]:
+    """
+    分片中模型遗漏、合并或改错序号的条目，需要重新请求时计入分片的修复次数
+    """
+    missing = [line for line in chunk if line.index not in translated]
+    if missing:
+        tracing.add("repairs")
+        tracing.add("repaired_cues", len(missing))
+    return missing
+
+
+def translate_chunk(
+    engine: TranslationEngine,
+    prompt: str,
+    chunk: list[Any],
+    cache: TranslationCache,
+    from_language: str,
+    target_language: str,
+    stream: bool = False,
+    on_cue: Callable[[int, str], None] | None = None,
+    wire_format: WireFormat = WireFormat.SRT,
+) -> dict[int, str]:
+    """
+    翻译单个分片，模型遗漏、合并或改错序号的条目单独重新请求
+    """
+
+    def generate(cues: list[Any]) -> dict[int, str]:
+        return generate_cues(
+            engine,
+            prompt,
+            cues,
+            cache,
+            from_language,
+            target_language,
+            stream,
+            on_cue,
+            wire_format,
+        )
+
+    translated = generate(chunk)
+    for _ in range(MAX_REPAIR_ATTEMPTS):
+        missing = missing_cues(chunk, translated)
+        if not missing:
+            break
+        translated.update(generate(missing))
+    return translated
+
+
+async def translate_chunk_async(
+    engine: TranslationEngine,
+    prompt: str,
+    chunk: list[Any],
+    cache: TranslationCache,
+    from_language: str,
+    target_language: str,
+    semaphore: asyncio.Semaphore,
+    stream: bool = False,
+    on_cue: Callable[[int, str], None] | None = None,
+    wire_format: WireFormat = WireFormat.SRT,
+) -> dict[int, str]:
+    """
+    异步翻译单个分片，semaphore 限制同时进行的请求数量
+    """
+
+    async def generate(cues: list[Any]) -> dict[int, str]:
+        return await generate_cues_async(
+            engine,
+            prompt,
+            cues,
+            cache,
+            from_language,
+            target_language,
+            stream,
+            on_cue,
+            wire_format,
+        )
+
+    async with semaphore:
+        translated = await generate(chunk)
+        for _ in range(MAX_REPAIR_ATTEMPTS):
+            missing = missing_cues(chunk, translated)
+            if not missing:
+                break
+            translated.update(await generate(missing))
+        return translated
+
+
+def output_file_path(
+    subtitle_file: str, target_dir: str, target_language: str
+) -> pathlib.Path:
+    """
+    翻译后字幕文件的输出路径，扩展名与原文件相同
+    """
+    source = pathlib.Path(subtitle_file)
+    return (
+        pathlib.Path(target_dir)
+        .joinpath(f"{source.stem}_{target_language}{source.suffix}")
+        .absolute()
+    )
+
+
+def skip_untranslatable(
+    subtitles: list[Any], from_language: str, target_language: str
+) -> dict[int, str]:
+    """
+    找出无需翻译的条目，返回序号到原文的映射，这些条目原样输出
+    """
+    return {
+        line.index: line.content
+        for line in subtitles
+        if not is_translatable(line.content, from_language, target_language)
+    }
+
+
+def open_journal(
+    resume: bool,
+    subtitle_file: str,
+    prompt: str,
+    from_language: str,
+    target_language: str,
+    wire_format: WireFormat,
+    journal_dir: str | None = None,
+) -> JobJournal | None:
+    """
+    打开任务日志，同一文件内容、提示词、语言与格式的任务共用一个日志
+    """
+    if not resume:
+        return None
+    return JobJournal(
+        file_hash(subtitle_file),
+        prompt,
+        from_language,
+        target_language,
+        wire_format.value,
+        journal_dir,
+    )
+
+
+def memory_scope(engine: TranslationEngine, prompt: str) -> str:
+    """
+    翻译记忆库中本任务条目的 scope，与缓存一样区分提示词与模型
+    """
+    model_name, generation_config = engine.cache_identity()
+    return TranslationMemory.make_scope(prompt, model_name, generation_config)
+
+
+def lookup_memory(
+    memory: TranslationMemory | None,
+    subtitles: list[Any],
+    from_language: str,
+    target_language: str,
+    scope: str,
+) -> dict[int, str]:
+    """
+    从翻译记忆库中查找已有译文，返回序号到译文的映射
+    """
+    if memory is None:
+        return {}
+    found = {}
+    for line in subtitles:
+        target = memory.lookup(line.content, from_language, target_language, scope)
+        if target is not None:
+            found[line.index] = target
+    return found
+
+
+def deduplicate_cues(pending: list[Any]) -> tuple[list[Any], dict[int, list[int]]]:
+    """
+    合并规范化后文本相同的条目，每种文本只翻译第一次出现的条目。
+    返回 (需要翻译的条目, 第一次出现的序号到其余相同条目序号的映射)
+    """
+    unique = []
+    first: dict[str, int] = {}
+    duplicates: dict[int, list[int]] = {}
+    for line in pending:
+        key = text_hash(line.content)
+        if key in first:
+            duplicates.setdefault(first[key], []).append(line.index)
+        else:
+            first[key] = line.index
+            unique.append(line)
+    return unique, duplicates
+
+
+def expand_duplicates(
+    translated: dict[int, str], duplicates: dict[int, list[int]]
+) -> dict[int, str]:
+    """
+    将译文复制到所有相同文本的条目
+    """
+    expanded = dict(translated)
+    for index, others in duplicates.items():
+        if index in translated:
+            for other in others:
+                expanded[other] = translated[index]
+    return expanded
+
+
+def collect_translations(results: list[dict[int, str]]) -> dict[int, str]:
+    """
+    合并各分片的翻译结果
+    """
+    translated: dict[int, str] = {}
+    for chunk in results:
+        translated.update(chunk)
+    return translated
+
+
+def remember_translations(
+    memory: TranslationMemory | None,
+    pending: list[Any],
+    translated: dict[int, str],
+    from_language: str,
+    target_language: str,
+    scope: str,
+):
+    """
+    将新翻译的条目写入翻译记忆库
+    """
+    if memory is None:
+        return
+    memory.add(
+        [
+            (line.content, translated[line.index])
+            for line in pending
+            if line.index in translated
+        ],
+        from_language,
+        target_language,
+        scope,
+    )
+
+
+def translated_line(line: Any, content: str) -> Any:
+    """
+    使用原始条目的时间轴生成译文条目
+    """
+    return srt.Subtitle(
+        index=line.index,
+        start=line.start,
+        end=line.end,
+        content=content,
+        proprietary=line.proprietary,
+    )
+
+
+def apply_translations(subtitles: list[Any], translated: dict[int, str]) -> list[Any]:
+    """
+    将译文按序号填回原始字幕条目，保留原始时间轴，缺失译文的条目保留原文
+    """
+    return [
+        translated_line(line, translated.get(line.index, line.content))
+        for line in subtitles
+    ]
+
+
+class CueProgress:
+    """
+    按条目汇报翻译进度：progress_callback 接收 (已完成条目数, 待翻译条目数)，
+    cue_callback 接收每个新翻译的条目，可用于实时预览。
+    duplicates 中相同文本的条目随第一次出现的条目一起汇报
+    """
+
+    def __init__(
+        self,
+        pending: list[Any],
+        progress_callback: Callable[[int, int], None] | None = None,
+        cue_callback: Callable[[Any], None] | None = None,
+        duplicates: dict[int, list[int]] | None = None,
+    ):
+        self.lines = {line.index: line for line in pending}
+        self.progress_callback = progress_callback
+        self.cue_callback = cue_callback
+        self.duplicates = duplicates or {}
+        self.done: set[int] = set()
+
+    def add_cue(self, index: int, content: str):
+        """
+        收到一个条目的译文
+        """
+        indexes = [index, *self.duplicates.get(index, [])]
+        if self.cue_callback:
+            for i in indexes:
+                self.cue_callback(translated_line(self.lines[i], content))
+        self.mark(indexes)
+
+    def add_chunk(self, chunk: list[Any]):
+        """
+        分片翻译结束，未能翻译的条目也计入进度
+        """
+        indexes = []
+        for line in chunk:
+            indexes.append(line.index)
+            indexes.extend(self.duplicates.get(line.index, []))
+        self.mark(indexes)
+
+    def mark(self, indexes: list[int]):
+        count = len(self.done)
+        self.done.update(indexes)
+        if self.progress_callback and len(self.done) > count:
+            self.progress_callback(len(self.done), len(self.lines))
+
+
+@dataclasses.dataclass
+class JobPlan:
+    """
+    一个翻译任务的计划：已有译文的条目（无需翻译、从任务日志恢复或翻译记忆库命中）、
+    需要翻译的条目、分片及各分片的提示词，以及按分片计划估算的用量
+    """
+
+    subtitle_file: str
+    file_type: FileType
+    subtitles: list[Any]
+    translated: dict[int, str]
+    resumed: dict[int, str]
+    pending: list[Any]
+    unique: list[Any]
+    duplicates: dict[int, list[int]]
+    chunks: list[list[Any]]
+    prompts: list[str]
+    journal: JobJournal | None
+    usage: JobUsage
+    memory_scope: str
+
+    def start_progress(
+        self,
+        progress_callback: Callable[[int, int], None] | None = None,
+        cue_callback: Callable[[Any], None] | None = None,
+    ) -> CueProgress:
+        """
+        先通过 cue_callback 汇报已有译文的条目，返回汇报翻译进度的 CueProgress
+        """
+        if cue_callback:
+            for line in self.subtitles:
+                if line.index in self.translated:
+                    cue_callback(translated_line(line, self.translated[line.index]))
+        return CueProgress(
+            self.pending, progress_callback, cue_callback, self.duplicates
+        )
+
+
+def resolve_engine(
+    engine: str | TranslationEngine,
+    api_key: str,
+    scheduler: RequestScheduler | None,
+    tmp_dir: str | None,
+    use_file_api: bool,
+) -> TranslationEngine:
+    """
+    按名称创建引擎，已经是引擎实例时直接使用
+    """
+    if isinstance(engine, TranslationEngine):
+        return engine
+    options: dict[str, Any] = {}
+    if engine == GEMINI:
+        options = {"tmp_dir": tmp_dir, "use_file_api": use_file_api}
+    return create_engine(engine, api_key, scheduler, **options)
+
+
+def cue_overhead(wire_format: WireFormat) -> int:
+    """
+    每条字幕格式本身的 token 开销
+    """
+    if wire_format == WireFormat.TEXT:
+        return TEXT_CUE_OVERHEAD_TOKENS
+    return CUE_OVERHEAD_TOKENS
+
+
+def plan_chunks(
+    engine: TranslationEngine,
+    pending: list[Any],
+    chunk_strategy: ChunkStrategy,
+    max_input_tokens: int,
+    max_output_tokens: int | None,
+    wire_format: WireFormat = WireFormat.SRT,
+) -> list[list[Any]]:
+    """
+    按引擎的输出上限划分分片，紧凑文本格式下每条字幕的开销更小，分片可以更大
+    """
+    if max_output_tokens is None:
+        max_output_tokens = int(engine.max_output_tokens * OUTPUT_TOKEN_MARGIN)
+    return chunk_subtitles(
+        pending,
+        chunk_strategy,
+        max_input_tokens=max_input_tokens,
+        max_output_tokens=max_output_tokens,
+        cue_overhead=cue_overhead(wire_format),
+    )
+
+
+def estimate_usage(
+    prompts: list[str], wire_format: WireFormat, chunks: list[list[Any]]
+) -> TokenUsage:
+    """
+    发送请求前按分片计划估算 token 用量，prompts 为各分片实际发送的提示词
+    """
+    usage = TokenUsage()
+    overhead = cue_overhead(wire_format)
+    for prompt, chunk in zip(prompts, chunks):
+        text = compose_request(wire_format, chunk)
+        usage.add(
+            TokenUsage(
+                estimate_tokens(prompt) + estimate_tokens(text),
+                sum(estimate_cue_tokens(line, overhead)[1] for line in chunk),
+                requests=1,
+                estimated_requests=1,
+            )
+        )
+    return usage
+
+
+def plan_job(
+    engine: TranslationEngine,
+    prompt: str,
+    subtitle_file: str,
+    from_language: str,
+    target_language: str,
+    memory: TranslationMemory | None,
+    chunk_strategy: ChunkStrategy,
+    max_input_tokens: int,
+    max_output_tokens: int | None,
+    wire_format: WireFormat,
+    deduplicate: bool,
+    skip_untranslatable_cues: bool,
+    resume: bool,
+    journal_dir: str | None,
+    context_cues: int,
+) -> JobPlan:
+    """
+    读取字幕并制定翻译计划：跳过无需翻译的条目，从任务日志恢复已完成的条目，
+    只翻译翻译记忆库中没有的条目，文本相同的条目只翻译一次，
+    再划分分片并估算用量。在任务的 span 中调用时记录各阶段
+    """
+    file_type = get_file_type(subtitle_file)
+    with tracing.span("load"):
+        subtitles = load_subtitle_file(file_type, subtitle_file)
+    translated = (
+        skip_untranslatable(subtitles, from_language, target_language)
+        if skip_untranslatable_cues
+        else {}
+    )
+    journal = open_journal(
+        resume,
+        subtitle_file,
+        prompt,
+        from_language,
+        target_language,
+        wire_format,
+        journal_dir,
+    )
+    resumed = journal.load() if journal else {}
+    translated.update(resumed)
+    candidates = [line for line in subtitles if line.index not in translated]
+    scope = memory_scope(engine, prompt)
+    translated.update(
+        lookup_memory(memory, candidates, from_language, target_language, scope)
+    )
+    pending = [line for line in subtitles if line.index not in translated]
+    unique, duplicates = deduplicate_cues(pending) if deduplicate else (pending, {})
+    with tracing.span("split", cues=len(unique)) as span:
+        chunks = plan_chunks(
+            engine,
+            unique,
+            chunk_strategy,
+            max_input_tokens,
+            max_output_tokens,
+            wire_format,
+        )
+        span.set(chunks=len(chunks))
+    tracing.set_attributes(
+        cues=len(subtitles),
+        resumed=len(resumed),
+        pending=len(pending),
+        unique=len(unique),
+        chunks=len(chunks),
+    )
+    prompts = chunk_prompts(
+        request_prompt(prompt, wire_format), subtitles, chunks, context_cues
+    )
+    # 发送请求前按分片计划估算用量
+    usage = JobUsage(
+        subtitle_file,
+        engine.cache_identity()[0],
+        estimate_usage(prompts, wire_format, chunks),
+    )
+    if journal:
+        usage.resumed = journal.usage
+    return JobPlan(
+        subtitle_file,
+        file_type,
+        subtitles,
+        translated,
+        resumed,
+        pending,
+        unique,
+        duplicates,
+        chunks,
+        prompts,
+        journal,
+        usage,
+        scope,
+    )
+
+
+def finish_job(
+    plan: JobPlan,
+    results: list[dict[int, str]],
+    memory: TranslationMemory | None,
+    target_dir: str,
+    from_language: str,
+    target_language: str,
+    save_usage: bool,
+):
+    """
+    汇总各分片的译文写入翻译记忆库，与已有译文合并后输出字幕文件，
+    save_usage 时写入用量文件。所有条目都有译文时删除任务日志，
+    否则在用量中记录缺少译文的条目并保留日志，再次运行时只重新翻译这些条目
+    """
+    new_translated = collect_translations(results)
+    # 从任务日志恢复的条目也写入翻译记忆库
+    new_translated.update(plan.resumed)
+    remember_translations(
+        memory,
+        [line for line in plan.subtitles if line.index in plan.resumed] + plan.unique,
+        new_translated,
+        from_language,
+        target_language,
+        plan.memory_scope,
+    )
+    plan.translated.update(expand_duplicates(new_translated, plan.duplicates))
+    plan.usage.untranslated = [
+        line.index for line in plan.subtitles if line.index not in plan.translated
+    ]
+
+    output_file = output_file_path(plan.subtitle_file, target_dir, target_language)
+    with tracing.span("merge"):
+        merge_subtitle_files(
+            plan.file_type,
+            apply_translations(plan.subtitles, plan.translated),
+            output_file,
+            plan.subtitle_file,
+        )
+    tracing.set_attributes(
+        translated=len(new_translated),
+        untranslated=len(plan.usage.untranslated),
+        **plan.usage.total.to_dict(),
+    )
+    if save_usage:
+        plan.usage.save(usage_file_path(output_file))
+    if plan.journal and not plan.usage.untranslated:
+        plan.journal.remove()
+
+
+def estimate_subtitle(
+    prompt: str,
+    subtitle_file: str,
+    from_language: str,
+    target_language: str,
+    api_key: str = "",
+    engine: str | TranslationEngine = GEMINI,
+    use_memory: bool = True,
+    memory_path: str | None = None,
+    fuzzy_threshold: float = DEFAULT_FUZZY_THRESHOLD,
+    chunk_strategy: ChunkStrategy = ChunkStrategy.TOKENS,
+    max_input_tokens: int = DEFAULT_MAX_INPUT_TOKENS,
+    max_output_tokens: int | None = None,
+    wire_format: WireFormat = WireFormat.TEXT,
+    deduplicate: bool = True,
+    skip_untranslatable_cues: bool = True,
+    resume: bool = True,
+    journal_dir: str | None = None,
+    context_cues: int = DEFAULT_CONTEXT_CUES,
+) -> TokenUsage:
+    """
+    不发送请求，按与 translate_subtitle 相同的方式划分分片并估算 token 用量，
+    无需翻译、可从任务日志恢复或翻译记忆库中已有的条目不计入
+    """
+    plan = plan_job(
+        resolve_engine(engine, api_key, None, None, False),
+        prompt,
+        os.path.expanduser(subtitle_file),
+        from_language,
+        target_language,
+        TranslationMemory(memory_path, fuzzy_threshold) if use_memory else None,
+        chunk_strategy,
+        max_input_tokens,
+        max_output_tokens,
+        wire_format,
+        deduplicate,
+        skip_untranslatable_cues,
+        resume,
+        journal_dir,
+        context_cues,
+    )
+    return plan.usage.estimate
+
+
+def translate_subtitle(
+    prompt: str,
+    subtitle_file: str,
+    target_dir: str,
+    from_language: str,
+    target_language: str,
+    api_key: str,
+    tmp_dir: str | None = None,
+    progress_callback: Callable[[int, int], None] | None = None,
+    concurrency: int = DEFAULT_CONCURRENCY,
+    cache_dir: str | None = None,
+    cache_size: int = DEFAULT_CACHE_SIZE,
+    use_memory: bool = True,
+    memory_path: str | None = None,
+    fuzzy_threshold: float = DEFAULT_FUZZY_THRESHOLD,
+    chunk_strategy: ChunkStrategy = ChunkStrategy.TOKENS,
+    max_input_tokens: int = DEFAULT_MAX_INPUT_TOKENS,
+    max_output_tokens: int | None = None,
+    use_file_api: bool = False,
+    scheduler: RequestScheduler | None = None,
+    cancel_event: threading.Event | None = None,
+    engine: str | TranslationEngine = GEMINI,
+    stream: bool = False,
+    cue_callback: Callable[[Any], None] | None = None,
+    wire_format: WireFormat = WireFormat.TEXT,
+    deduplicate: bool = True,
+    skip_untranslatable_cues: bool = True,
+    resume: bool = True,
+    journal_dir: str | None = None,
+    executor: ThreadPoolExecutor | None = None,
+    tracer: Tracer | None = None,
+    save_usage: bool = True,
+    context_cues: int = DEFAULT_CONTEXT_CUES,
+) -> JobUsage:
+    """
+    翻译字幕，engine 为引擎名称或引擎实例，concurrency 为同时翻译的分片数量，
+    翻译结果缓存在 cache_dir 中，总大小不超过 cache_size 字节，
+    use_memory 时先从 memory_path 的翻译记忆库中查找已有译文，只翻译未命中的条目，
+    只复用相同提示词与模型翻译的条目，
+    chunk_strategy 为分片策略，max_input_tokens/max_output_tokens 为每个分片的 token 预算，
+    max_output_tokens 默认按引擎的输出上限计算，
+    use_file_api 时 Gemini 引擎将分片写入 tmp_dir 并通过 File API 上传，
+    scheduler 负责请求限流与重试，多个任务共用时共享配额，
+    cancel_event 被设置后不再发起新的请求并抛出 TranslationCancelled，
+    progress_callback 按条目汇报进度，stream 时使用流式请求，边接收边解析，
+    cue_callback 接收每个已翻译的条目（包括翻译记忆库命中的条目），可用于实时预览，
+    wire_format 为发送给模型的格式，默认只发送序号与文本，时间轴在本地按序号填回，
+    deduplicate 时文件中文本相同的条目只翻译一次，
+    skip_untranslatable_cues 时只有标点、数字、音乐符号、说话人标签
+    或已经是目标语言的条目不发送给模型，原样输出，
+    resume 时每完成一个分片都写入 journal_dir 中的任务日志，
+    任务中断后再次运行同一任务会从日志恢复已完成的条目，任务完成后删除日志，
+    executor 为多个文件共用的分片线程池，传入时忽略 concurrency，
+    各文件的分片在同一个线程池中排队，保持总并发数量不变，
+    tracer 记录任务、分片与请求各阶段的耗时、token 数量与重试次数。
+    返回任务的 token 用量，包括发送请求前按分片计划估算的用量，
+    以及多次修复后仍缺少译文、输出时保留原文的条目（此时保留任务日志），
+    save_usage 时同时写入译文旁的 .usage.json 文件。
+    context_cues 为随每个分片发送的前后文条目数量，上下文只供参考，不会被翻译，
+    分片之间仍然可以并发翻译
+    """
+    subtitle_file = os.path.expanduser(subtitle_file)
+    target_dir = os.path.expanduser(target_dir)
+
+    engine = resolve_engine(engine, api_key, scheduler, tmp_dir, use_file_api)
+    cache = TranslationCache(cache_dir, cache_size)
+    memory = TranslationMemory(memory_path, fuzzy_threshold) if use_memory else None
+
+    with tracing.span(
+        "job",
+        tracer,
+        file=subtitle_file,
+        engine=engine.name,
+        wire_format=wire_format.value,
+        stream=stream,
+    ):
+        plan = plan_job(
+            engine,
+            prompt,
+            subtitle_file,
+            from_language,
+            target_language,
+            memory,
+            chunk_strategy,
+            max_input_tokens,
+            max_output_tokens,
+            wire_format,
+            deduplicate,
+            skip_untranslatable_cues,
+            resume,
+            journal_dir,
+            context_cues,
+        )
+        chunks, journal, usage = plan.chunks, plan.journal, plan.usage
+        if journal:
+            journal.start(chunks)
+        progress = plan.start_progress(progress_callback, cue_callback)
+
+        def run(index: int, chunk: list[Any]) -> dict[int, str]:
+            with tracing.span("chunk", index=index, cues=len(chunk)) as span:
+                translated = translate_chunk(
+                    engine,
+                    plan.prompts[index],
+                    chunk,
+                    cache,
+                    from_language,
+                    target_language,
+                    stream,
+                    lambda index, content: events.put((index, content)),
+                    wire_format,
+                )
+                span.set(translated=len(translated))
+            usage.record(index, TokenUsage.from_dict(span.attributes))
+            return translated
+
+        # 分片并发翻译，结果按原始顺序存放。工作线程把收到的条目与完成的分片
+        # 放入队列，由调用线程汇报，保证回调都在调用线程中执行且进度单调递增
+        results: list[dict[int, str]] = [{} for _ in chunks]
+        events: queue.SimpleQueue[Future | tuple[int, str]] = queue.SimpleQueue()
+        own_executor = executor is None
+        if executor is None:
+            executor = ThreadPoolExecutor(
+                max_workers=max(1, min(concurrency, engine.max_concurrency))
+            )
+        futures: dict[Future, int] = {}
+        try:
+            futures = {
+                # 复制上下文，使分片的 span 归属于当前任务
+                executor.submit(
+                    contextvars.copy_context().run, run, index, chunk
+                ): index
+                for index, chunk in enumerate(chunks)
+            }
+            for future in futures:
+                future.add_done_callback(events.put)
+            running = len(futures)
+            while running:
+                if cancel_event is not None and cancel_event.is_set():
+                    raise TranslationCancelled()
+                try:
+                    event = events.get(timeout=CANCEL_POLL_INTERVAL)
+                except queue.Empty:
+                    continue
+                if isinstance(event, Future):
+                    index = futures[event]
+                    results[index] = event.result()
+                    if journal:
+                        journal.record(
+                            index,
+                            expand_duplicates(results[index], plan.duplicates),
+                            usage.chunks.get(index),
+                        )
+                    progress.add_chunk(chunks[index])
+                    running -= 1
+                else:
+                    progress.add_cue(*event)
+        finally:
+            # 不等待进行中的请求，其结果完成后仍会写入缓存
+            if own_executor:
+                executor.shutdown(wait=False, cancel_futures=True)
+            else:
+                for future in futures:
+                    future.cancel()
+            if journal:
+                journal.close()
+        finish_job(
+            plan,
+            results,
+            memory,
+            target_dir,
+            from_language,
+            target_language,
+            save_usage,
+        )
+        return usage
+
+
+async def translate_subtitle_async(
+    prompt: str,
+    subtitle_file: str,
+    target_dir: str,
+    from_language: str,
+    target_language: str,
+    api_key: str,
+    tmp_dir: str | None = None,
+    progress_callback: Callable[[int, int], None] | None = None,
+    concurrency: int = DEFAULT_CONCURRENCY,
+    semaphore: asyncio.Semaphore | None = None,
+    cache_dir: str | None = None,
+    cache_size: int = DEFAULT_CACHE_SIZE,
+    use_memory: bool = True,
+    memory_path: str | None = None,
+    fuzzy_threshold: float = DEFAULT_FUZZY_THRESHOLD,
+    chunk_strategy: ChunkStrategy = ChunkStrategy.TOKENS,
+    max_input_tokens: int = DEFAULT_MAX_INPUT_TOKENS,
+    max_output_tokens: int | None = None,
+    use_file_api: bool = False,
+    scheduler: RequestScheduler | None = None,
+    engine: str | TranslationEngine = GEMINI,
+    stream: bool = False,
+    cue_callback: Callable[[Any], None] | None = None,
+    wire_format: WireFormat = WireFormat.TEXT,
+    deduplicate: bool = True,
+    skip_untranslatable_cues: bool = True,
+    resume: bool = True,
+    journal_dir: str | None = None,
+    tracer: Tracer | None = None,
+    save_usage: bool = True,
+    context_cues: int = DEFAULT_CONTEXT_CUES,
+) -> JobUsage:
+    """
+    异步翻译字幕，多个文件可共用同一个 semaphore 限制总请求数量，
+    未传入时按 concurrency 创建
+    """
+    subtitle_file = os.path.expanduser(subtitle_file)
+    target_dir = os.path.expanduser(target_dir)
+
+    engine = resolve_engine(engine, api_key, scheduler, tmp_dir, use_file_api)
+    if semaphore is None:
+        semaphore = asyncio.Semaphore(
+            max(1, min(concurrency, engine.max_concurrency))
+        )
+    cache = TranslationCache(cache_dir, cache_size)
+    memory = TranslationMemory(memory_path, fuzzy_threshold) if use_memory else None
+
+    with tracing.span(
+        "job",
+        tracer,
+        file=subtitle_file,
+        engine=engine.name,
+        wire_format=wire_format.value,
+        stream=stream,
+    ):
+        # 读取文件、任务日志与翻译记忆库都是阻塞操作，放到线程中执行
+        plan = await asyncio.to_thread(
+            plan_job,
+            engine,
+            prompt,
+            subtitle_file,
+            from_language,
+            target_language,
+            memory,
+            chunk_strategy,
+            max_input_tokens,
+            max_output_tokens,
+            wire_format,
+            deduplicate,
+            skip_untranslatable_cues,
+            resume,
+            journal_dir,
+            context_cues,
+        )
+        chunks, journal, usage = plan.chunks, plan.journal, plan.usage
+        if journal:
+            await asyncio.to_thread(journal.start, chunks)
+        progress = plan.start_progress(progress_callback, cue_callback)
+
+        async def run(index: int, chunk: list[Any]) -> dict[int, str]:
+            with tracing.span("chunk", index=index, cues=len(chunk)) as span:
+                translated = await translate_chunk_async(
+                    engine,
+                    plan.prompts[index],
+                    chunk,
+                    cache,
+                    from_language,
+                    target_language,
+                    semaphore,
+                    stream,
+                    progress.add_cue,
+                    wire_format,
+                )
+                span.set(translated=len(translated))
+            usage.record(index, TokenUsage.from_dict(span.attributes))
+            if journal:
+                await asyncio.to_thread(
+                    journal.record,
+                    index,
+                    expand_duplicates(translated, plan.duplicates),
+                    usage.chunks.get(index),
+                )
+            progress.add_chunk(chunk)
+            return translated
+
+        # 任一分片出错时 TaskGroup 取消其余分片，不再继续发送请求
+        try:
+            async with asyncio.TaskGroup() as group:
+                tasks = [
+                    group.create_task(run(index, chunk))
+                    for index, chunk in enumerate(chunks)
+                ]
+        except ExceptionGroup as e:
+            # 与同步流程一样抛出分片的原始错误
+            raise e.exceptions[0]
+        finally:
+            if journal:
+                journal.close()
+        results = [task.result() for task in tasks]
+        await asyncio.to_thread(
+            finish_job,
+            plan,
+            results,
+            memory,
+            target_dir,
+            from_language,
+            target_language,
+            save_usage,
+        )
+        return usage
@@ -0,0 +1,120 @@
+import dataclasses
+import json
+import os
+import pathlib
+import threading
+from typing import Any
+
+
+@dataclasses.dataclass
+class TokenUsage:
+    """
+    一次或多次请求消耗的 token 数量，
+    estimated_requests 为引擎没有返回用量、按文本估算的请求数量
+    """
+
+    input_tokens: int = 0
+    output_tokens: int = 0
+    requests: int = 0
+    estimated_requests: int = 0
+
+    def add(self, other: "TokenUsage"):
+        for field in dataclasses.fields(self):
+            setattr(
+                self, field.name, getattr(self, field.name) + getattr(other, field.name)
+            )
+
+    def cost(self, input_price: float, output_price: float) -> float:
+        """
+        按每百万 token 的价格计算费用
+        """
+        return (
+            self.input_tokens * input_price + self.output_tokens * output_price
+        ) / 1_000_000
+
+    def to_dict(self) -> dict[str, int]:
+        return dataclasses.asdict(self)
+
+    @classmethod
+    def from_dict(cls, data: dict[str, Any]) -> "TokenUsage":
+        return cls(
+            **{
+                field.name: int(data.get(field.name, 0))
+                for field in dataclasses.fields(cls)
+            }
+        )
+
+
+class JobUsage:
+    """
+    一个翻译任务的 token 用量：翻译前按分片计划估算的用量、
+    各分片实际的用量以及从任务日志恢复的分片在之前运行中的用量。
+    untranslated 为多次修复后仍没有译文、输出时保留原文的条目序号
+    """
+
+    def __init__(self, subtitle_file: str, model_name: str, estimate: TokenUsage):
+        self.subtitle_file = subtitle_file
+        self.model_name = model_name
+        self.estimate = estimate
+        self.resumed = TokenUsage()
+        self.chunks: dict[int, TokenUsage] = {}
+        self.untranslated: list[int] = []
+        self._lock = threading.Lock()
+
+    def record(self, index: int, usage: TokenUsage):
+        """
+        记录一个分片的用量
+        """
+        with self._lock:
+            self.chunks[index] = usage
+
+    @property
+    def total(self) -> TokenUsage:
+        total = TokenUsage()
+        total.add(self.resumed)
+        with self._lock:
+            for usage in self.chunks.values():
+                total.add(usage)
+        return total
+
+    def to_dict(self) -> dict[str, Any]:
+        with self._lock:
+            chunks = [
+                {"chunk": index, **usage.to_dict()}
+                for index, usage in sorted(self.chunks.items())
+            ]
+        return {
+            "file": self.subtitle_file,
+            "model": self.model_name,
+            "estimate": self.estimate.to_dict(),
+            "total": self.total.to_dict(),
+            "resumed": self.resumed.to_dict(),
+            "chunks": chunks,
+            "untranslated": self.untranslated,
+        }
+
+    def save(self, path: str | pathlib.Path):
+        """
+        写入 JSON 文件
+        """
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(self.to_dict(), f, ensure_ascii=False, indent=2)
+        os.replace(tmp_path, path)
+
+
+def format_indexes(indexes: list[int], limit: int = 10) -> str:
+    """
+    条目序号列表的简短描述，超过 limit 个时只列出前面的序号
+    """
+    text = ", ".join(str(index) for index in indexes[:limit])
+    if len(indexes) > limit:
+        text += f" 等 {len(indexes)} 条"
+    return text
+
+
+def usage_file_path(output_file: str | pathlib.Path) -> pathlib.Path:
+    """
+    用量文件与译文放在一起，例如 episode_中文.srt 对应 episode_中文.usage.json
+    """
+    return pathlib.Path(output_file).with_suffix(".usage.json")
@@ -1,5 +1,11 @@
+import dataclasses
+import datetime
 import enum
+import glob
+import math
 import os
+import re
+import unicodedata
 import pathlib
 from typing import Any
 
@@ -11,62 +17,427 @@ class FileType(enum.Enum):
     ASS = "ass"
 
 
+class ChunkStrategy(enum.Enum):
+    # 每个分片固定条目数量
+    FIXED = "fixed"
+    # 按估算的输入/输出 token 数量装填分片
+    TOKENS = "tokens"
+
+
+class WireFormat(enum.Enum):
+    # 发送完整的 srt 内容，模型需要原样输出序号与时间轴
+    SRT = "srt"
+    # 每行一条「序号: 内容」，不含时间轴，翻译后在本地按序号填回时间轴
+    TEXT = "text"
+
+
+# 固定分片策略下每个分片的条目数量
+DEFAULT_CHUNK_SIZE = 100
+
+# 每个分片的输入 token 预算
+DEFAULT_MAX_INPUT_TOKENS = 16384
+
+# 每个分片的输出 token 预算，为模型 8192 的输出上限留出余量
+DEFAULT_MAX_OUTPUT_TOKENS = 6144
+
+# 每条字幕序号与时间轴行的 token 开销
+CUE_OVERHEAD_TOKENS = 20
+
+# 紧凑文本格式下每条字幕序号的 token 开销
+TEXT_CUE_OVERHEAD_TOKENS = 3
+
+# 紧凑文本格式中表示换行的标记
+TEXT_LINE_BREAK = "<br>"
+
+TEXT_LINE_BREAK_PATTERN = re.compile(r"\s*<br\s*/?>\s*", re.IGNORECASE)
+
+# ASS 文本中的特效标签，例如 {\an8}、{\i1}
+ASS_OVERRIDE_TAG = re.compile(r"\{[^{}]*\}")
+
+# 行首与行尾连续的特效标签不发送给模型
+ASS_LEADING_TAGS = re.compile(r"^(?:\{[^{}]*\})+")
+ASS_TRAILING_TAGS = re.compile(r"(?:\{[^{}]*\})+$")
+
+# 行内特效标签替换成的占位符，例如 {1}
+ASS_PLACEHOLDER = re.compile(r"\{(\d+)\}")
+
+# 绘图模式的标签，绘图内容无需翻译
+ASS_DRAWING_TAG = re.compile(r"\\p[1-9]")
+
+# ASS 文本中的强制换行，发送给模型时替换为换行
+ASS_LINE_BREAK = re.compile(r"\\N")
+
+# 行内需要原样保留的内容：特效标签、软换行 \n 与硬空格 \h，
+# 替换为占位符，以免还原时软换行变成强制换行
+ASS_INLINE_CODE = re.compile(r"\{[^{}]*\}|\\[nh]")
+
+# ass/ssa 文件中的段落标题，例如 [Events]
+ASS_SECTION = re.compile(r"^\s*\[(.+)\]\s*$")
+
+# ass/ssa 的时间格式 h:mm:ss.cc
+ASS_TIME = re.compile(r"^\s*(\d+):(\d+):(\d+(?:\.\d*)?)\s*$")
+
+# Events 段没有 Format 行时使用的默认字段顺序，ass 与 ssa 的 Text 都是最后一个字段
+ASS_EVENT_FORMAT = [
+    "layer",
+    "start",
+    "end",
+    "style",
+    "name",
+    "marginl",
+    "marginr",
+    "marginv",
+    "effect",
+    "text",
+]
+
+# 译文相对原文的 token 膨胀系数
+OUTPUT_TOKEN_RATIO = 1.5
+
+# 支持的字幕文件扩展名
+SUBTITLE_EXTENSIONS = (".srt", ".ass", ".ssa")
+
+
 def get_file_type(file_path: str) -> FileType:
     """
     根据文件扩展名判断文件类型
     """
     if file_path.endswith(".srt"):
         return FileType.SRT
-    elif file_path.endswith(".ass"):
+    elif file_path.endswith((".ass", ".ssa")):
         return FileType.ASS
     else:
         raise ValueError(f"Unsupported file type: {file_path}")
 
 
-def split_subtitle_file(
-    file_type: FileType, subtitle_file: str, tmp_dir: str
-) -> list[str]:
+def collect_files(inputs: list[str]) -> list[tuple[str, str | None]]:
     """
-    将字幕文件分割为单个文件
+    展开输入的文件、通配符与目录，返回 (字幕文件, 所属输入目录)
+    """
+    files: list[tuple[str, str | None]] = []
+    for item in inputs:
+        item = os.path.expanduser(item)
+        if os.path.isdir(item):
+            for path in sorted(pathlib.Path(item).rglob("*")):
+                if path.is_file() and path.suffix.lower() in SUBTITLE_EXTENSIONS:
+                    files.append((str(path), item))
+        elif glob.has_magic(item):
+            for path in sorted(glob.glob(item, recursive=True)):
+                if os.path.isfile(path) and path.lower().endswith(SUBTITLE_EXTENSIONS):
+                    files.append((path, None))
+        else:
+            files.append((item, None))
+
+    # 去重，保持顺序
+    seen = set()
+    result = []
+    for path, base in files:
+        key = os.path.abspath(path)
+        if key not in seen:
+            seen.add(key)
+            result.append((path, base))
+    return result
+
+
+def target_dir_for(
+    subtitle_file: str, base_dir: str | None, output_dir: str | None, layout: str
+) -> str:
+    """
+    根据输出布局计算字幕文件的输出目录
+    """
+    source_dir = os.path.dirname(os.path.abspath(subtitle_file))
+    if layout == "beside" or output_dir is None:
+        return source_dir
+    if layout == "mirror" and base_dir is not None:
+        relative = os.path.relpath(source_dir, os.path.abspath(base_dir))
+        return os.path.normpath(os.path.join(output_dir, relative))
+    return output_dir
+
+
+def load_subtitle_file(file_type: FileType, subtitle_file: str) -> list[Any]:
+    """
+    读取字幕文件中的所有字幕条目
     """
     if file_type == FileType.SRT:
-        return split_srt_file(subtitle_file, tmp_dir)
+        return load_srt_file(subtitle_file)
     else:
-        raise NotImplementedError("ASS 文件分割未实现")
+        return load_ass_file(subtitle_file)
 
 
-def split_srt_file(subtitle_file: str, tmp_dir: str) -> list[str]:
+def load_srt_file(subtitle_file: str) -> list[Any]:
     """
-    将 srt 文件分割为单个文件
+    读取 srt 文件，并按出现顺序重新编号，保证序号唯一
     """
-    # 加载 srt 文件
     with open(os.path.expanduser(subtitle_file), "r", encoding="utf-8") as f:
         data = f.read()
     srt_file = srt.parse(data)
     srt_data = [line for line in srt_file]
-    filename = os.path.splitext(os.path.basename(subtitle_file))[0]
-    files = []
-    for i in range(0, len(srt_data), 100):
-        fn = os.path.join(tmp_dir, f"{filename}_{i+1:08d}.srt")
-        data = srt.compose(srt_data[i : i + 100])
-        with open(fn, "w", encoding="utf-8") as f:
-            f.write(data)
-        files.append(fn)
-    return files
+    for index, line in enumerate(srt_data, 1):
+        line.index = index
+    return srt_data
+
+
+@dataclasses.dataclass
+class AssDialogue:
+    """
+    ass/ssa 文件中的一行对话，line 为在文件中的行号（从 0 开始），
+    head 为 Text 字段之前的内容，ending 为行尾的换行符，二者在输出时原样保留
+    """
+
+    line: int
+    head: str
+    text: str
+    ending: str
+    start: datetime.timedelta
+    end: datetime.timedelta
+
+
+def parse_ass_time(value: str) -> datetime.timedelta:
+    """
+    解析 h:mm:ss.cc 格式的时间
+    """
+    match = ASS_TIME.match(value)
+    if match is None:
+        raise ValueError(f"Invalid ASS time: {value!r}")
+    hours, minutes, seconds = match.groups()
+    return datetime.timedelta(
+        hours=int(hours), minutes=int(minutes), seconds=float(seconds)
+    )
+
+
+def read_ass_lines(subtitle_file: str) -> list[str]:
+    """
+    按行读取 ass/ssa 文件，保留 BOM 与换行符，以便原样写回未翻译的行
+    """
+    with open(
+        os.path.expanduser(subtitle_file), "r", encoding="utf-8", newline=""
+    ) as f:
+        return f.read().splitlines(keepends=True)
+
+
+def parse_ass_dialogues(lines: list[str]) -> list[AssDialogue]:
+    """
+    找出 Events 段中的所有对话行，按 Format 行的字段顺序拆分，
+    只解析时间与 Text 字段，其他内容（样式、字体、图片、注释）不做处理
+    """
+    dialogues = []
+    section = ""
+    fields = ASS_EVENT_FORMAT
+    for number, raw in enumerate(lines):
+        line = raw.rstrip("\r\n")
+        ending = raw[len(line) :]
+        heading = ASS_SECTION.match(line.lstrip("\ufeff"))
+        if heading:
+            section = heading.group(1).strip().lower()
+            continue
+        if section != "events":
+            continue
+        name, colon, value = line.partition(":")
+        name = name.strip().lower()
+        if not colon:
+            continue
+        if name == "format":
+            fields = [field.strip().lower() for field in value.split(",")]
+        elif name == "dialogue" and fields[-1] == "text":
+            values = value.split(",", len(fields) - 1)
+            if len(values) < len(fields):
+                continue
+            row = dict(zip(fields, values))
+            text = values[-1]
+            dialogues.append(
+                AssDialogue(
+                    line=number,
+                    head=line[: len(line) - len(text)],
+                    text=text,
+                    ending=ending,
+                    start=parse_ass_time(row["start"]),
+                    end=parse_ass_time(row["end"]),
+                )
+            )
+    return dialogues
+
+
+def translatable_dialogues(dialogues: list[AssDialogue]) -> list[AssDialogue]:
+    """
+    需要翻译的对话，按文件中的顺序排列。绘图以及去掉特效标签后没有文字的对话不翻译
+    """
+    result = []
+    for dialogue in dialogues:
+        tags = ASS_OVERRIDE_TAG.findall(dialogue.text)
+        if any(ASS_DRAWING_TAG.search(tag) for tag in tags):
+            continue
+        if not ASS_OVERRIDE_TAG.sub("", dialogue.text).strip():
+            continue
+        result.append(dialogue)
+    return result
+
+
+def extract_ass_text(text: str) -> tuple[str, str, str, list[str]]:
+    """
+    提取 ass 对话中需要翻译的文字，返回 (文字, 行首标签, 行尾标签, 行内标签)。
+    行内标签、\\n 与 \\h 替换为 {1}、{2} 等占位符，\\N 替换为换行
+    """
+    prefix = ASS_LEADING_TAGS.match(text)
+    prefix_tags = prefix.group(0) if prefix else ""
+    text = text[len(prefix_tags) :]
+    suffix = ASS_TRAILING_TAGS.search(text)
+    suffix_tags = suffix.group(0) if suffix else ""
+    text = text[: len(text) - len(suffix_tags)]
+
+    tags: list[str] = []
+
+    def placeholder(match: re.Match) -> str:
+        tags.append(match.group(0))
+        return f"{{{len(tags)}}}"
+
+    text = ASS_INLINE_CODE.sub(placeholder, text)
+    text = ASS_LINE_BREAK.sub("\n", text)
+    return text, prefix_tags, suffix_tags, tags
+
+
+def restore_ass_text(content: str, source: str) -> str:
+    """
+    将译文还原为 ass 对话文本，按原文恢复行首、行尾与行内的特效标签，
+    模型编造的占位符会被去掉
+    """
+    _, prefix_tags, suffix_tags, tags = extract_ass_text(source)
+
+    def restore(match: re.Match) -> str:
+        index = int(match.group(1)) - 1
+        return tags[index] if 0 <= index < len(tags) else ""
+
+    content = ASS_PLACEHOLDER.sub(restore, content.strip())
+    content = content.replace("\r\n", "\n").replace("\n", "\\N")
+    return prefix_tags + content + suffix_tags
+
+
+def load_ass_file(subtitle_file: str) -> list[Any]:
+    """
+    读取 ass 文件中需要翻译的对话，转换为按出现顺序编号的字幕条目，
+    以便与 srt 使用相同的翻译流程
+    """
+    dialogues = parse_ass_dialogues(read_ass_lines(subtitle_file))
+    subtitles = []
+    for index, dialogue in enumerate(translatable_dialogues(dialogues), 1):
+        content, _, _, _ = extract_ass_text(dialogue.text)
+        subtitles.append(
+            srt.Subtitle(
+                index=index, start=dialogue.start, end=dialogue.end, content=content
+            )
+        )
+    return subtitles
+
+
+def estimate_tokens(text: str) -> int:
+    """
+    粗略估算文本的 token 数量：CJK 字符约每字一个 token，其余约每 4 个字符一个 token
+    """
+    wide = 0
+    for char in text:
+        if unicodedata.east_asian_width(char) in ("W", "F"):
+            wide += 1
+    return wide + math.ceil((len(text) - wide) / 4)
+
+
+def estimate_cue_tokens(
+    line: Any, overhead: int = CUE_OVERHEAD_TOKENS
+) -> tuple[int, int]:
+    """
+    估算单条字幕的输入与输出 token 数量，overhead 为每条字幕格式本身的开销
+    """
+    tokens = estimate_tokens(line.content)
+    return (
+        overhead + tokens,
+        overhead + math.ceil(tokens * OUTPUT_TOKEN_RATIO),
+    )
+
+
+def chunk_subtitles(
+    subtitles: list[Any],
+    strategy: ChunkStrategy = ChunkStrategy.TOKENS,
+    chunk_size: int = DEFAULT_CHUNK_SIZE,
+    max_input_tokens: int = DEFAULT_MAX_INPUT_TOKENS,
+    max_output_tokens: int = DEFAULT_MAX_OUTPUT_TOKENS,
+    cue_overhead: int = CUE_OVERHEAD_TOKENS,
+) -> list[list[Any]]:
+    """
+    将字幕条目划分为分片，TOKENS 策略下在不超过 token 预算的前提下尽量装满每个分片，
+    cue_overhead 为每条字幕格式本身的 token 开销
+    """
+    if strategy == ChunkStrategy.FIXED:
+        return [
+            subtitles[i : i + chunk_size] for i in range(0, len(subtitles), chunk_size)
+        ]
+
+    chunks: list[list[Any]] = []
+    chunk: list[Any] = []
+    input_tokens = output_tokens = 0
+    for line in subtitles:
+        cue_input, cue_output = estimate_cue_tokens(line, cue_overhead)
+        # 超出预算时开启新分片，单条超出预算的字幕独占一个分片
+        if chunk and (
+            input_tokens + cue_input > max_input_tokens
+            or output_tokens + cue_output > max_output_tokens
+        ):
+            chunks.append(chunk)
+            chunk = []
+            input_tokens = output_tokens = 0
+        chunk.append(line)
+        input_tokens += cue_input
+        output_tokens += cue_output
+    if chunk:
+        chunks.append(chunk)
+    return chunks
+
+
+def compose_subtitle_chunk(chunk: list[Any]) -> str:
+    """
+    将分片转换为发送给模型的文本，ass 文件提取出的对话与 srt 条目相同，按 srt 格式发送
+    """
+    return compose_srt_chunk(chunk)
+
+
+def compose_srt_chunk(chunk: list[Any]) -> str:
+    """
+    将 srt 分片转换为文本，保留原始序号以便与翻译结果对应
+    """
+    return srt.compose(chunk, reindex=False)
+
+
+def compose_text_chunk(chunk: list[Any]) -> str:
+    """
+    将分片转换为紧凑文本：每行一条「序号: 内容」，内容中的换行替换为 <br>
+    """
+    lines = []
+    for line in chunk:
+        content = line.content.strip().replace("\n", TEXT_LINE_BREAK)
+        lines.append(f"{line.index}: {content}\n")
+    return "".join(lines)
+
+
+def decode_text_cue(content: str) -> str:
+    """
+    将紧凑文本中的 <br> 还原为换行
+    """
+    return TEXT_LINE_BREAK_PATTERN.sub("\n", content).strip()
 
 
 def merge_subtitle_files(
     file_type: FileType,
     subtitle_files: list[Any],
     target_file: pathlib.Path,
+    source_file: str | None = None,
 ):
     """
-    将翻译后的字幕文件合并为一个文件，subtitle_files 为翻译后的元素
+    将翻译后的字幕文件合并为一个文件，subtitle_files 为翻译后的元素，
+    ass 文件需要通过 source_file 提供原文件以保留样式与特效标签
     """
     if file_type == FileType.SRT:
         return merge_srt_files(subtitle_files, target_file)
     else:
-        raise NotImplementedError("ASS 文件合并未实现")
+        if source_file is None:
+            raise ValueError("Merging ASS subtitles requires the source file")
+        return merge_ass_files(subtitle_files, target_file, source_file)
 
 
 def merge_srt_files(subtitle_files: list[Any], target_file: pathlib.Path):
@@ -75,3 +446,21 @@ def merge_srt_files(subtitle_files: list[Any], target_file: pathlib.Path):
     """
     with target_file.open("w", encoding="utf-8") as f:
         f.write(srt.compose(subtitle_files))
+
+
+def merge_ass_files(
+    subtitle_files: list[Any], target_file: pathlib.Path, source_file: str
+):
+    """
+    将译文按序号填回原 ass/ssa 文件的对话中，只改写对话行的 Text 字段，
+    其他行（文件头、样式、注释、内嵌字体与图片）逐字节保留
+    """
+    lines = read_ass_lines(source_file)
+    dialogues = parse_ass_dialogues(lines)
+    translated = {line.index: line.content for line in subtitle_files}
+    for index, dialogue in enumerate(translatable_dialogues(dialogues), 1):
+        if index in translated:
+            text = restore_ass_text(translated[index], dialogue.text)
+            lines[dialogue.line] = dialogue.head + text + dialogue.ending
+    with target_file.open("w", encoding="utf-8", newline="") as f:
+        f.write("".join(lines))
@@ -0,0 +1,126 @@
+import datetime
+import unittest
+
+import srt
+
+from src.subtiltes_translator.align import (
+    MAX_STREAM_ERRORS,
+    CueStreamParser,
+    TextStreamParser,
+)
+
+
+def seconds(value: float) -> datetime.timedelta:
+    return datetime.timedelta(seconds=value)
+
+
+def chunk(*indexes: int) -> list[srt.Subtitle]:
+    return [
+        srt.Subtitle(index, seconds(index * 10), seconds(index * 10 + 2), "cue")
+        for index in indexes
+    ]
+
+
+def srt_block(index: int, start: float, content: str) -> str:
+    return srt.Subtitle(index, seconds(start), seconds(start + 2), content).to_srt()
+
+
+class CueStreamParserTest(unittest.TestCase):
+    def test_matches_by_index(self):
+        parser = CueStreamParser(chunk(1, 2))
+        parser.feed(srt_block(1, 10, "一") + srt_block(2, 20, "二"))
+        self.assertEqual(parser.finish(), {1: "一", 2: "二"})
+        self.assertEqual(parser.errors, 0)
+
+    def test_wrong_index_falls_back_to_start_time(self):
+        parser = CueStreamParser(chunk(1, 2))
+        # 模型把序号从 5 开始重新编号，时间轴仍然正确
+        parser.feed(srt_block(5, 10, "一") + srt_block(6, 20, "二"))
+        self.assertEqual(parser.finish(), {1: "一", 2: "二"})
+
+    def test_index_with_mismatched_time_uses_start_time(self):
+        parser = CueStreamParser(chunk(1, 2))
+        parser.feed(srt_block(1, 20, "二"))
+        self.assertEqual(parser.finish(), {2: "二"})
+
+    def test_unmatched_cue_is_an_error(self):
+        parser = CueStreamParser(chunk(1, 2))
+        parser.feed(srt_block(9, 500, "九"))
+        self.assertEqual(parser.finish(), {})
+        self.assertEqual(parser.errors, 1)
+
+    def test_duplicate_cue_is_dropped(self):
+        parser = CueStreamParser(chunk(1, 2))
+        parser.feed(srt_block(1, 10, "一") + srt_block(1, 10, "又一"))
+        self.assertEqual(parser.finish(), {1: "一"})
+        self.assertEqual(parser.errors, 1)
+
+    def test_keeps_only_fenced_content(self):
+        parser = CueStreamParser(chunk(1, 2))
+        parser.feed(
+            "好的，以下是译文：\n\n```srt\n"
+            + srt_block(1, 10, "一")
+            + srt_block(2, 20, "二")
+            + "```\n\n"
+            + srt_block(1, 10, "说明")
+        )
+        self.assertEqual(parser.finish(), {1: "一", 2: "二"})
+
+    def test_incomplete_last_cue_waits_for_finish(self):
+        cues = []
+        parser = CueStreamParser(chunk(1, 2), lambda index, text: cues.append(index))
+        text = srt_block(1, 10, "一") + srt_block(2, 20, "二").rstrip()
+        parser.feed(text[:-1])
+        parser.feed(text)
+        self.assertEqual(cues, [1])
+        self.assertEqual(parser.finish(), {1: "一", 2: "二"})
+        self.assertEqual(cues, [1, 2])
+
+    def test_restarts_when_output_is_not_a_continuation(self):
+        parser = CueStreamParser(chunk(1, 2))
+        parser.feed(srt_block(1, 10, "旧"))
+        parser.feed(srt_block(1, 10, "新"))
+        self.assertEqual(parser.finish(), {1: "新"})
+
+    def test_aborts_after_too_many_errors(self):
+        parser = CueStreamParser(chunk(1))
+        text = "".join(
+            srt_block(100 + i, 1000 + i * 10, "?") for i in range(MAX_STREAM_ERRORS + 1)
+        )
+        self.assertFalse(parser.feed(text + "\n"))
+        self.assertTrue(parser.aborted)
+
+
+class TextStreamParserTest(unittest.TestCase):
+    def test_parses_lines_and_line_breaks(self):
+        parser = TextStreamParser(chunk(1, 2))
+        parser.feed("1: 第一行<br>第二行\n[2]：二\n")
+        self.assertEqual(parser.finish(), {1: "第一行\n第二行", 2: "二"})
+
+    def test_unknown_index_and_garbage_are_errors(self):
+        parser = TextStreamParser(chunk(1, 2))
+        parser.feed("以下是译文\n7: 七\n1: 一\n")
+        self.assertEqual(parser.finish(), {1: "一"})
+        self.assertEqual(parser.errors, 2)
+
+    def test_duplicate_index_is_dropped(self):
+        parser = TextStreamParser(chunk(1, 2))
+        parser.feed("1: 一\n1: 又一\n2: 二")
+        self.assertEqual(parser.finish(), {1: "一", 2: "二"})
+        self.assertEqual(parser.errors, 1)
+
+    def test_keeps_only_fenced_content(self):
+        parser = TextStreamParser(chunk(1, 2))
+        parser.feed("```text\n1: 一\n2: 二\n```\n3: 说明\n")
+        self.assertEqual(parser.finish(), {1: "一", 2: "二"})
+        self.assertEqual(parser.errors, 0)
+
+    def test_aborts_after_too_many_errors(self):
+        parser = TextStreamParser(chunk(1))
+        garbage = "".join(f"line {i}\n" for i in range(MAX_STREAM_ERRORS + 1))
+        self.assertFalse(parser.feed(garbage))
+        self.assertTrue(parser.aborted)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,105 @@
+import asyncio
+import unittest
+
+from src.subtiltes_translator.balancer import LoadBalancer
+from src.subtiltes_translator.engine import TranslationEngine
+from src.subtiltes_translator.scheduler import RequestScheduler
+
+
+class ApiError(Exception):
+    def __init__(self, code: int):
+        super().__init__(f"HTTP {code}")
+        self.code = code
+
+
+class FakeEngine(TranslationEngine):
+    name = "fake"
+
+    def __init__(self, errors: list[Exception] | None = None):
+        super().__init__("model", RequestScheduler(max_retries=5, base_delay=0.0))
+        self.errors = list(errors or [])
+        self.calls = 0
+
+    def request(self, prompt: str, text: str) -> str:
+        self.calls += 1
+        if self.errors:
+            raise self.errors.pop(0)
+        return f"{self.model_name}:{text}"
+
+
+def balancer(*engines: FakeEngine) -> LoadBalancer:
+    balancer = LoadBalancer(list(engines))
+    balancer.scheduler.base_delay = 0.0
+    return balancer
+
+
+class LoadBalancerTest(unittest.TestCase):
+    def test_throttled_endpoint_fails_over_on_first_retry(self):
+        throttled = FakeEngine([ApiError(429)] * 10)
+        healthy = FakeEngine()
+        self.assertEqual(balancer(throttled, healthy).generate("p", "t"), "model:t")
+        self.assertEqual(throttled.calls, 1)
+        self.assertEqual(healthy.calls, 1)
+
+    def test_throttled_endpoint_cools_down(self):
+        throttled = FakeEngine([ApiError(429)] * 10)
+        healthy = FakeEngine()
+        lb = balancer(throttled, healthy)
+        for _ in range(3):
+            lb.generate("p", "t")
+        self.assertEqual(throttled.calls, 1)
+        self.assertEqual(healthy.calls, 3)
+
+    def test_backs_off_only_after_every_endpoint_failed(self):
+        first = FakeEngine([ApiError(503)])
+        second = FakeEngine([ApiError(503)])
+        lb = balancer(first, second)
+        self.assertEqual(lb.generate("p", "t"), "model:t")
+        self.assertEqual(first.calls + second.calls, 3)
+
+    def test_gives_up_after_max_retries(self):
+        first = FakeEngine([ApiError(503)] * 10)
+        second = FakeEngine([ApiError(503)] * 10)
+        lb = balancer(first, second)
+        lb.scheduler.max_retries = 2
+        with self.assertRaises(ApiError):
+            lb.generate("p", "t")
+        self.assertEqual(first.calls + second.calls, 6)
+
+    def test_request_errors_are_not_retried_elsewhere(self):
+        rejected = FakeEngine([ApiError(400)])
+        healthy = FakeEngine()
+        with self.assertRaises(ApiError):
+            balancer(rejected, healthy).generate("p", "t")
+        self.assertEqual(healthy.calls, 0)
+
+    def test_connection_errors_fail_over(self):
+        broken = FakeEngine([ConnectionResetError()])
+        healthy = FakeEngine()
+        self.assertEqual(balancer(broken, healthy).generate("p", "t"), "model:t")
+        self.assertEqual(broken.calls, 1)
+
+    def test_async_fails_over_on_first_retry(self):
+        throttled = FakeEngine([ApiError(429)] * 10)
+        healthy = FakeEngine()
+        lb = balancer(throttled, healthy)
+        self.assertEqual(asyncio.run(lb.generate_async("p", "t")), "model:t")
+        self.assertEqual(throttled.calls, 1)
+        self.assertEqual(healthy.calls, 1)
+
+    def test_stream_fails_over_on_first_retry(self):
+        throttled = FakeEngine([ApiError(429)] * 10)
+        healthy = FakeEngine()
+        lb = balancer(throttled, healthy)
+        self.assertEqual(lb.generate_stream("p", "t", lambda text: True), "model:t")
+        self.assertEqual(throttled.calls, 1)
+
+    def test_cache_identity_ignores_key_count(self):
+        self.assertEqual(
+            balancer(FakeEngine(), FakeEngine()).cache_identity()[0],
+            FakeEngine().cache_identity()[0],
+        )
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,63 @@
+import os
+import tempfile
+import time
+import unittest
+
+from src.subtiltes_translator.cache import TranslationCache
+
+
+class TranslationCacheTest(unittest.TestCase):
+    def setUp(self):
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        self.dir = tmp.name
+
+    def key(self, text: str, prompt: str = "prompt", model: str = "model") -> str:
+        return TranslationCache.make_key(text, prompt, model, {}, "英语", "中文")
+
+    def age(self, cache: TranslationCache, key: str, seconds: float):
+        """
+        把条目的最近使用时间调到 seconds 秒之前
+        """
+        past = time.time() - seconds
+        os.utime(cache._path(key), (past, past))
+
+    def test_get_and_set(self):
+        cache = TranslationCache(self.dir)
+        self.assertIsNone(cache.get(self.key("a")))
+        cache.set(self.key("a"), "译文")
+        self.assertEqual(cache.get(self.key("a")), "译文")
+
+    def test_key_ignores_whitespace_but_not_prompt_or_model(self):
+        self.assertEqual(self.key("Hello\r\nworld  \n"), self.key("Hello\nworld"))
+        self.assertNotEqual(self.key("a"), self.key("a", prompt="other"))
+        self.assertNotEqual(self.key("a"), self.key("a", model="other"))
+
+    def test_evicts_least_recently_used_entries(self):
+        cache = TranslationCache(self.dir, max_size=300)
+        keys = [self.key(name) for name in "abc"]
+        for age, key in zip((30, 20, 10), keys):
+            cache.set(key, "x" * 100)
+            self.age(cache, key, age)
+        # 读取最旧的条目后它变成最近使用的
+        self.assertIsNotNone(cache.get(keys[0]))
+        cache.set(self.key("d"), "x" * 100)
+        # 淘汰到上限的 90% 以下：删除 b 与 c
+        self.assertIsNotNone(cache.get(keys[0]))
+        self.assertIsNone(cache.get(keys[1]))
+        self.assertIsNone(cache.get(keys[2]))
+        self.assertIsNotNone(cache.get(self.key("d")))
+
+    def test_size_is_tracked_between_scans(self):
+        cache = TranslationCache(self.dir, max_size=1000)
+        cache.set(self.key("a"), "x" * 400)
+        cache.set(self.key("b"), "x" * 400)
+        self.assertEqual(cache._size, 800)
+        cache.set(self.key("c"), "x" * 400)
+        self.assertLessEqual(cache._size, 900)
+        files = list(cache.cache_dir.glob("*/*.txt"))
+        self.assertEqual(sum(path.stat().st_size for path in files), cache._size)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,37 @@
+import unittest
+
+from src.subtiltes_translator.classify import is_translatable
+
+
+class IsTranslatableTest(unittest.TestCase):
+    def test_dialogue_is_translatable(self):
+        self.assertTrue(is_translatable("Where are you going?", "英语", "中文"))
+        self.assertTrue(is_translatable("JOHN: Where to?", "英语", "中文"))
+
+    def test_no_letters(self):
+        for text in ("...", "♪ ♪", "1984", "- !?", "", "<i>♪</i>", "{\\an8}--"):
+            with self.subTest(text=text):
+                self.assertFalse(is_translatable(text, "英语", "中文"))
+
+    def test_speaker_tags_only(self):
+        for text in ("JOHN:", "- [旁白]：", "(NARRATOR):\n♪"):
+            with self.subTest(text=text):
+                self.assertFalse(is_translatable(text, "英语", "中文"))
+
+    def test_already_in_target_language(self):
+        self.assertFalse(is_translatable("你要去哪里？", "英语", "中文"))
+        self.assertFalse(is_translatable("<i>你好</i>\n再见", "english", "zh"))
+
+    def test_mixed_scripts_are_translatable(self):
+        self.assertTrue(is_translatable("你好 Tom", "英语", "中文"))
+
+    def test_shared_scripts_are_always_translated(self):
+        # 日语与中文都使用汉字，无法判断是否已经是目标语言
+        self.assertTrue(is_translatable("漢字", "日语", "中文"))
+
+    def test_unknown_target_language(self):
+        self.assertTrue(is_translatable("你好", "英语", "klingon"))
+
+
+if __name__ == "__main__":
+    unittest.main()
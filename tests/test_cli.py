@@ -0,0 +1,81 @@
+import contextlib
+import io
+import os
+import tempfile
+import unittest
+from unittest import mock
+
+from src.subtiltes_translator import cli
+from src.subtiltes_translator.balancer import LoadBalancer
+from src.subtiltes_translator.engine import (
+    ENGINE_DEFAULTS,
+    GEMINI,
+    OPENAI,
+    OfflineEngine,
+)
+
+from .test_translator import write_srt
+
+
+@mock.patch.dict(os.environ, {}, clear=True)
+@mock.patch.object(cli, "create_engine", side_effect=AssertionError("SDK imported"))
+class EstimateTest(unittest.TestCase):
+    def setUp(self):
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        self.dir = tmp.name
+        self.source = os.path.join(self.dir, "episode.srt")
+        write_srt(self.source, 20)
+
+    def run_cli(self, *argv: str) -> tuple[int, str, str]:
+        stdout, stderr = io.StringIO(), io.StringIO()
+        with contextlib.redirect_stdout(stdout), contextlib.redirect_stderr(stderr):
+            code = cli.main(
+                [*argv, "--no-memory", "--journal-dir", self.dir, self.source]
+            )
+        return code, stdout.getvalue(), stderr.getvalue()
+
+    def test_estimate_without_api_key(self, create_engine):
+        code, stdout, _ = self.run_cli("--estimate", "-e", OPENAI)
+        self.assertEqual(code, 0)
+        self.assertIn("预计 1 个请求", stdout)
+        create_engine.assert_not_called()
+
+    def test_translation_still_requires_api_key(self, create_engine):
+        code, _, stderr = self.run_cli()
+        self.assertEqual(code, 2)
+        self.assertIn("GEMINI_API_KEY", stderr)
+
+    def test_offline_engine_for_endpoints(self, create_engine):
+        args = cli.parse_args(["--estimate", "--endpoint", "openai:key", "x.srt"])
+        engine = cli.build_offline_engine(args, cli.parse_endpoints(args))
+        self.assertIsInstance(engine, OfflineEngine)
+        self.assertEqual(engine.name, OPENAI)
+
+        args = cli.parse_args(["--api-key", "a", "--endpoint", "openai:b", "x.srt"])
+        engine = cli.build_offline_engine(args, cli.parse_endpoints(args))
+        self.assertIsInstance(engine, LoadBalancer)
+        self.assertEqual(
+            engine.max_output_tokens, ENGINE_DEFAULTS[GEMINI].max_output_tokens
+        )
+
+
+class OfflineEngineTest(unittest.TestCase):
+    def test_identity_matches_engine_defaults(self):
+        engine = OfflineEngine(OPENAI)
+        defaults = ENGINE_DEFAULTS[OPENAI]
+        self.assertEqual(
+            engine.cache_identity(),
+            (f"openai/{defaults.model_name}", defaults.generation_config),
+        )
+        self.assertEqual(engine.max_output_tokens, defaults.max_output_tokens)
+        with self.assertRaises(RuntimeError):
+            engine.request("prompt", "text")
+
+    def test_unknown_engine(self):
+        with self.assertRaises(ValueError):
+            OfflineEngine("unknown")
+
+
+if __name__ == "__main__":
+    unittest.main()
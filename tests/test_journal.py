@@ -0,0 +1,87 @@
+import datetime
+import os
+import tempfile
+import unittest
+
+import srt
+
+from src.subtiltes_translator.journal import JobJournal
+from src.subtiltes_translator.usage import TokenUsage
+
+
+def chunk(*indexes: int) -> list[srt.Subtitle]:
+    return [
+        srt.Subtitle(index, datetime.timedelta(), datetime.timedelta(), "cue")
+        for index in indexes
+    ]
+
+
+class JobJournalTest(unittest.TestCase):
+    def setUp(self):
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        self.dir = tmp.name
+
+    def journal(self, source: str = "source") -> JobJournal:
+        journal = JobJournal(source, "prompt", "英语", "中文", "text", self.dir)
+        self.addCleanup(journal.close)
+        return journal
+
+    def test_load_without_journal(self):
+        self.assertEqual(self.journal().load(), {})
+
+    def test_resumes_recorded_chunks(self):
+        journal = self.journal()
+        journal.start([chunk(1, 2), chunk(3)])
+        journal.record(0, {1: "一", 2: "二"}, TokenUsage(10, 5, 1))
+        journal.close()
+
+        journal = self.journal()
+        self.assertEqual(journal.load(), {1: "一", 2: "二"})
+        self.assertEqual(journal.usage, TokenUsage(10, 5, 1))
+
+    def test_ignores_truncated_last_line(self):
+        journal = self.journal()
+        journal.start([chunk(1), chunk(2)])
+        journal.record(0, {1: "一"})
+        journal.close()
+        # 模拟写到一半时崩溃
+        with open(journal.path, "a", encoding="utf-8") as f:
+            f.write('{"chunk": 1, "translations": {"2": "')
+
+        journal = self.journal()
+        self.assertEqual(journal.load(), {1: "一"})
+        # 继续写入的记录不会和写了一半的行混在一起
+        journal.start([chunk(2)])
+        journal.record(0, {2: "二"})
+        journal.close()
+        self.assertEqual(self.journal().load(), {1: "一", 2: "二"})
+
+    def test_discards_journal_of_other_source(self):
+        journal = self.journal()
+        journal.start([chunk(1)])
+        journal.record(0, {1: "一"}, TokenUsage(10, 5, 1))
+        journal.close()
+
+        other = self.journal("changed")
+        other.path = journal.path
+        self.assertEqual(other.load(), {})
+        self.assertEqual(other.usage, TokenUsage())
+
+    def test_job_identity(self):
+        self.assertEqual(self.journal().path, self.journal().path)
+        self.assertNotEqual(self.journal().path, self.journal("changed").path)
+        other_prompt = JobJournal("source", "other", "英语", "中文", "text", self.dir)
+        self.assertNotEqual(self.journal().path, other_prompt.path)
+
+    def test_remove(self):
+        journal = self.journal()
+        journal.start([chunk(1)])
+        journal.remove()
+        self.assertFalse(os.path.exists(journal.path))
+        # 重复删除不报错
+        journal.remove()
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,120 @@
+import os
+import sqlite3
+import tempfile
+import unittest
+
+from src.subtiltes_translator.memory import TranslationMemory
+
+
+class TranslationMemoryTestCase(unittest.TestCase):
+    def setUp(self):
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        self.path = os.path.join(tmp.name, "memory.sqlite3")
+
+    def open(self, **options) -> TranslationMemory:
+        memory = TranslationMemory(self.path, **options)
+        self.addCleanup(memory.close)
+        return memory
+
+
+SCOPE = TranslationMemory.make_scope("prompt", "model", {})
+
+
+class MemoryLookupTest(TranslationMemoryTestCase):
+    def test_exact_hit(self):
+        memory = self.open()
+        memory.add([("Where are you going?", "你要去哪里？")], "英语", "中文", SCOPE)
+        self.assertEqual(
+            memory.lookup("Where are you going?", "英语", "中文", SCOPE), "你要去哪里？"
+        )
+        # 只忽略空白差异
+        self.assertEqual(
+            memory.lookup("Where  are you\ngoing? ", "英语", "中文", SCOPE),
+            "你要去哪里？",
+        )
+        self.assertIsNone(memory.lookup("Where are you going", "英语", "中文", SCOPE))
+
+    def test_languages_are_isolated(self):
+        memory = self.open()
+        memory.add([("Hello", "你好")], "英语", "中文", SCOPE)
+        memory.add([("Hello", "こんにちは")], "英语", "日语", SCOPE)
+        self.assertEqual(memory.lookup("Hello", "英语", "中文", SCOPE), "你好")
+        self.assertEqual(memory.lookup("Hello", "英语", "日语", SCOPE), "こんにちは")
+        self.assertIsNone(memory.lookup("Hello", "德语", "中文", SCOPE))
+
+    def test_first_translation_is_kept(self):
+        memory = self.open()
+        memory.add([("Hello", "你好")], "英语", "中文", SCOPE)
+        memory.add([("Hello", "您好")], "英语", "中文", SCOPE)
+        self.assertEqual(memory.lookup("Hello", "英语", "中文", SCOPE), "你好")
+
+    def test_skips_empty_pairs(self):
+        memory = self.open()
+        memory.add([(" ", "空"), ("Hello", " ")], "英语", "中文", SCOPE)
+        self.assertIsNone(memory.lookup("Hello", "英语", "中文", SCOPE))
+
+    def test_persists_across_instances(self):
+        self.open().add([("Hello", "你好")], "英语", "中文", SCOPE)
+        self.assertEqual(self.open().lookup("Hello", "英语", "中文", SCOPE), "你好")
+
+    def test_fuzzy_matching_is_opt_in(self):
+        source = "I told you we should never have come back here."
+        similar = "I told you we should never have come back here!"
+        self.open().add([(source, "我早说过我们不该回来的。")], "英语", "中文", SCOPE)
+        self.assertIsNone(self.open().lookup(similar, "英语", "中文", SCOPE))
+        fuzzy = self.open(fuzzy_threshold=0.9)
+        self.assertEqual(
+            fuzzy.lookup(similar, "英语", "中文", SCOPE), "我早说过我们不该回来的。"
+        )
+        self.assertIsNone(fuzzy.lookup("I told you so.", "英语", "中文", SCOPE))
+
+
+class MemoryScopeTest(TranslationMemoryTestCase):
+    def test_entries_are_isolated_by_scope(self):
+        memory = self.open()
+        show = TranslationMemory.make_scope("术语：Jon 译作琼恩", "gemini/flash", {})
+        other = TranslationMemory.make_scope("prompt", "gemini/flash", {})
+        memory.add([("Jon is here.", "琼恩来了。")], "英语", "中文", show)
+        self.assertEqual(memory.lookup("Jon is here.", "英语", "中文", show), "琼恩来了。")
+        self.assertIsNone(memory.lookup("Jon is here.", "英语", "中文", other))
+
+    def test_scope_depends_on_prompt_and_model(self):
+        scope = TranslationMemory.make_scope("prompt", "gemini/flash", {})
+        self.assertNotEqual(
+            scope, TranslationMemory.make_scope("prompt 2", "gemini/flash", {})
+        )
+        self.assertNotEqual(
+            scope, TranslationMemory.make_scope("prompt", "openai/gpt", {})
+        )
+        self.assertNotEqual(
+            scope,
+            TranslationMemory.make_scope("prompt", "gemini/flash", {"temperature": 1}),
+        )
+
+    def test_unscoped_entries_from_old_versions_are_dropped(self):
+        conn = sqlite3.connect(self.path)
+        conn.executescript(
+            """
+            CREATE TABLE entries (
+                id INTEGER PRIMARY KEY,
+                hash TEXT NOT NULL,
+                from_language TEXT NOT NULL,
+                target_language TEXT NOT NULL,
+                source TEXT NOT NULL,
+                target TEXT NOT NULL,
+                UNIQUE (hash, from_language, target_language)
+            );
+            INSERT INTO entries VALUES (1, 'x', '英语', '中文', 'Hello', '你好');
+            """
+        )
+        conn.close()
+        memory = self.open()
+        scope = TranslationMemory.make_scope("prompt", "model", {})
+        self.assertIsNone(memory.lookup("Hello", "英语", "中文", scope))
+        memory.add([("Hello", "您好")], "英语", "中文", scope)
+        self.assertEqual(memory.lookup("Hello", "英语", "中文", scope), "您好")
+
+
+if __name__ == "__main__":
+    unittest.main()
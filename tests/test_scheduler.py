@@ -0,0 +1,142 @@
+import asyncio
+import types
+import unittest
+from unittest import mock
+
+from src.subtiltes_translator.scheduler import (
+    MIN_RATE_SCALE,
+    RequestScheduler,
+    TokenBucket,
+    is_retryable,
+    retry_after,
+)
+
+
+class ApiError(Exception):
+    def __init__(self, code: int, details=None, headers=None):
+        super().__init__(f"HTTP {code}")
+        self.code = code
+        self.details = details
+        self.response = types.SimpleNamespace(headers=headers or {})
+
+
+class RetryHintTest(unittest.TestCase):
+    def test_retryable_errors(self):
+        self.assertTrue(is_retryable(ApiError(429)))
+        self.assertTrue(is_retryable(ApiError(503)))
+        self.assertTrue(is_retryable(ConnectionResetError()))
+        self.assertTrue(is_retryable(TimeoutError()))
+        self.assertFalse(is_retryable(ApiError(400)))
+        self.assertFalse(is_retryable(ValueError()))
+
+    def test_retry_info_detail(self):
+        error = ApiError(429, details=[{"@type": "Help"}, {"retryDelay": "12s"}])
+        self.assertEqual(retry_after(error), 12.0)
+
+    def test_retry_info_duration(self):
+        delay = types.SimpleNamespace(seconds=3, nanos=500_000_000)
+        error = ApiError(429, details=[types.SimpleNamespace(retry_delay=delay)])
+        self.assertEqual(retry_after(error), 3.5)
+
+    def test_retry_after_header(self):
+        self.assertEqual(retry_after(ApiError(429, headers={"retry-after": "7"})), 7.0)
+
+    def test_no_hint(self):
+        self.assertIsNone(retry_after(ApiError(503)))
+        self.assertIsNone(retry_after(ValueError()))
+
+
+class BackoffTest(unittest.TestCase):
+    def test_prefers_server_hint(self):
+        scheduler = RequestScheduler()
+        error = ApiError(429, details=[{"retryDelay": "30s"}])
+        self.assertEqual(scheduler.backoff(0, error), 30.0)
+
+    def test_exponential_with_cap(self):
+        scheduler = RequestScheduler(base_delay=1.0, max_delay=10.0)
+        for attempt, limit in ((0, 1.0), (2, 4.0), (10, 10.0)):
+            delays = [scheduler.backoff(attempt, ApiError(503)) for _ in range(200)]
+            self.assertTrue(all(0 <= delay <= limit for delay in delays))
+            self.assertGreater(max(delays), limit / 2)
+
+
+class TokenBucketTest(unittest.TestCase):
+    def test_waits_when_empty(self):
+        bucket = TokenBucket(60)
+        self.assertEqual(bucket.reserve(60), 0.0)
+        self.assertAlmostEqual(bucket.reserve(1), 1.0, places=1)
+
+    def test_oversized_request_uses_capacity(self):
+        bucket = TokenBucket(60)
+        self.assertEqual(bucket.reserve(1000), 0.0)
+        self.assertAlmostEqual(bucket.reserve(1000), 60.0, places=0)
+
+
+@mock.patch("src.subtiltes_translator.scheduler.time.sleep")
+class RequestSchedulerTest(unittest.TestCase):
+    def failing(self, *errors: Exception):
+        errors_left = list(errors)
+        calls = []
+
+        def func() -> str:
+            calls.append(1)
+            if errors_left:
+                raise errors_left.pop(0)
+            return "ok"
+
+        return func, calls
+
+    def test_retries_retryable_errors(self, sleep):
+        func, calls = self.failing(ApiError(503), ApiError(503))
+        self.assertEqual(RequestScheduler().call(func), "ok")
+        self.assertEqual(len(calls), 3)
+
+    def test_uses_retry_hint_between_attempts(self, sleep):
+        func, _ = self.failing(ApiError(429, details=[{"retryDelay": "12s"}]))
+        RequestScheduler().call(func)
+        self.assertIn(mock.call(12.0), sleep.call_args_list)
+
+    def test_gives_up_after_max_retries(self, sleep):
+        func, calls = self.failing(*[ApiError(503)] * 5)
+        with self.assertRaises(ApiError):
+            RequestScheduler(max_retries=2).call(func)
+        self.assertEqual(len(calls), 3)
+
+    def test_does_not_retry_other_errors(self, sleep):
+        func, calls = self.failing(ApiError(400))
+        with self.assertRaises(ApiError):
+            RequestScheduler().call(func)
+        self.assertEqual(len(calls), 1)
+
+    def test_call_once_does_not_retry(self, sleep):
+        func, calls = self.failing(ApiError(503))
+        with self.assertRaises(ApiError):
+            RequestScheduler().call_once(func)
+        self.assertEqual(len(calls), 1)
+
+    def test_throttling_lowers_rate_until_requests_succeed(self, sleep):
+        scheduler = RequestScheduler()
+        func, _ = self.failing(*[ApiError(429)] * 10)
+        with self.assertRaises(ApiError):
+            scheduler.call(func)
+        self.assertEqual(scheduler.rate_scale, MIN_RATE_SCALE)
+        scheduler.call(lambda: "ok")
+        self.assertAlmostEqual(scheduler.rate_scale, MIN_RATE_SCALE + 0.05)
+
+    def test_async_retries(self, sleep):
+        errors = [ApiError(503)]
+        calls = []
+
+        async def func() -> str:
+            calls.append(1)
+            if errors:
+                raise errors.pop(0)
+            return "ok"
+
+        scheduler = RequestScheduler(base_delay=0.0)
+        self.assertEqual(asyncio.run(scheduler.call_async(func)), "ok")
+        self.assertEqual(len(calls), 2)
+
+
+if __name__ == "__main__":
+    unittest.main()
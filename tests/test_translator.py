@@ -0,0 +1,191 @@
+import asyncio
+import datetime
+import os
+import tempfile
+import unittest
+
+import srt
+
+from src.subtiltes_translator.engine import TranslationEngine
+from src.subtiltes_translator.scheduler import RequestScheduler
+from src.subtiltes_translator.translator import (
+    translate_subtitle,
+    translate_subtitle_async,
+)
+
+
+def write_srt(path: str, count: int):
+    subtitles = [
+        srt.Subtitle(
+            index,
+            datetime.timedelta(seconds=index),
+            datetime.timedelta(seconds=index, milliseconds=900),
+            f"line number {index}",
+        )
+        for index in range(1, count + 1)
+    ]
+    with open(path, "w", encoding="utf-8") as f:
+        f.write(srt.compose(subtitles))
+
+
+def translate_text(text: str, drop: str | None = None) -> str:
+    """
+    按紧凑文本格式逐行翻译，每行加上「译」前缀，内容为 drop 的行被遗漏
+    """
+    lines = []
+    for line in text.splitlines():
+        index, _, content = line.partition(": ")
+        if content != drop:
+            lines.append(f"{index}: 译{content}")
+    return "\n".join(lines)
+
+
+class FakeEngine(TranslationEngine):
+    name = "fake"
+
+    def __init__(
+        self, fail_on: str | None = None, delay: float = 0.0, drop: str | None = None
+    ):
+        super().__init__("model", RequestScheduler(requests_per_minute=10_000))
+        self.fail_on = fail_on
+        self.delay = delay
+        self.drop = drop
+        self.calls = 0
+        self.texts: list[str] = []
+
+    def request(self, prompt: str, text: str) -> str:
+        self.calls += 1
+        self.texts.append(text)
+        if self.fail_on is not None and self.fail_on in text:
+            raise ValueError("rejected")
+        return translate_text(text, self.drop)
+
+    async def request_async(self, prompt: str, text: str) -> str:
+        self.calls += 1
+        if self.fail_on is not None and self.fail_on in text:
+            raise ValueError("rejected")
+        await asyncio.sleep(self.delay)
+        return translate_text(text)
+
+
+class TranslatorTestCase(unittest.TestCase):
+    def setUp(self):
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        self.dir = tmp.name
+        self.source = os.path.join(self.dir, "episode.srt")
+
+    def options(self) -> dict:
+        return dict(
+            target_dir=self.dir,
+            from_language="英语",
+            target_language="中文",
+            api_key="",
+            cache_dir=os.path.join(self.dir, "cache"),
+            journal_dir=os.path.join(self.dir, "jobs"),
+            use_memory=False,
+            save_usage=False,
+        )
+
+
+class TranslateSubtitleTest(TranslatorTestCase):
+    def output(self) -> list[srt.Subtitle]:
+        with open(os.path.join(self.dir, "episode_中文.srt"), encoding="utf-8") as f:
+            return list(srt.parse(f.read()))
+
+    def test_translates_file(self):
+        write_srt(self.source, 30)
+        engine = FakeEngine()
+        options = {**self.options(), "save_usage": True}
+        usage = translate_subtitle(
+            "prompt", self.source, engine=engine, max_input_tokens=100, **options
+        )
+        output = self.output()
+        self.assertEqual(len(output), 30)
+        self.assertTrue(all(line.content.startswith("译") for line in output))
+        self.assertEqual(output[4].start, datetime.timedelta(seconds=5))
+        self.assertEqual(usage.total.requests, engine.calls)
+        self.assertGreater(engine.calls, 1)
+        self.assertEqual(usage.estimate.requests, engine.calls)
+        self.assertTrue(os.path.exists(os.path.join(self.dir, "episode_中文.usage.json")))
+        self.assertEqual(os.listdir(os.path.join(self.dir, "jobs")), [])
+
+        # 相同的任务再次运行时全部命中缓存
+        engine = FakeEngine()
+        translate_subtitle(
+            "prompt", self.source, engine=engine, max_input_tokens=100, **options
+        )
+        self.assertEqual(engine.calls, 0)
+
+    def test_resumes_after_failure(self):
+        write_srt(self.source, 30)
+        options = {**self.options(), "max_input_tokens": 100, "concurrency": 1}
+        with self.assertRaises(ValueError):
+            translate_subtitle(
+                "prompt",
+                self.source,
+                engine=FakeEngine(fail_on="line number 20\n"),
+                **options,
+            )
+        # 缓存中的分片也不应重新请求，换一个缓存目录确认译文来自任务日志
+        options["cache_dir"] = os.path.join(self.dir, "other-cache")
+        engine = FakeEngine()
+        usage = translate_subtitle("prompt", self.source, engine=engine, **options)
+        sent = "".join(engine.texts)
+        self.assertNotIn("1: line number 1\n", sent)
+        self.assertIn("20: line number 20\n", sent)
+        self.assertGreater(usage.resumed.requests, 0)
+        self.assertTrue(all(line.content.startswith("译") for line in self.output()))
+
+
+class UntranslatedCuesTest(TranslatorTestCase):
+    def test_missing_cues_are_reported_and_retried_on_rerun(self):
+        write_srt(self.source, 5)
+        usage = translate_subtitle(
+            "prompt",
+            self.source,
+            engine=FakeEngine(drop="line number 3"),
+            **self.options(),
+        )
+        self.assertEqual(usage.untranslated, [3])
+        with open(os.path.join(self.dir, "episode_中文.srt"), encoding="utf-8") as f:
+            output = list(srt.parse(f.read()))
+        self.assertEqual(output[2].content, "line number 3")
+        self.assertEqual(output[1].content, "译line number 2")
+        self.assertEqual(len(os.listdir(os.path.join(self.dir, "jobs"))), 1)
+
+        engine = FakeEngine()
+        usage = translate_subtitle(
+            "prompt", self.source, engine=engine, **self.options()
+        )
+        self.assertEqual(usage.untranslated, [])
+        self.assertEqual(engine.texts, ["3: line number 3\n"])
+        self.assertEqual(os.listdir(os.path.join(self.dir, "jobs")), [])
+
+
+class TranslateSubtitleAsyncTest(TranslatorTestCase):
+    def test_failed_chunk_cancels_the_others(self):
+        write_srt(self.source, 40)
+        engine = FakeEngine(fail_on="line number 1\n", delay=0.05)
+
+        async def run() -> int:
+            with self.assertRaises(ValueError):
+                await translate_subtitle_async(
+                    "prompt",
+                    self.source,
+                    engine=engine,
+                    concurrency=2,
+                    max_input_tokens=60,
+                    **self.options(),
+                )
+            calls = engine.calls
+            await asyncio.sleep(0.3)
+            return calls
+
+        calls = asyncio.run(run())
+        self.assertEqual(engine.calls, calls)
+        self.assertLess(engine.calls, 10)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,189 @@
+import datetime
+import pathlib
+import tempfile
+import unittest
+
+import srt
+
+from src.subtiltes_translator.utils import (
+    ChunkStrategy,
+    chunk_subtitles,
+    estimate_cue_tokens,
+    extract_ass_text,
+    load_ass_file,
+    merge_ass_files,
+    restore_ass_text,
+)
+
+ASS_FILE = (
+    "\ufeff[Script Info]\r\n"
+    "; Script generated by Aegisub\r\n"
+    "ScriptType: v4.00+\r\n"
+    "\r\n"
+    "[V4+ Styles]\r\n"
+    "Format: Name, Fontname, Fontsize, PrimaryColour\r\n"
+    "Style: Default,Arial,20,&H00FFFFFF\r\n"
+    "\r\n"
+    "[Fonts]\r\n"
+    "fontname: custom_0.ttf\r\n"
+    "M(\"\\]!4)]-!%!#!!&!$$@!!,!!!4!!!!M!!!!\r\n"
+    "!!!!(0!!!=\r\n"
+    "\r\n"
+    "[Events]\r\n"
+    "Format: Layer, Start, End, Style, Name, "
+    "MarginL, MarginR, MarginV, Effect, Text\r\n"
+    "Comment: 0,0:00:00.00,0:00:01.00,Default,,0,0,0,,note\r\n"
+    "Dialogue: 0,0:00:01.00,0:00:02.50,Default,,0,0,0,,{\\an8}Hello, world\r\n"
+    "Dialogue: 0,0:00:03.00,0:00:04.00,Default,,0,0,0,,{\\p1}m 0 0 l 1 1{\\p0}\r\n"
+    "Dialogue: 0,0:00:05.00,0:00:06.00,Default,,0,0,0,,Bye\\Nnow\r\n"
+)
+
+SSA_FILE = (
+    "[Script Info]\n"
+    "ScriptType: v4.00\n"
+    "\n"
+    "[V4 Styles]\n"
+    "Format: Name, Fontname, Fontsize, PrimaryColour, SecondaryColour\n"
+    "Style: Default,Arial,20,16777215,65535\n"
+    "\n"
+    "[Events]\n"
+    "Format: Marked, Start, End, Style, Name, MarginL, MarginR, MarginV, Effect, Text\n"
+    "Dialogue: Marked=0,0:00:01.00,0:00:02.00,Default,,0000,0000,0000,,Hello\n"
+)
+
+
+def cue(index: int, content: str) -> srt.Subtitle:
+    start = datetime.timedelta(seconds=index)
+    return srt.Subtitle(index, start, start + datetime.timedelta(seconds=1), content)
+
+
+class AssTextTest(unittest.TestCase):
+    def test_extract_moves_edge_tags_out_of_text(self):
+        text, prefix, suffix, tags = extract_ass_text(
+            r"{\an8}{\c&H00FF00&}Hello world{\fad(0,200)}"
+        )
+        self.assertEqual(text, "Hello world")
+        self.assertEqual(prefix, r"{\an8}{\c&H00FF00&}")
+        self.assertEqual(suffix, r"{\fad(0,200)}")
+        self.assertEqual(tags, [])
+
+    def test_extract_replaces_inline_tags_with_placeholders(self):
+        text, _, _, tags = extract_ass_text(r"Hello {\i1}big{\i0} world")
+        self.assertEqual(text, "Hello {1}big{2} world")
+        self.assertEqual(tags, [r"{\i1}", r"{\i0}"])
+
+    def test_extract_converts_only_hard_breaks(self):
+        text, _, _, tags = extract_ass_text(r"one\Ntwo\nthree\hfour")
+        self.assertEqual(text, "one\ntwo{1}three{2}four")
+        self.assertEqual(tags, [r"\n", r"\h"])
+
+    def test_round_trip(self):
+        for source in (
+            r"Plain text",
+            r"{\an8}Top line\NBottom line",
+            r"{\an8}Hello {\i1}big{\i0} world{\fad(0,200)}",
+            r"soft\nbreak and hard\hspace",
+        ):
+            with self.subTest(source=source):
+                text, _, _, _ = extract_ass_text(source)
+                self.assertEqual(restore_ass_text(text, source), source)
+
+    def test_restore_translated_text(self):
+        source = r"{\an8}Hello {\i1}big{\i0} world\Nagain{\fad(0,200)}"
+        self.assertEqual(
+            restore_ass_text("你好{1}大{2}世界\n再见", source),
+            r"{\an8}你好{\i1}大{\i0}世界\N再见{\fad(0,200)}",
+        )
+
+    def test_restore_drops_invented_placeholders(self):
+        source = r"Hello {\i1}big{\i0} world"
+        self.assertEqual(
+            restore_ass_text("{0}你好{1}大{2}世界{3}", source),
+            r"你好{\i1}大{\i0}世界",
+        )
+
+
+class AssFileTest(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp.cleanup)
+
+    def write(self, name: str, content: str) -> pathlib.Path:
+        path = pathlib.Path(self.tmp.name, name)
+        path.write_bytes(content.encode("utf-8"))
+        return path
+
+    def test_load_skips_comments_and_drawings(self):
+        cues = load_ass_file(str(self.write("a.ass", ASS_FILE)))
+        self.assertEqual([line.content for line in cues], ["Hello, world", "Bye\nnow"])
+        self.assertEqual(cues[0].start, datetime.timedelta(seconds=1))
+        self.assertEqual(cues[0].end, datetime.timedelta(seconds=2.5))
+
+    def test_merge_only_rewrites_dialogue_text(self):
+        source = self.write("a.ass", ASS_FILE)
+        target = pathlib.Path(self.tmp.name, "a_zh.ass")
+        cues = load_ass_file(str(source))
+        cues[0].content = "你好，世界"
+        cues[1].content = "再见\n现在"
+        merge_ass_files(cues, target, str(source))
+        expected = ASS_FILE.replace("Hello, world", "你好，世界").replace(
+            "Bye\\Nnow", "再见\\N现在"
+        )
+        self.assertEqual(target.read_bytes(), expected.encode("utf-8"))
+
+    def test_untranslated_file_round_trips_byte_for_byte(self):
+        source = self.write("a.ass", ASS_FILE)
+        target = pathlib.Path(self.tmp.name, "a_zh.ass")
+        merge_ass_files(load_ass_file(str(source)), target, str(source))
+        self.assertEqual(target.read_bytes(), source.read_bytes())
+
+    def test_ssa_file(self):
+        source = self.write("a.ssa", SSA_FILE)
+        target = pathlib.Path(self.tmp.name, "a_zh.ssa")
+        cues = load_ass_file(str(source))
+        self.assertEqual([line.content for line in cues], ["Hello"])
+        cues[0].content = "你好"
+        merge_ass_files(cues, target, str(source))
+        self.assertEqual(target.read_text(), SSA_FILE.replace("Hello", "你好"))
+
+
+class ChunkSubtitlesTest(unittest.TestCase):
+    def test_fixed_strategy(self):
+        cues = [cue(i, "hello") for i in range(1, 8)]
+        chunks = chunk_subtitles(cues, ChunkStrategy.FIXED, chunk_size=3)
+        self.assertEqual([len(chunk) for chunk in chunks], [3, 3, 1])
+
+    def test_chunks_stay_within_budgets(self):
+        cues = [cue(i, "word " * (i % 7 + 1)) for i in range(1, 200)]
+        for max_input, max_output in ((200, 10_000), (10_000, 150), (300, 300)):
+            with self.subTest(max_input=max_input, max_output=max_output):
+                chunks = chunk_subtitles(
+                    cues, max_input_tokens=max_input, max_output_tokens=max_output
+                )
+                self.assertEqual([line for chunk in chunks for line in chunk], cues)
+                for chunk in chunks:
+                    tokens = [estimate_cue_tokens(line) for line in chunk]
+                    self.assertLessEqual(sum(i for i, _ in tokens), max_input)
+                    self.assertLessEqual(sum(o for _, o in tokens), max_output)
+
+    def test_chunks_are_filled_before_splitting(self):
+        cues = [cue(i, "hello") for i in range(1, 11)]
+        cue_input, _ = estimate_cue_tokens(cues[0], 3)
+        chunks = chunk_subtitles(
+            cues,
+            max_input_tokens=cue_input * 4,
+            max_output_tokens=10_000,
+            cue_overhead=3,
+        )
+        self.assertEqual([len(chunk) for chunk in chunks], [4, 4, 2])
+
+    def test_oversized_cue_gets_its_own_chunk(self):
+        cues = [cue(1, "hi"), cue(2, "word " * 500), cue(3, "hi")]
+        chunks = chunk_subtitles(cues, max_input_tokens=100, max_output_tokens=100)
+        self.assertEqual(
+            [[line.index for line in chunk] for chunk in chunks], [[1], [2], [3]]
+        )
+
+
+if __name__ == "__main__":
+    unittest.main()